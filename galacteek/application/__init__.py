@@ -104,6 +104,8 @@ from galacteek.space.solarsystem import SolarSystem
 from galacteek.ipfs import asyncipfsd, cidhelpers
 from galacteek.ipfs.cidhelpers import joinIpfs
 from galacteek.ipfs.cidhelpers import IPFSPath
+from galacteek.ipfs.dag import edagsFlush
+from galacteek.ipfs.mimetype import mimeDetector
 from galacteek.ipfs.ipfsops import *
 from galacteek.ipfs.wrappers import *
 from galacteek.ipfs.feeds import FeedFollower
@@ -319,6 +321,10 @@ class GalacteekApplication(QApplication):
     def nsCache(self) -> IPNSCache:
         return IPNSCache(self.nsCacheLocation)
 
+    @cached_property
+    def objCache(self) -> IPFSObjectCache:
+        return IPFSObjectCache(self.objCacheLocation)
+
     @cached_property
     def eth(self):
         return self.s.ethService
@@ -501,6 +507,10 @@ class GalacteekApplication(QApplication):
     def nsCacheLocation(self):
         return self._nsCacheLocation
 
+    @property
+    def objCacheLocation(self):
+        return self._objCacheLocation
+
     @property
     def orbitDataLocation(self):
         return self._orbitDataLocation
@@ -571,10 +581,14 @@ class GalacteekApplication(QApplication):
         self.networkProxySet(NullProxy())
 
         # Discover/preload LD schemas
+        self._ldSchemasImporter.ctxCache.persist(self.ldContextsCacheLocation)
         self._ldSchemasImporter.discover()
 
+        mimeDetector.persist(self.mimeCacheLocation)
+
         self.multihashDb = IPFSObjectMetadataDatabase(
             str(self._mHashDbLocation), loop=self.loop)
+        ensure(self.multihashDb.migrate())
 
         self.resourceOpener = IPFSResourceOpener(parent=self)
 
@@ -701,6 +715,8 @@ class GalacteekApplication(QApplication):
         # Trigger LD schemas update
         await self._ldSchemasImporter.update(op)
 
+        ensure(self.ipidManager.ldCacheWarm())
+
         self.feedFollower = FeedFollower(self)
         self.feedFollowerTask = await self.scheduler.spawn(
             self.feedFollower.process())
@@ -857,7 +873,8 @@ class GalacteekApplication(QApplication):
         op = GalacteekOperator(self.ipfsClientForLoop(loop),
                                ctx=self.ipfsCtx,
                                debug=self.debugEnabled,
-                               nsCache=self.nsCache)
+                               nsCache=self.nsCache,
+                               objCache=self.objCache)
 
         if self.ipfsOpMain:
             # Use crypto agents from the main operator
@@ -1059,7 +1076,10 @@ class GalacteekApplication(QApplication):
         self.solarSystem = SolarSystem()
         self.mimeTypeIcons = preloadMimeIcons()
         self.hmSynchronizer = HashmarksSynchronizer()
-        self.ipidManager = IPIDManager()
+        self.ipidManager = IPIDManager(
+            ldCachePath=self.didLdCacheLocation)
+        self._ldSchemasImporter.sContextsChanged.connectTo(
+            self.ipidManager.onLdContextsChanged)
 
         self.towers = {
             'dags': DAGSignalsTower(self),
@@ -1188,6 +1208,14 @@ class GalacteekApplication(QApplication):
             'pinstatus.json')
         self._nsCacheLocation = self.dataLocation.joinpath(
             'nscache.json')
+        self._objCacheLocation = self.dataLocation.joinpath(
+            'objcache')
+        self.didLdCacheLocation = self.dataLocation.joinpath(
+            'didldcache')
+        self.ldContextsCacheLocation = self.dataLocation.joinpath(
+            'ldctxcache')
+        self.mimeCacheLocation = self.dataLocation.joinpath(
+            'mimecache.json')
         self._torrentStateLocation = self.dataLocation.joinpath(
             'torrent_state.pickle')
         self._bitMessageDataLocation = self.dataLocation.joinpath(
@@ -1706,6 +1734,20 @@ class GalacteekApplication(QApplication):
             except:
                 pass
 
+        # Save the EDAGs with pending changes
+        await edagsFlush()
+
+        # Compact the hashmarks' journals, stop the I/O threads
+        for marks in [getattr(self, 'marksLocal', None),
+                      getattr(self, 'marksNetwork', None)]:
+            if marks:
+                marks.close()
+
+        mimeDetector.close()
+
+        if hasattr(self, 'multihashDb'):
+            await self.multihashDb.close()
+
         await self.stopIpfsServices()
 
         # Asyncio shutdown
@@ -46,6 +46,8 @@ from galacteek.ipdapps import dappsRegisterSchemes
 
 from galacteek.qt.webengine import webEngine515
 
+from .streaming import IPFSObjectStreamDevice
+
 
 # Core schemes (the URL schemes your children will soon teach you how to use)
 SCHEME_DWEB = 'dweb'
@@ -411,6 +413,29 @@ class BaseURLSchemeHandler(QWebEngineUrlSchemeHandler):
             log.debug('Error buffering request data')
             request.fail(QWebEngineUrlRequestJob.RequestFailed)
 
+    def serveDevice(self, uid, request, ctype, device):
+        """
+        Reply to a request with a (streaming) QIODevice
+        """
+
+        if uid not in self.requests:
+            return
+
+        try:
+            self.requests[uid]['iodev'] = device
+
+            # Stop feeding the device when the request goes away
+            request.destroyed.connect(device.feedCancel)
+
+            device.start()
+
+            request.reply(ctype.encode('ascii'), device)
+        except Exception:
+            device.close()
+
+            log.debug('Error replying with stream device')
+            request.fail(QWebEngineUrlRequestJob.RequestFailed)
+
 
 class IPFSObjectProxyScheme:
     """
@@ -600,6 +625,7 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
         self.validCids = collections.deque([], validCidQSize)
 
         self.requestTimeout = cGet('schemes.ipfsNative.reqTimeout')
+        self.streamConfig = cGet('schemes.ipfsNative.streaming')
 
     def debug(self, msg):
         log.debug('Native scheme handler: {}'.format(msg))
@@ -703,7 +729,7 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
             self.contentReady.emit(
                 uid, request, 'application/octet-stream', data)
 
-    async def renderData(self, request, ipfsPath, data, uid):
+    async def mimeTypeForData(self, request, ipfsPath, data):
         cType = await detectMimeTypeFromBuffer(data[0:512])
 
         if cType and cType.isText:
@@ -713,13 +739,73 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
                 cType = MIMEType('text/css')
 
         if cType:
-            self.serveContent(
-                uid, request, cType.type, data)
+            return cType.type
         else:
             self.debug('Impossible to detect MIME type for URL: {0}'.format(
                 request.requestUrl().toString()))
-            self.serveContent(
-                uid, request, 'application/octet-stream', data)
+            return 'application/octet-stream'
+
+    async def renderData(self, request, ipfsPath, data, uid):
+        self.serveContent(
+            uid, request,
+            await self.mimeTypeForData(request, ipfsPath, data),
+            data
+        )
+
+    async def streamFromPath(self, ipfsop, request, ipfsPath, uid, head):
+        """
+        Stream a file object to QtWebEngine, with the first chunk
+        (used for MIME detection) already fetched
+        """
+
+        rPath = IPFSPath(await ipfsop.objectPathMapper(ipfsPath.objPath))
+        stat = await ipfsop.filesStat(rPath.objPath)
+
+        if not stat or stat.get('Type') != 'file':
+            # Can't stream this one
+            data = await ipfsop.catObject(ipfsPath.objPath)
+
+            if data:
+                return await self.renderData(request, ipfsPath, data, uid)
+
+            return self.reqFailed(request)
+
+        # Stream from the CID, the path could be remapped mid-stream
+        cidPath = IPFSPath(joinIpfs(stat['Hash']))
+
+        device = IPFSObjectStreamDevice(
+            ipfsop, cidPath, stat['Size'],
+            head=head if ipfsPath.isIpfs else None,
+            chunkSize=self.streamConfig.chunkSize,
+            maxBuffered=self.streamConfig.maxBuffered,
+            parent=request
+        )
+
+        self.serveDevice(
+            uid, request,
+            await self.mimeTypeForData(request, ipfsPath, head),
+            device
+        )
+
+    async def catOrStream(self, ipfsop, request, ipfsPath, uid):
+        """
+        Fetch the object, or stream it if it's larger than a chunk.
+        Returns the object's data if it was fetched entirely.
+        """
+
+        cfg = self.streamConfig
+
+        if not cfg or not cfg.enabled:
+            return await ipfsop.catObject(ipfsPath.objPath)
+
+        head = await ipfsop.catObject(ipfsPath.objPath,
+                                      offset=0, length=cfg.chunkSize)
+
+        if head and len(head) >= cfg.chunkSize:
+            await self.streamFromPath(ipfsop, request, ipfsPath, uid, head)
+            return None
+
+        return head
 
     @ipfsOp
     async def handleRequest(self, ipfsop, request, uid):
@@ -771,7 +857,7 @@ class NativeIPFSSchemeHandler(BaseURLSchemeHandler):
 
     async def fetchFromPath(self, ipfsop, request, ipfsPath, uid, **kw):
         try:
-            data = await ipfsop.catObject(ipfsPath.objPath)
+            data = await self.catOrStream(ipfsop, request, ipfsPath, uid)
         except aioipfs.APIError as exc:
             await asyncio.sleep(0)
 
@@ -1222,7 +1308,7 @@ class MultiDAGProxySchemeHandler(NativeIPFSSchemeHandler):
 
         log.debug('Multi DAG proxy : Fetch-from-path {}'.format(ipfsPath))
         try:
-            data = await ipfsop.catObject(ipfsPath.objPath)
+            data = await self.catOrStream(ipfsop, request, ipfsPath, uid)
         except aioipfs.APIError as exc:
             await asyncio.sleep(0)
 
@@ -1256,7 +1342,8 @@ class MultiDAGProxySchemeHandler(NativeIPFSSchemeHandler):
                 if data:
                     return await self.renderData(request, ipfsPath, data, uid)
         else:
-            return await self.renderData(request, ipfsPath, data, uid)
+            if data:
+                return await self.renderData(request, ipfsPath, data, uid)
 
 
 class EthDNSProxySchemeHandler(NativeIPFSSchemeHandler, IPFSObjectProxyScheme):
@@ -0,0 +1,153 @@
+import asyncio
+
+from PyQt5.QtCore import QIODevice
+
+from galacteek import log
+from galacteek import ensure
+from galacteek.ipfs.cidhelpers import IPFSPath
+
+
+class IPFSObjectStreamDevice(QIODevice):
+    """
+    Random-access QIODevice streaming a UnixFS file from the daemon
+
+    The object is fetched with ranged catObject() calls (chunkSize bytes
+    at a time) by a feeder task, and data is handed to QtWebEngine as it
+    arrives (readyRead is emitted for each chunk). Only a bounded window
+    of the object is kept in memory: the feeder pauses when more than
+    maxBuffered bytes are waiting to be read.
+
+    The device is not sequential and reports the object's size, so
+    QtWebEngine serves HTTP Range requests (media seeking) by calling
+    seek(), which restarts the feeder at the requested offset.
+    """
+
+    def __init__(self, ipfsop, ipfsPath: IPFSPath, size: int,
+                 head: bytes = None,
+                 chunkSize=262144,
+                 maxBuffered=4194304,
+                 parent=None):
+        super().__init__(parent)
+
+        self.ipfsop = ipfsop
+        self.ipfsPath = ipfsPath
+        self.chunkSize = chunkSize
+        self.maxBuffered = maxBuffered
+
+        self._size = size
+        self._buf = bytearray(head if head else b'')
+        self._bufOffset = 0
+        self._task = None
+        self._gen = 0
+        self._wanted = asyncio.Event()
+        self._wanted.set()
+
+    def debug(self, msg):
+        log.debug(f'Stream device ({self.ipfsPath}): {msg}')
+
+    @property
+    def bufEnd(self):
+        return self._bufOffset + len(self._buf)
+
+    def isSequential(self):
+        return False
+
+    def size(self):
+        return self._size
+
+    def bytesAvailable(self):
+        return max(self.bufEnd - self.pos(), 0)
+
+    def start(self):
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+        self.feed(self.bufEnd)
+
+    def feed(self, offset: int):
+        self.feedCancel()
+
+        if offset < self._size:
+            self._gen += 1
+            self._task = ensure(self.feeder(offset, self._gen))
+
+    def feedCancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+        self._task = None
+
+    def seek(self, pos):
+        if not super().seek(pos):
+            return False
+
+        if not (self._bufOffset <= pos <= self.bufEnd):
+            # Outside of the current window, restart from there
+            self._buf = bytearray()
+            self._bufOffset = pos
+            self.feed(pos)
+
+        return True
+
+    def readData(self, maxlen):
+        pos = self.pos()
+        rel = pos - self._bufOffset
+
+        if rel < 0 or pos >= self._size:
+            return b''
+
+        data = bytes(self._buf[rel:rel + maxlen])
+
+        # Drop what's been consumed
+        consumed = rel + len(data)
+        del self._buf[0:consumed]
+        self._bufOffset += consumed
+
+        if len(self._buf) < self.maxBuffered:
+            self._wanted.set()
+
+        return data
+
+    def writeData(self, data):
+        return -1
+
+    def close(self):
+        self.feedCancel()
+        super().close()
+
+    async def feeder(self, offset: int, gen: int):
+        try:
+            while offset < self._size:
+                if len(self._buf) >= self.maxBuffered:
+                    self._wanted.clear()
+                    await self._wanted.wait()
+                    continue
+
+                data = await self.ipfsop.catObject(
+                    self.ipfsPath.objPath,
+                    offset=offset,
+                    length=min(self.chunkSize, self._size - offset)
+                )
+
+                if gen != self._gen:
+                    # Seeked away in the meantime
+                    return
+
+                if not data:
+                    self.debug(f'No data at offset {offset}, aborting')
+                    break
+
+                self._buf.extend(data)
+                offset += len(data)
+
+                self.readyRead.emit()
+        except asyncio.CancelledError:
+            return
+        except RuntimeError:
+            # The device was deleted with the request
+            return
+        except Exception as err:
+            self.debug(f'Feeder error at offset {offset}: {err}')
+
+        if gen == self._gen and offset < self._size:
+            # Could not get everything, make the job end
+            self._size = self.bufEnd
+            self.readChannelFinished.emit()
@@ -4,6 +4,9 @@ cfgInitTable = [
 
     'galacteek.did.ipid',
 
+    'galacteek.ld',
+    'galacteek.ld.rdf',
+
     'galacteek.ipfs',
     'galacteek.ipfs.ipfsops',
     'galacteek.ipfs.pinning',
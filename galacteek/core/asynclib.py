@@ -310,6 +310,26 @@ def async_enterable(f):
     return wrapper
 
 
+class aclosing:
+    """
+    Async context manager closing an async generator on exit
+    (like contextlib.aclosing, which needs python 3.10)
+
+    async with aclosing(ipfsop.walk(path)) as walker:
+        async for objPath, parent in walker:
+            ...
+    """
+
+    def __init__(self, agen):
+        self.agen = agen
+
+    async def __aenter__(self):
+        return self.agen
+
+    async def __aexit__(self, *exc):
+        await self.agen.aclose()
+
+
 async def asyncReadFile(path, mode='rb', size=None):
     try:
         async with aiofiles.open(path, mode) as fd:
@@ -79,6 +79,8 @@ class PeerIdentityCtx:
         self._authFailedAttemptsCn = 0
         self._authFailedLtLast = None
         self._identMsg = None
+        self._watchFailuresCn = 0
+        self._watchLtNext = 0
 
         self._avatarPath = None
         self._avatarImage = self.defaultAvatarImage()
@@ -182,6 +184,29 @@ class PeerIdentityCtx:
         except:
             return False
 
+    @property
+    def watchFailuresCn(self):
+        return self._watchFailuresCn
+
+    @property
+    def watchDue(self):
+        # Not pinged recently, and not in backoff
+        return not self.pingedRecently and loopTime() >= self._watchLtNext
+
+    def watchResult(self, success: bool):
+        if success:
+            self._watchFailuresCn = 0
+            self._watchLtNext = 0
+        else:
+            self._watchFailuresCn += 1
+
+            delay = min(
+                self.cfgPeers.liveness.didPingEvery *
+                (2 ** (self._watchFailuresCn - 1)),
+                self.cfgPeers.watcherTask.get('backoffMax', 3600)
+            )
+            self._watchLtNext = loopTime() + delay
+
     def pingAvg(self):
         try:
             prec = self.pinghist[-1]
@@ -222,15 +247,20 @@ class PeerIdentityCtx:
         return await self.ipid.pubKeyPemGet()
 
     async def watch(self, ipfsop):
+        """
+        Ping the peer. Returns True if the peer replied,
+        False if it didn't, None if it could not be pinged
+        """
+
         if self.ipid.local:
             self.pinghist.append((
                 0,
                 int(loopTime())
             ))
-            return
+            return True
 
         if self.ident is None:
-            return
+            return None
 
         if isinstance(self.ident, PeerIdentMessageV4):
             idToken = self.ident.identToken
@@ -244,7 +274,7 @@ class PeerIdentityCtx:
                 ms, pong = pongReply
                 if not pong:
                     # Retry later
-                    return
+                    return False
 
                 self._didPongLast = pong['didpong'][self.ipid.did]
 
@@ -254,10 +284,12 @@ class PeerIdentityCtx:
                 ))
 
                 await self.sStatusChanged.emit()
+                return True
             else:
-                self.debug('Could not ping DID {self.ipid.did}')
+                self.debug(f'Could not ping DID {self.ipid.did}')
 
                 await self.sStatusChanged.emit()
+                return False
         else:
             return await self.watchOldStyle(ipfsop)
 
@@ -267,7 +299,7 @@ class PeerIdentityCtx:
                 0,
                 int(loopTime())
             ))
-            return
+            return True
 
         pingAvg = await ipfsop.waitFor(
             ipfsop.pingAvg(self.peerId, count=2), 10)
@@ -279,10 +311,12 @@ class PeerIdentityCtx:
             ))
 
             await self.sStatusChanged.emit()
+            return True
         else:
             self.debug('Could not ping peer')
 
             await self.sStatusChanged.emit()
+            return False
 
     def defaultAvatarImage(self):
         if isinstance(self.spaceHandle.vPlanet, str):
@@ -363,12 +397,29 @@ class Peers(GService):
         self.evStopWatcher = asyncio.Event()
         self._byPeerId = collections.OrderedDict()
         self._byHandle = collections.OrderedDict()
-        self._didGraphLStatus = []
+        self._didGraphLStatus = set()
+        self._didLoadSem = None
         self._didAuthInp = {}
         self._pgScanCount = 0
+        self._watchMetrics = {
+            'sweeps': 0,
+            'lastSweepDuration': 0,
+            'lastSweepPeers': 0,
+            'lastSweepFailures': 0,
+            'backoffPeers': 0
+        }
 
         self.peerAuthenticated.connectTo(self.onPeerAuthenticated)
 
+    @property
+    def didLoadSem(self):
+        # Bounds the number of DIDs loaded concurrently from the graph
+        if self._didLoadSem is None:
+            self._didLoadSem = asyncio.Semaphore(
+                cGet('peers.didLoadConcurrency') or 6)
+
+        return self._didLoadSem
+
     @property
     def pgScanCount(self):
         return self._pgScanCount
@@ -418,6 +469,7 @@ class Peers(GService):
     @ipfsOp
     async def scanNetworkGraph(self, ipfsop):
         profile = ipfsop.ctx.currentProfile
+        dids = []
 
         async with profile.dagNetwork.read() as ng:
             for peerId, peerHandles in ng.d['peers'].items():
@@ -430,9 +482,6 @@ class Peers(GService):
                             # Don't load inactive IPIDs
                             continue
 
-                    log.debug(
-                        f'scanNetworkGraph: processing {handle} ({did})')
-
                     if not sHandle.valid:
                         continue
 
@@ -441,19 +490,38 @@ class Peers(GService):
                         continue
 
                     if did in self._didGraphLStatus:
-                        await ipfsop.sleep()
                         continue
 
-                    ensure(
-                        self.loadDidFromGraph(ipfsop, peerId, did, sHandle))
-                    self._didGraphLStatus.append(did)
+                    log.debug(
+                        f'scanNetworkGraph: processing {handle} ({did})')
 
-                    await ipfsop.sleep(0.1)
+                    self._didGraphLStatus.add(did)
+                    dids.append((peerId, did, sHandle))
 
-                await ipfsop.sleep(0.05)
+                await ipfsop.sleep()
 
         self._pgScanCount += 1
 
+        if dids:
+            ensure(self.loadDidsFromGraph(ipfsop, dids))
+
+    async def loadDidsFromGraph(self, ipfsop, dids: list):
+        """
+        Load the DIDs found in the network graph (see didLoadSem)
+        """
+
+        ltStart = loopTime()
+
+        results = await asyncio.gather(*[
+            self.loadDidFromGraph(ipfsop, peerId, did, sHandle)
+            for peerId, did, sHandle in dids
+        ], return_exceptions=True)
+
+        log.debug(
+            f'Network graph: loaded {results.count(True)}/{len(dids)} '
+            f'DIDs in {loopTime() - ltStart:.2f} secs'
+        )
+
     async def loadDidFromGraph(self, ipfsop, peerId: str, did: str,
                                sHandle: str):
         loadTimeout = cGet('peers.didLoadTimeout')
@@ -462,12 +530,13 @@ class Peers(GService):
         peersService = ipfsop.ctx.pubsub.byTopic(TOPIC_PEERS)
 
         for attempt in range(0, max(2, loadAttempts)):
-            ipid = await self.app.ipidManager.load(
-                did,
-                track=True,
-                timeout=loadTimeout,
-                localIdentifier=(peerId == ipfsop.ctx.node.id)
-            )
+            async with self.didLoadSem:
+                ipid = await self.app.ipidManager.load(
+                    did,
+                    track=True,
+                    timeout=loadTimeout,
+                    localIdentifier=(peerId == ipfsop.ctx.node.id)
+                )
 
             if not ipid:
                 log.debug(f'Cannot load IPID: {did}, attempt {attempt}')
@@ -478,7 +547,7 @@ class Peers(GService):
 
         if not ipid:
             log.debug(f'Cannot load IPID: {did}, bailing out')
-            self._didGraphLStatus.remove(did)
+            self._didGraphLStatus.discard(did)
             return False
 
         piCtx = PeerIdentityCtx(
@@ -508,7 +577,7 @@ class Peers(GService):
 
         await peersService.sendIdentReq(piCtx.peerId)
 
-        self._didGraphLStatus.remove(did)
+        self._didGraphLStatus.discard(did)
 
         return True
 
@@ -835,13 +904,45 @@ class Peers(GService):
             log.debug('Peers watch: no peers, skipping')
             return
 
-        async with self.lock.reader_lock:
-            for peerId, piCtx in self._byPeerId.items():
-                if not piCtx.identLast:
-                    continue
+        cfg = cGet('peers.watcherTask')
+        sem = asyncio.Semaphore(cfg.get('concurrency', 8))
+        ltStart = loopTime()
 
-                if not piCtx.pingedRecently:
-                    await piCtx.watch(ipfsop)
+        # Only hold the lock while selecting the peers to watch
+        async with self.lock.reader_lock:
+            peers = [piCtx for piCtx in self._byPeerId.values()
+                     if piCtx.identLast and piCtx.watchDue]
+            backoff = len([piCtx for piCtx in self._byPeerId.values()
+                           if piCtx.watchFailuresCn > 0])
+
+        async def watchPeer(piCtx):
+            async with sem:
+                try:
+                    result = await piCtx.watch(ipfsop)
+                except Exception as err:
+                    log.debug(f'Peers watch: {piCtx.peerId}: error {err}')
+                    result = False
+
+            if result is not None:
+                piCtx.watchResult(result)
+
+            return result is False
+
+        failures = await asyncio.gather(*[
+            watchPeer(piCtx) for piCtx in peers])
+
+        self._watchMetrics['sweeps'] += 1
+        self._watchMetrics['lastSweepDuration'] = loopTime() - ltStart
+        self._watchMetrics['lastSweepPeers'] = len(peers)
+        self._watchMetrics['lastSweepFailures'] = sum(failures)
+        self._watchMetrics['backoffPeers'] = backoff
+
+        log.debug(f'Peers watch: swept {len(peers)} peers in '
+                  f"{self._watchMetrics['lastSweepDuration']:.2f} secs "
+                  f'({sum(failures)} unresponsive)')
+
+    def watcherMetrics(self):
+        return dict(self._watchMetrics)
 
     def getByPeerId(self, peerId):
         return self._byPeerId.get(peerId, None)
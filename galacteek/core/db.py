@@ -4,6 +4,7 @@ import sqlite3
 import time
 import weakref
 from datetime import datetime
+from datetime import timezone
 
 from PyQt5.QtCore import QObject
 from PyQt5.QtCore import pyqtSignal
@@ -32,6 +33,36 @@ objpath text, status integer);
 CREATE TABLE if not exists atom_feed_entries
 (id integer primary key, atom_feed_id integer, entry_id text,
 status integer, published timestamp);
+
+CREATE TABLE if not exists seeds_dags
+(udbh text primary key, dag_cid text, indexed timestamp);
+
+CREATE TABLE if not exists seeds_index
+(id integer primary key, seed_cid text, udbh text, section text,
+name text, description text, tags text, date_created real,
+UNIQUE(udbh, seed_cid));
+
+CREATE INDEX if not exists seeds_index_date
+ON seeds_index(date_created);
+'''
+
+# Full-text index for the seeds (needs FTS5 support in sqlite)
+seedsFtsScript = '''
+CREATE VIRTUAL TABLE if not exists seeds_fts
+USING fts5(name, description, tags, content='seeds_index',
+content_rowid='id');
+
+CREATE TRIGGER if not exists seeds_index_ai AFTER INSERT ON seeds_index
+BEGIN
+  INSERT INTO seeds_fts(rowid, name, description, tags)
+  VALUES (new.id, new.name, new.description, new.tags);
+END;
+
+CREATE TRIGGER if not exists seeds_index_ad AFTER DELETE ON seeds_index
+BEGIN
+  INSERT INTO seeds_fts(seeds_fts, rowid, name, description, tags)
+  VALUES ('delete', old.id, old.name, old.description, old.tags);
+END;
 '''
 
 
@@ -40,6 +71,7 @@ class SqliteDatabase:
         self._path = dbPath
         self._db = None
         self.feeds = AtomFeedsDatabase(self)
+        self.seeds = SeedsIndexDatabase(self)
 
     @property
     def db(self):
@@ -63,6 +95,13 @@ class SqliteDatabase:
             log.debug('Error while executing schema script')
             return False
 
+        try:
+            await self.db.executescript(seedsFtsScript)
+        except Exception as err:
+            log.debug(f'Seeds full-text index not available: {err}')
+        else:
+            self.seeds.ftsAvailable = True
+
     async def close(self):
         await self.db.close()
 
@@ -485,3 +524,150 @@ class AtomFeedsDatabase(QObject):
             return
         except Exception:
             return
+
+
+class SeedsIndexDatabase:
+    """
+    Local index of the seeds published by peers (from their seeds DAG),
+    keyed by seed CID, with a full-text index on the name, description
+    and tags of the seeds.
+
+    Each peer's seeds DAG is indexed incrementally: the DAG's CID is
+    recorded, and only seeds that are not already indexed are added.
+    """
+
+    def __init__(self, database):
+        self.sqliteDb = database
+        self.lock = asyncio.Lock()
+        self.ftsAvailable = False
+
+    @property
+    def db(self):
+        return self.sqliteDb.db
+
+    @property
+    def available(self):
+        return self.db is not None
+
+    async def dagIndexed(self, udbh: str, dagCid: str):
+        cursor = await self.db.execute(
+            'SELECT dag_cid FROM seeds_dags WHERE udbh=:udbh',
+            {'udbh': udbh}
+        )
+        row = await cursor.fetchone()
+        return row is not None and row['dag_cid'] == dagCid
+
+    async def seedsCids(self, udbh: str):
+        cursor = await self.db.execute(
+            'SELECT seed_cid FROM seeds_index WHERE udbh=:udbh',
+            {'udbh': udbh}
+        )
+        return set(row['seed_cid'] for row in await cursor.fetchall())
+
+    async def update(self, udbh: str, dagCid: str, seeds: list,
+                     keep: set = None):
+        """
+        Update the index for a peer's seeds DAG
+
+        :param str dagCid: CID of the peer's seeds DAG
+        :param list seeds: list of dicts (cid, section, name,
+            description, tags, date) for the seeds that are
+            not indexed yet
+        :param set keep: if set, the CIDs of all the seeds in the DAG
+            (seeds not in this set are removed from the index)
+        """
+
+        async with self.lock:
+            if keep is not None:
+                removed = (await self.seedsCids(udbh)) - keep
+
+                await self.db.executemany(
+                    'DELETE FROM seeds_index WHERE udbh=? AND seed_cid=?',
+                    [(udbh, cid) for cid in removed]
+                )
+
+            await self.db.executemany(
+                """INSERT OR IGNORE INTO seeds_index
+                (seed_cid, udbh, section, name, description,
+                tags, date_created)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(seed['cid'], udbh, seed['section'], seed['name'],
+                  seed['description'], ' '.join(seed['tags']),
+                  seed['date']) for seed in seeds]
+            )
+
+            await self.db.execute(
+                """INSERT OR REPLACE INTO seeds_dags
+                (udbh, dag_cid, indexed) VALUES (?, ?, ?)""",
+                (udbh, dagCid, datetime.now())
+            )
+            await self.db.commit()
+
+    async def search(self, regexp=None,
+                     query: str = None,
+                     dateFrom: datetime = None,
+                     dateTo: datetime = None,
+                     limit=1000):
+        """
+        Search the seeds index. query is a full-text query (FTS5 syntax)
+        on the name, description and tags. If there's no query (or if
+        the FTS query is invalid), the seed's name is matched against
+        the regexp.
+
+        Returns a list of (section, name, date, seedCid) tuples,
+        most recent first
+        """
+
+        if query and self.ftsAvailable:
+            sql = '''
+            SELECT seeds_index.* FROM seeds_fts
+            INNER JOIN seeds_index ON seeds_index.id = seeds_fts.rowid
+            WHERE seeds_fts MATCH :query
+            '''
+
+            try:
+                return await self.searchRows(
+                    sql, {'query': query}, dateFrom, dateTo, limit)
+            except sqlite3.OperationalError as err:
+                log.debug(f'Seeds index: invalid FTS query {query}: {err}')
+
+        return await self.searchRows(
+            'SELECT * FROM seeds_index WHERE 1', {},
+            dateFrom, dateTo, limit, regexp=regexp)
+
+    async def searchRows(self, sql, params, dateFrom, dateTo, limit,
+                         regexp=None):
+        # Seeds without a date only match when there's no date range
+        if dateFrom:
+            sql += ' AND date_created >= :datefrom'
+            params['datefrom'] = dateFrom.timestamp()
+
+        if dateTo:
+            sql += ' AND date_created <= :dateto'
+            params['dateto'] = dateTo.timestamp()
+
+        sql += ' ORDER BY date_created DESC'
+
+        results = []
+
+        async with self.db.execute(sql, params) as cursor:
+            async for row in cursor:
+                if regexp and not regexp.search(row['name']):
+                    continue
+
+                # Timestamps are stored in UTC
+                date = datetime.fromtimestamp(
+                    row['date_created'], timezone.utc) if \
+                    row['date_created'] else None
+
+                results.append((
+                    row['section'],
+                    row['name'],
+                    date.isoformat() if date else None,
+                    row['seed_cid']
+                ))
+
+                if len(results) >= limit:
+                    break
+
+        return results
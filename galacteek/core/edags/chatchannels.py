@@ -9,6 +9,8 @@ subscriber = psSubscriber('chat_channels_messages')
 
 
 class ChannelsDAG(EvolvingDAG):
+    saveCoalesce = True
+
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
 
@@ -3,6 +3,9 @@ from galacteek.ipfs.dag import EvolvingDAG
 
 
 class PeersGraphDAG(EvolvingDAG):
+    saveCoalesce = True
+    shardedPaths = ['peers']
+
     async def initDag(self, ipfsop):
         return {
             'peers': {},
@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 
 from galacteek import ensure
@@ -8,7 +9,9 @@ from galacteek.ipfs.dag import DAGPortal
 from galacteek.ipfs.dag import DAGError
 from galacteek.ipfs.wrappers import ipfsOp
 from galacteek.ipfs.cidhelpers import cidValid
+from galacteek.ipfs.cidhelpers import stripIpfs
 from galacteek.core.edags.aggregate import AggregateDAG
+from galacteek.core import runningApp
 from galacteek.core import utcDatetimeIso
 from galacteek.core import parseDate
 from galacteek.core import jsonSchemaValidate
@@ -105,6 +108,9 @@ class SeedsEDag(EvolvingDAG, SeedsCommon):
         "required": ["c", "params"]
     }
 
+    shardedPaths = ['c/seeds/*', 'c/leaves', 'c/reports']
+    saveCoalesce = True
+
     def __init__(self, *args, **kw):
         super(SeedsEDag, self).__init__(*args, **kw)
 
@@ -288,10 +294,150 @@ class SeedsEDag(EvolvingDAG, SeedsCommon):
 
 
 class MegaSeedsEDag(AggregateDAG):
+    # Max number of seed descriptions fetched at the same time
+    indexFetchConcurrency = 8
+
     def __init__(self, *args, **kw):
         super(MegaSeedsEDag, self).__init__(*args, **kw)
 
         self.megaMergeHistory = {}
+        self._indexSynced = False
+        self._indexSyncTask = None
+        self._indexQueue = {}
+        self._indexQueueTask = None
+
+    @property
+    def seedsIndex(self):
+        app = runningApp()
+        sqliteDb = getattr(app, 'sqliteDb', None) if app else None
+
+        if sqliteDb and sqliteDb.seeds.available:
+            return sqliteDb.seeds
+
+    @ipfsOp
+    async def indexSeeds(self, ipfsop, pdag, udbh: str, prune=True):
+        """
+        Index the seeds of a peer's seeds DAG (loaded in pdag), under
+        the udbh key. Only the seeds that are not indexed yet are
+        processed.
+
+        With prune, indexed seeds which are not in the DAG anymore are
+        removed from the index: only prune with a udbh that was computed
+        locally (not one supplied by a remote DAG).
+        """
+
+        index = self.seedsIndex
+        if not index:
+            return False
+
+        dagCid = stripIpfs(pdag.dagCid)
+
+        if await index.dagIndexed(udbh, dagCid):
+            return True
+
+        known = await index.seedsCids(udbh)
+        cids, new = set(), []
+        sem = asyncio.Semaphore(self.indexFetchConcurrency)
+
+        async def describe(cid):
+            async with sem:
+                description = await ipfsop.waitFor(
+                    ipfsop.dagGet(f'{cid}/seed/description'), 5)
+                return description if isinstance(description, str) else ''
+
+        for sname, section in pdag.root['c']['seeds'].items():
+            lkeys = [key for key in section.keys() if not key.startswith('_')]
+
+            for key in lkeys:
+                for entry in section[key]:
+                    try:
+                        meta = entry['_metadata']
+                        cid = entry['seedlink'].get('/')
+                        assert cidValid(cid)
+                    except Exception:
+                        continue
+
+                    cids.add(cid)
+
+                    if cid in known:
+                        continue
+
+                    date = parseDate(meta.get('datecreated'))
+                    tags = meta.get('tags', []) + meta.get('keywords', [])
+
+                    new.append({
+                        'cid': cid,
+                        'section': sname,
+                        'name': key,
+                        'description': '',
+                        'tags': [t for t in tags if isinstance(t, str)],
+                        'date': date.timestamp() if date else None
+                    })
+
+                await ipfsop.sleep()
+
+        descriptions = await asyncio.gather(
+            *[describe(seed['cid']) for seed in new])
+
+        for seed, description in zip(new, descriptions):
+            seed['description'] = description
+
+        await index.update(udbh, dagCid, new,
+                           keep=cids if prune else None)
+
+        self.debug(f'Seeds index: {udbh}: {len(new)} new seeds')
+        return True
+
+    async def indexSync(self):
+        """
+        Make sure the seeds DAGs of all the nodes are indexed
+        """
+
+        for udbh in list(self.nodes):
+            try:
+                async with self.portalToPath(
+                        f'nodes/{udbh}/link',
+                        dagClass=SeedsPortal) as pdag:
+                    # Nodes can come from mega merges, don't prune
+                    await self.indexSeeds(pdag, udbh, prune=False)
+            except Exception as err:
+                log.debug(f'Seeds index: cannot index node {udbh}: {err}')
+                continue
+
+        self._indexSynced = True
+
+    def indexSyncStart(self):
+        """
+        Sync the seeds index in the background
+        """
+
+        if self._indexSynced:
+            return
+
+        if not self._indexSyncTask or self._indexSyncTask.done():
+            self._indexSyncTask = ensure(self.indexSync())
+
+    def indexLater(self, dagCid: str, udbh: str, prune=False):
+        """
+        Queue the indexing of a peer's seeds DAG, done in the
+        background (out of the mega DAG's lock)
+        """
+
+        self._indexQueue[udbh] = (dagCid, prune)
+
+        if not self._indexQueueTask or self._indexQueueTask.done():
+            self._indexQueueTask = ensure(self.indexQueueProcess())
+
+    async def indexQueueProcess(self):
+        while self._indexQueue:
+            udbh = next(iter(self._indexQueue))
+            dagCid, prune = self._indexQueue.pop(udbh)
+
+            try:
+                async with SeedsPortal(dagCid=dagCid) as pdag:
+                    await self.indexSeeds(pdag, udbh, prune=prune)
+            except Exception as err:
+                log.debug(f'Seeds index: cannot index {dagCid}: {err}')
 
     def udbHash(self, peerId, dagUid):
         return seedUdlHash(peerId, dagUid)
@@ -322,13 +468,37 @@ class MegaSeedsEDag(AggregateDAG):
 
                     date = parseDate(datecreated)
 
-                    if date and dateFrom and dateTo:
-                        if date >= dateFrom and date <= dateTo:
-                            yield sname, key, datecreated, link
-                    else:
-                        yield sname, key, datecreated, link
+                    if dateFrom or dateTo:
+                        # Seeds without a date don't match a date range
+                        if not date:
+                            continue
+
+                        if dateFrom and date < dateFrom:
+                            continue
+
+                        if dateTo and date > dateTo:
+                            continue
+
+                    yield sname, key, datecreated, link
+
+    async def search(self, regexp, dateFrom=None, dateTo=None,
+                     query=None):
+        index = self.seedsIndex
+
+        if index:
+            # Search what's already indexed, nodes which are not indexed
+            # yet will show up in the next searches
+            self.indexSyncStart()
+
+            for found in await index.search(
+                    regexp=regexp,
+                    query=query,
+                    dateFrom=dateFrom,
+                    dateTo=dateTo):
+                yield found
+
+            return
 
-    async def search(self, regexp, dateFrom=None, dateTo=None):
         for peer in self.nodes:
             try:
                 async with self.portalToPath(
@@ -396,6 +566,16 @@ class MegaSeedsEDag(AggregateDAG):
                 else:
                     log.debug(f'Analyzing DAG: {dagCid}: SIG OK !')
 
+                # The index key is computed from the peer's ID, a DAG
+                # claiming another peer's key is rejected
+                udbh = self.udbHash(peerId, pdag.root['params']['seeduid'])
+
+                if pdag.root['params']['seedudbh'] != udbh:
+                    log.debug(f'Analyzing DAG: {dagCid}: udbh mismatch')
+                    return False
+
+                self.indexLater(dagCid, udbh, prune=True)
+
                 # Pin seeds descriptors
                 for sname, section in pdag.root['c']['seeds'].items():
                     lkeys = [key for key in section.keys() if
@@ -403,12 +583,17 @@ class MegaSeedsEDag(AggregateDAG):
                     for key in lkeys:
                         seeds = section[key]
 
-                        for idx, entry in enumerate(seeds):
-                            path = f'c/seeds/{sname}/{key}/{idx}/seedlink'
-                            resolved = await pdag.resolve(path)
-                            if resolved:
-                                ensure(ipfsop.pin(
-                                    resolved, recursive=False, timeout=20))
+                        for entry in seeds:
+                            # Use the (expanded) root, the seeds maps can
+                            # be stored as shards
+                            try:
+                                link = entry['seedlink'].get('/')
+                                assert cidValid(link)
+                            except Exception:
+                                continue
+
+                            ensure(ipfsop.pin(
+                                link, recursive=False, timeout=20))
 
                         await ipfsop.sleep()
 
@@ -442,6 +627,10 @@ class MegaSeedsEDag(AggregateDAG):
                 raise Exception(
                     f'Cannot fetch pubkey with CID: {signerPubKeyCid}')
 
+            # (seeds DAG CID, udbh) of the merged nodes, indexed
+            # once the mega DAG is released
+            merged = []
+
             async with self as mega:  # <==== Mega EDAG write ^_^
                 async with DAGPortal(mDagCid) as rPort:
                     aggiterUid = rPort.root['data']['aggiter_uid']
@@ -489,6 +678,8 @@ class MegaSeedsEDag(AggregateDAG):
                                         # Branch
                                         mega.root['nodes'][udh] = node
 
+                                        merged.append((seedsCid, udh))
+
                                         self.debug(
                                             f'Mega merge {mDagCid} : '
                                             f'Merged udh {udh}')
@@ -512,6 +703,10 @@ class MegaSeedsEDag(AggregateDAG):
                             log.debug(f'Mega merge {seedsCid}: OK')
                             await ipfsop.sleep(0.1)
                             continue
+
+            for seedsCid, udh in merged:
+                # The node's key comes from the remote DAG, don't prune
+                self.indexLater(stripIpfs(seedsCid), udh, prune=False)
         except Exception as e:
             log.debug(f'Mega merge error: {e}')
 
@@ -1,4 +1,7 @@
 import json
+import orjson
+import os
+import os.path
 import time
 import sys
 import collections
@@ -7,13 +10,12 @@ import re
 import posixpath
 import asyncio
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 
-import aiofiles
-
 from galacteek import log
 from galacteek.core import utcDatetimeIso
 from galacteek.core import parseDate
@@ -30,6 +32,39 @@ class MarksEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def marksDefault(obj):
+    # orjson serializer for the objects stored in the collections
+    if isinstance(obj, collections.UserDict):
+        return obj.data
+    raise TypeError
+
+
+def journalApply(root, entry):
+    """
+    Apply a journal entry (a mutation at a given keys path)
+    to a hashmarks collection
+    """
+
+    op, keys = entry['op'], entry['p']
+    node = root
+
+    for key in keys[:-1]:
+        node = node.setdefault(key, {}) if op == 'set' else node[key]
+
+    last = keys[-1]
+
+    if op == 'set':
+        node[last] = entry['v']
+    elif op == 'del':
+        node.pop(last, None)
+    elif op == 'append':
+        node[last].append(entry['v'])
+    elif op == 'pop':
+        node[last].pop(entry.get('i', -1))
+    else:
+        raise ValueError(f'Invalid journal operation: {op}')
+
+
 marksKey = '_marks'
 pyramidsKey = '_pyramids'
 pyramidsMarksKey = '_pyramidmarks'
@@ -360,6 +395,17 @@ class IPFSMarks(QObject):
     pyramidChanged = pyqtSignal(str)
     pyramidEmpty = pyqtSignal(str)
 
+    # Number of journaled changes after which the journal is compacted
+    # into the snapshot file
+    compactEvery = 512
+
+    # Delay (in seconds) before writing a snapshot after a change
+    # that was not journaled
+    compactDelay = 5
+
+    # Delay (in seconds) between two backups of the snapshot file
+    backupInterval = 300
+
     def __init__(self, path, parent=None, data=None, autosave=True,
                  backup=False):
         super().__init__(parent)
@@ -367,10 +413,21 @@ class IPFSMarks(QObject):
         self._path = path
         self._autosave = autosave
         self._backup = backup
+        self._journal = []
+        self._journalCount = 0
+        self._jLogged = False
+        self._seq = 0
+        self._compactPending = False
+        self._ioExec = None
+        self._lastBackup = None
+        self.lastsaved = None
+
         self._marks = data if data else self.load()
         self.changed.connect(self.onChanged)
-        self.lastsaved = None
-        self.changed.emit()
+
+        if self.autosave and self.path and (
+                self._journalCount > 0 or not os.path.exists(self.path)):
+            self.compactSchedule()
 
         self.pyramidCapstoned.connect(self.onPyramidCapstone)
 
@@ -378,6 +435,10 @@ class IPFSMarks(QObject):
     def path(self):
         return self._path
 
+    @property
+    def journalPath(self):
+        return f'{self.path}.journal'
+
     @property
     def autosave(self):
         return self._autosave
@@ -420,60 +481,220 @@ class IPFSMarks(QObject):
         if not self.path:
             return self.skeleton()
         try:
-            with open(self.path, 'rt') as fd:
-                marks = json.load(fd)
+            with open(self.path, 'rb') as fd:
+                marks = orjson.loads(fd.read())
 
             if 'qamappings' not in marks:
                 marks['qamappings'] = []
 
             if 'uuid' not in marks:
                 marks['uuid'] = str(uuid.uuid4())
-
-            return marks
         except Exception:
             marks = collections.OrderedDict()
 
         if 'ipfsmarks' not in marks:
             marks = self.skeleton()
 
+        self.journalReplay(marks)
         return marks
 
-    def onChanged(self):
-        if self.autosave is True:
-            self.save()
+    def journalReplay(self, marks):
+        """
+        Apply the changes recorded in the journal since the
+        last snapshot
+        """
 
-    def save(self):
-        """ Save synchronously """
-        if not self.path:  # don't save
+        self._seq = marks.get('journalseq', 0)
+
+        if not os.path.isfile(self.journalPath):
+            return
+
+        try:
+            with open(self.journalPath, 'rb') as fd:
+                for line in fd:
+                    try:
+                        entry = orjson.loads(line)
+                    except Exception:
+                        # Incomplete write
+                        break
+
+                    if entry.get('s', 0) <= self._seq:
+                        # Already in the snapshot
+                        continue
+
+                    try:
+                        journalApply(marks, entry)
+                    except Exception as err:
+                        log.debug(f'Hashmarks journal: {entry}: {err}')
+
+                    self._seq = entry['s']
+                    self._journalCount += 1
+        except Exception as err:
+            log.debug(f'Could not read hashmarks journal: {err}')
+
+        log.debug(f'Hashmarks ({self.path}): replayed '
+                  f'{self._journalCount} journal entries')
+
+    def jLog(self, op, keys: list, value=None, **kw):
+        """
+        Record a change in the journal (written when changed
+        is emitted)
+        """
+
+        if self.autosave is not True or not self.path:
             return
+
+        self._seq += 1
+
+        entry = {'s': self._seq, 'op': op, 'p': keys}
+        if op in ['set', 'append']:
+            entry['v'] = value
+
+        entry.update(kw)
+
         try:
-            with open(self.path, 'w+t') as fd:
-                self.serialize(fd)
-        except BaseException:
-            log.debug('Could not save hashmarks ({0}'.format(
-                self.path))
+            self._journal.append(
+                orjson.dumps(entry, default=marksDefault) + b'\n')
+            self._jLogged = True
+        except Exception as err:
+            log.debug(f'Hashmarks journal: cannot serialize change: {err}')
+
+    def categoryKeys(self, category):
+        return ['ipfsmarks', 'categories'] + \
+            category.lstrip('/').rstrip('/').split('/')
+
+    def ioRun(self, fn, *args):
+        """
+        Run a blocking I/O function in the collection's I/O thread
+        (calls are processed in order)
+        """
+
+        if not self._ioExec:
+            self._ioExec = ThreadPoolExecutor(max_workers=1)
+
+        def run():
+            try:
+                return fn(*args)
+            except Exception as err:
+                log.debug(f'Hashmarks ({self.path}): I/O error: {err}')
+
+        return self._ioExec.submit(run)
+
+    def onChanged(self):
+        if self.autosave is not True or not self.path:
+            return
+
+        # Was this change journaled ? (the journal can also hold
+        # entries from an earlier call)
+        journaled, self._jLogged = self._jLogged, False
+
+        if self._journal:
+            entries, self._journal = self._journal, []
+            self._journalCount += len(entries)
+
+            self.ioRun(self._journalWrite, b''.join(entries))
+
+        if self._journalCount >= self.compactEvery:
+            self.compact()
+        elif not journaled:
+            # Not journaled, write a snapshot
+            self.compactSchedule()
+
+    def _journalWrite(self, data: bytes):
+        with open(self.journalPath, 'ab') as fd:
+            fd.write(data)
+
+    def _snapshotWrite(self, data: bytes, backup=False):
+        tmpPath = f'{self.path}.tmp'
+
+        with open(tmpPath, 'wb') as fd:
+            fd.write(data)
+
+        os.replace(tmpPath, self.path)
+
+        # Everything in the journal is now in the snapshot
+        with open(self.journalPath, 'wb'):
+            pass
+
+        if backup:
+            bkpPath = '{0}.bkp'.format(self.path)
+
+            with open(bkpPath, 'wb') as fd:
+                fd.write(data)
+
+            log.debug('Hashmarks backup saved: {}'.format(bkpPath))
+
+    def compactSchedule(self):
+        if self._compactPending:
+            return
+
+        self._compactPending = True
+
+        loop = asyncio.get_event_loop()
+
+        if loop.is_running():
+            loop.call_later(self.compactDelay, self.compact)
         else:
-            if not self.backup:
-                return
+            self.compact()
 
-            now = time.time()
-            if not self.lastsaved or (now - self.lastsaved) > (60 * 5):
-                bkpPath = '{0}.bkp'.format(self.path)
+    def compact(self):
+        """
+        Write a snapshot of the collection (in the I/O thread) and
+        reset the journal. Returns a future.
+        """
 
-                try:
-                    with open(bkpPath, 'w+t') as fd:
-                        self.serialize(fd)
-                except:
-                    log.debug('Could not save backup file {0}'.format(bkpPath))
-                else:
-                    log.debug('Hashmarks backup saved: {}'.format(bkpPath))
+        self._compactPending = False
+
+        if not self.path:
+            return None
+
+        now = time.time()
+        self._journal.clear()
+        self.root['journalseq'] = self._seq
+
+        try:
+            data = orjson.dumps(self.root, default=marksDefault,
+                                option=orjson.OPT_INDENT_2)
+        except Exception as err:
+            log.debug('Could not save hashmarks ({0}): {1}'.format(
+                self.path, err))
+            return None
+
+        backup = self.backup and (
+            not self._lastBackup or
+            (now - self._lastBackup) > self.backupInterval
+        )
+
+        if backup:
+            self._lastBackup = now
 
-            self.lastsaved = now
+        self._journalCount = 0
+        self.lastsaved = now
+
+        return self.ioRun(self._snapshotWrite, data, backup)
+
+    def save(self):
+        """ Save synchronously """
+        future = self.compact()
+        if future:
+            future.result()
 
     async def saveAsync(self):
-        async with aiofiles.open(self.path, 'w+t') as fd:
-            await fd.write(json.dumps(self.root, indent=4, cls=MarksEncoder))
-            self.lastsaved = time.time()
+        future = self.compact()
+        if future:
+            await asyncio.wrap_future(future)
+
+    def close(self):
+        """
+        Write the pending changes and stop the I/O thread
+        """
+
+        if self._journalCount > 0 or self._compactPending:
+            self.save()
+
+        if self._ioExec:
+            self._ioExec.shutdown(wait=True)
+            self._ioExec = None
 
     def hasCategory(self, category, parent=None):
         if parent is None:
@@ -491,16 +712,20 @@ class IPFSMarks(QObject):
         e.g ['general', 'news'] for category path /general/news
         """
         def _walk(path, parent=None):
+            keys = ['ipfsmarks', 'categories']
+
             for p in path:
                 if p.startswith('_'):
                     return
                 if p in parent.keys():
                     parent = parent[p]
                 elif p not in parent.keys() and create is True:
-                    self.addCategory(p, parent=parent)
+                    self.addCategory(p, parent=parent, parentKeys=keys)
                     parent = parent[p]
                 else:
                     return
+
+                keys = keys + [p]
             return parent
         return _walk(path, parent=self._rootCategories)
 
@@ -516,9 +741,10 @@ class IPFSMarks(QObject):
 
         return sorted(list(_list([], parent=self._rootCategories)))
 
-    def addCategory(self, category, parent=None):
+    def addCategory(self, category, parent=None, parentKeys=None):
         if parent is None:
             parent = self._rootCategories
+            parentKeys = ['ipfsmarks', 'categories']
 
         if len(category) > 256:
             return None
@@ -528,6 +754,10 @@ class IPFSMarks(QObject):
                 marksKey: {},
                 pyramidsKey: {}
             }
+
+            if parentKeys:
+                self.jLog('set', parentKeys + [category], parent[category])
+
             self.changed.emit()
             return parent[category]
 
@@ -709,6 +939,8 @@ class IPFSMarks(QObject):
 
                 if delete is True:
                     del marks[path]
+                    self.jLog('del', self.categoryKeys(cat) + [
+                        marksKey, path])
                     self.markDeleted.emit(cat, path)
                     self.changed.emit()
                     return True
@@ -734,6 +966,8 @@ class IPFSMarks(QObject):
                     eMark['icon'] = mark.markData['icon']
                 return False
             sec[marksKey].update(mark)
+            self.jLog('set', self.categoryKeys(category) + [
+                marksKey, mark.path], mark.markData)
             self.markAdded.emit(mark.path, mark.markData)
         else:
             try:
@@ -745,6 +979,8 @@ class IPFSMarks(QObject):
                         eMark['icon'] = mData['icon']
                     return False
                 sec[marksKey][mPath] = mData
+                self.jLog('set', self.categoryKeys(category) + [
+                    marksKey, mPath], mData)
                 self.markAdded.emit(mPath, mData)
             except Exception:
                 return False
@@ -783,6 +1019,8 @@ class IPFSMarks(QObject):
                                  )
 
         sec[marksKey].update(mark)
+        self.jLog('set', self.categoryKeys(category) + [marksKey, path],
+                  mark.markData)
         self.changed.emit()
         self.markAdded.emit(path, mark.markData)
 
@@ -837,6 +1075,7 @@ class IPFSMarks(QObject):
             'autopin': autoPin,
             marksKey: {},
         }
+        self.jLog('set', ['feeds', ipnsp], feedsSec[ipnsp])
         self.changed.emit()
         return feedsSec[ipnsp]
 
@@ -850,6 +1089,8 @@ class IPFSMarks(QObject):
             return False
 
         sec.update(mark)
+        self.jLog('set', ['feeds', ipnsp, marksKey, mark.path],
+                  mark.markData)
         self.feedMarkAdded.emit(feed['name'], mark)
         self.changed.emit()
         return True
@@ -932,6 +1173,8 @@ class IPFSMarks(QObject):
                 extra=extra
             )
             sec[pyramidsKey].update(pyramid)
+            self.jLog('set', self.categoryKeys(category) + [
+                pyramidsKey, name], sec[pyramidsKey][name])
             self.pyramidConfigured.emit(self.pyramidPathFormat(category, name))
             self.changed.emit()
             return sec[pyramidsKey][name]
@@ -969,6 +1212,8 @@ class IPFSMarks(QObject):
 
         if name in sec[pyramidsKey]:
             del sec[pyramidsKey][name]
+            self.jLog('del', self.categoryKeys(category) + [
+                pyramidsKey, name])
             self.changed.emit()
 
     def pyramidAdd(self, pyramidPath, path, unique=False,
@@ -987,11 +1232,9 @@ class IPFSMarks(QObject):
 
         if name in sec[pyramidsKey]:
             pyramid = sec[pyramidsKey][name]
+            pKeys = self.categoryKeys(category) + [pyramidsKey, name]
             count = len(pyramid[key])
 
-            if count >= pyramid.get('maxhashmarks', pyramidMaxHmarksDefault):
-                pyramid[key].pop(0)
-
             # Don't register something that's already there
             if unique:
                 for item in pyramid[key]:
@@ -1000,6 +1243,10 @@ class IPFSMarks(QObject):
                         log.debug(f'Hashmark {path} already in pyramid {name}')
                         return False
 
+            if count >= pyramid.get('maxhashmarks', pyramidMaxHmarksDefault):
+                pyramid[key].pop(0)
+                self.jLog('pop', pKeys + [key], i=0)
+
             exmark = self.find(path)
 
             if exmark:
@@ -1018,6 +1265,9 @@ class IPFSMarks(QObject):
             pyramid[key].append(mark.data)
             pyramid['latest'] = path
 
+            self.jLog('append', pKeys + [key], mark.data)
+            self.jLog('set', pKeys + ['latest'], path)
+
             self.pyramidAddedMark.emit(pyramidPath, mark, type)
             self.pyramidChanged.emit(pyramidPath)
 
@@ -1080,6 +1330,7 @@ class IPFSMarks(QObject):
             name, mappedTo, title=title,
             ipnsResolveFrequency=ipnsResolveFrequency)
         self._rootQMappings.append(mapping.data)
+        self.jLog('append', ['qamappings'], mapping.data)
         self.changed.emit()
         return True
 
@@ -3,6 +3,9 @@ import aiofiles
 import os.path
 import os
 import orjson
+import shutil
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from itertools import zip_longest
 
 from galacteek import log
@@ -10,9 +13,69 @@ from galacteek.ipfs.cidhelpers import stripIpfs
 from galacteek.ipfs.cidhelpers import isIpfsPath
 
 
-class IPFSObjectMetadataDatabase:
+def metaKey(rscPath):
     """
-    Basic file-based database to hold metadata about IPFS objects by path
+    Returns the metadata key for an IPFS path (None if the path
+    is not an IPFS path)
+    """
+
+    if isinstance(rscPath, str) and isIpfsPath(rscPath):
+        return stripIpfs(rscPath.rstrip('/')).replace('/', '_')
+
+
+def dirEntriesPacks(data, egenCount=16):
+    if isinstance(data, list):
+        for pack in zip_longest(*[iter(data)] * egenCount,
+                                fillvalue=None):
+            yield [e for e in pack if e is not None]
+
+
+class MetadataStore:
+    """
+    Storage backend for the objects metadata
+    """
+
+    async def get(self, key: str):
+        raise NotImplementedError
+
+    async def store(self, key: str, data: dict):
+        """
+        Store the metadata for an object. If there's existing metadata,
+        only the keys that aren't in the existing metadata are added
+        """
+        raise NotImplementedError
+
+    async def getDirEntries(self, key: str):
+        raise NotImplementedError
+
+    async def writeDirEntries(self, key: str, data: list,
+                              complete: bool = False):
+        """
+        Store the directory entries of an object, if we don't
+        have them already. complete tells if data is the full
+        listing of the directory (a complete listing replaces
+        a partial one)
+        """
+        raise NotImplementedError
+
+    async def hasDirEntries(self, key: str, complete: bool = False):
+        """
+        Returns True if we have the directory entries of an object
+        (only if they're from a complete listing if complete is set)
+        """
+        raise NotImplementedError
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FilesMetadataStore(MetadataStore):
+    """
+    File-based metadata store (one JSON file per object, stored
+    in a directory named after the first 8 characters of the key)
     """
 
     def __init__(self, metaDbPath, loop=None):
@@ -24,50 +87,53 @@ class IPFSObjectMetadataDatabase:
     def metaDbPath(self):
         return self._metaDbPath
 
-    def path(self, rscPath, ext=None):
-        if isinstance(rscPath, str) and isIpfsPath(rscPath):
-            path = stripIpfs(
-                rscPath.rstrip('/')).replace('/', '_')
-            comps = path.split('/')
-
-            if len(comps) > 0:
-                containerId = comps[0][0:8]
-                containerPath = os.path.join(self.metaDbPath, containerId)
-                metaPath = os.path.join(containerPath, path)
+    def path(self, key, ext=None):
+        if key:
+            containerPath = os.path.join(self.metaDbPath, key[0:8])
+            metaPath = os.path.join(containerPath, key)
 
-                if isinstance(ext, str):
-                    metaPath = f'{metaPath}.{ext}'
+            if isinstance(ext, str):
+                metaPath = f'{metaPath}.{ext}'
 
-                return containerPath, metaPath, os.path.exists(metaPath)
+            return containerPath, metaPath, os.path.exists(metaPath)
 
         return None, None, False
 
-    def pathDirEntries(self, rscPath):
-        return self.path(rscPath, ext='direntries')
-
     async def write(self, metaPath, metadata, mode='w+b'):
         async with aiofiles.open(metaPath, mode) as fd:
             await fd.write(
                 orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
             )
 
-    async def writeDirEntries(self, rscPath, data, mode='w+b'):
-        cPath, dePath, exists = self.pathDirEntries(rscPath)
+    async def writeDirEntries(self, key, data, complete=False, mode='w+b'):
+        cPath, dePath, exists = self.path(key, ext='direntries')
+        cmPath, hasComplete = self.path(key, ext='dircomplete')[1:]
 
-        if not exists:
+        if dePath and (not exists or (complete and not hasComplete)):
             if not os.path.isdir(cPath):
                 os.mkdir(cPath)
 
             try:
                 async with aiofiles.open(dePath, mode) as fd:
                     await fd.write(orjson.dumps(data))
+
+                if complete:
+                    # Empty file marking the listing as complete
+                    async with aiofiles.open(cmPath, mode) as fd:
+                        await fd.write(b'')
             except BaseException:
-                log.debug(f'Error storing dirents for {rscPath}')
+                log.debug(f'Error storing dirents for {key}')
             else:
-                log.debug(f'Stored dirents for {rscPath}')
+                log.debug(f'Stored dirents for {key}')
 
-    async def store(self, rscPath, **data):
-        containerPath, metaPath, exists = self.path(rscPath)
+    async def hasDirEntries(self, key, complete=False):
+        if complete:
+            return self.path(key, ext='dircomplete')[2]
+
+        return self.path(key, ext='direntries')[2]
+
+    async def store(self, key, data):
+        containerPath, metaPath, exists = self.path(key)
         if metaPath and not exists:
             await asyncio.sleep(0)
             async with self._lock:
@@ -76,29 +142,28 @@ class IPFSObjectMetadataDatabase:
                 try:
                     await self.write(metaPath, data)
                 except BaseException:
-                    log.debug('Error storing metadata for {0}'.format(
-                        rscPath))
+                    log.debug('Error storing metadata for {0}'.format(key))
                 else:
-                    log.debug('{0}: stored metadata {1}'.format(rscPath, data))
+                    log.debug('{0}: stored metadata {1}'.format(key, data))
         elif metaPath and exists:
             # Patch the existing metadata
             await asyncio.sleep(0)
 
-            metadata = await self.get(rscPath)
+            metadata = await self.get(key)
             if not isinstance(metadata, dict):
                 return
 
             async with self._lock:
-                for key, value in data.items():
-                    if key not in metadata:
-                        metadata[key] = value
+                for mkey, value in data.items():
+                    if mkey not in metadata:
+                        metadata[mkey] = value
                 try:
                     await self.write(metaPath, metadata)
                 except BaseException:
                     pass
 
-    async def get(self, rscPath):
-        containerPath, metaPath, exists = self.path(rscPath)
+    async def get(self, key):
+        containerPath, metaPath, exists = self.path(key)
         if metaPath and exists:
             await asyncio.sleep(0)
             async with self._lock:
@@ -109,23 +174,394 @@ class IPFSObjectMetadataDatabase:
                 except BaseException as err:
                     # Error reading metadata
                     log.debug('Error reading metadata for {0}: {1}'.format(
-                        rscPath, str(err)))
+                        key, str(err)))
                     os.unlink(metaPath)
 
-    async def getDirEntries(self, rscPath, egenCount=16):
-        containerPath, dePath, exists = self.pathDirEntries(rscPath)
+    async def getDirEntries(self, key):
+        containerPath, dePath, exists = self.path(key, ext='direntries')
 
         if dePath and exists:
+            async with aiofiles.open(dePath, 'rt') as fd:
+                return orjson.loads(await fd.read())
+
+
+class SqliteMetadataStore(MetadataStore):
+    """
+    SQLite (WAL mode) metadata store
+
+    All the database operations run in a single thread (which owns
+    the connection). Writes are buffered and committed in batches,
+    either when batchSize objects are waiting or after flushDelay
+    seconds. Reads are queued after the pending writes so they
+    always see them.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS objmeta (
+            key TEXT PRIMARY KEY,
+            metadata BLOB,
+            direntries BLOB,
+            dircomplete INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, dbPath, batchSize=256, flushDelay=0.5):
+        self.dbPath = dbPath
+        self.batchSize = batchSize
+        self.flushDelay = flushDelay
+
+        self._conn = None
+        self._pending = {}
+        self._flushHandle = None
+        self._exec = ThreadPoolExecutor(max_workers=1,
+                                        thread_name_prefix='mhashmetadb')
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.dbPath)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self.schema)
+
+            columns = [row[1] for row in self._conn.execute(
+                'PRAGMA table_info(objmeta)')]
+
+            if 'dircomplete' not in columns:
+                # Databases created before the completeness flag
+                self._conn.execute(
+                    'ALTER TABLE objmeta ADD COLUMN '
+                    'dircomplete INTEGER NOT NULL DEFAULT 0')
+
+        return self._conn
+
+    async def run(self, fn, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._exec, fn, *args)
+
+    def _read(self, key, column):
+        row = self._connect().execute(
+            f'SELECT {column} FROM objmeta WHERE key = ?',
+            (key, )).fetchone()
+
+        return row[0] if row else None
+
+    def _write(self, batch: dict):
+        conn = self._connect()
+
+        with conn:
+            for key, entry in batch.items():
+                patch = entry.get('metadata')
+                dirEntries = entry.get('direntries')
+
+                if patch:
+                    data = conn.execute(
+                        'SELECT metadata FROM objmeta WHERE key = ?',
+                        (key, )).fetchone()
+                    metadata = orjson.loads(data[0]) if data and data[0] \
+                        else {}
+
+                    for mkey, value in patch.items():
+                        metadata.setdefault(mkey, value)
+
+                    conn.execute(
+                        'INSERT INTO objmeta (key, metadata) VALUES (?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET '
+                        'metadata = excluded.metadata',
+                        (key, orjson.dumps(metadata)))
+
+                if dirEntries is not None:
+                    conn.execute(
+                        'INSERT INTO objmeta (key, direntries, dircomplete) '
+                        'VALUES (?, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET '
+                        'direntries = excluded.direntries, '
+                        'dircomplete = excluded.dircomplete '
+                        'WHERE objmeta.direntries IS NULL OR '
+                        '(objmeta.dircomplete = 0 AND '
+                        'excluded.dircomplete = 1)',
+                        (key, orjson.dumps(dirEntries),
+                         int(entry.get('dircomplete', False))))
+
+    def _close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _flushDone(self, future):
+        if not future.cancelled() and future.exception():
+            log.warning(
+                f'Metadata DB: flush error: {future.exception()}')
+
+    def _flushBackground(self):
+        # Nobody awaits this commit, log the errors
+        self.flushNow().add_done_callback(self._flushDone)
+
+    def _flushLater(self):
+        if len(self._pending) >= self.batchSize:
+            self._flushBackground()
+        elif not self._flushHandle:
+            self._flushHandle = asyncio.get_event_loop().call_later(
+                self.flushDelay, self._flushBackground)
+
+    def flushNow(self):
+        """
+        Queue the commit of the pending writes, returns a future
+        """
+
+        if self._flushHandle:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+
+        batch, self._pending = self._pending, {}
+
+        return asyncio.get_event_loop().run_in_executor(
+            self._exec, self._write, batch)
+
+    async def flush(self):
+        try:
+            await self.flushNow()
+        except Exception as err:
+            log.debug(f'Metadata DB: flush error: {err}')
+
+    async def get(self, key):
+        patch = self._pending.get(key, {}).get('metadata')
+
+        try:
+            data = await self.run(self._read, key, 'metadata')
+        except Exception as err:
+            log.debug(f'Error reading metadata for {key}: {err}')
+            data = None
+
+        metadata = orjson.loads(data) if data else None
+
+        if patch:
+            # Not committed yet
+            metadata = metadata if metadata else {}
+
+            for mkey, value in patch.items():
+                metadata.setdefault(mkey, value)
+
+        return metadata
+
+    async def store(self, key, data):
+        patch = self._pending.setdefault(key, {}).setdefault('metadata', {})
+
+        for mkey, value in data.items():
+            patch.setdefault(mkey, value)
+
+        self._flushLater()
+
+    async def getDirEntries(self, key):
+        entry = self._pending.get(key, {})
+        dirEntries = entry.get('direntries')
+
+        if dirEntries is None or not entry.get('dircomplete'):
+            # A committed listing wins over a pending partial one
+            data = await self.run(self._read, key, 'direntries')
+            dirEntries = orjson.loads(data) if data else dirEntries
+
+        return dirEntries
+
+    async def writeDirEntries(self, key, data, complete=False):
+        entry = self._pending.setdefault(key, {})
+
+        if 'direntries' not in entry or (
+                complete and not entry.get('dircomplete')):
+            entry['direntries'] = data
+            entry['dircomplete'] = complete
+
+        self._flushLater()
+
+    async def hasDirEntries(self, key, complete=False):
+        entry = self._pending.get(key, {})
+
+        if entry.get('direntries') is not None and (
+                not complete or entry.get('dircomplete')):
+            return True
+
+        try:
+            if complete:
+                return bool(await self.run(self._read, key, 'dircomplete'))
+
+            return await self.run(self._read, key, 'direntries') is not None
+        except Exception:
+            return False
+
+    async def close(self):
+        await self.flush()
+        await self.run(self._close)
+
+        self._exec.shutdown(wait=True)
+
+
+def metaDbMigrate(srcPath: str, dbPath: str, batchSize=512):
+    """
+    Migrate a file-based metadata database (directory at srcPath)
+    to an SQLite metadata database, removing the migrated files.
+
+    This is blocking. Returns the number of entries (metadata or
+    directory entries) migrated.
+    """
+
+    store = SqliteMetadataStore(dbPath)
+    count = 0
+
+    def entries(containerPath):
+        for name in os.listdir(containerPath):
+            key, ext = name, None
+
+            if name.endswith('.dircomplete'):
+                # Read with the directory entries
+                continue
+            elif name.endswith('.direntries'):
+                key, ext = name[:-len('.direntries')], 'direntries'
+
             try:
-                async with aiofiles.open(dePath, 'rt') as fd:
-                    data = orjson.loads(await fd.read())
-
-                    if isinstance(data, list):
-                        for pack in zip_longest(*[iter(data)] * egenCount,
-                                                fillvalue=None):
-                            yield [e for e in pack if e is not None]
-            except GeneratorExit:
-                log.debug(f'getDirEntries {rscPath}: generator exit')
-                raise
-            except BaseException as err:
-                log.debug(f'getDirEntries error: {rscPath}: {err}')
+                with open(os.path.join(containerPath, name), 'rb') as fd:
+                    data = orjson.loads(fd.read())
+            except Exception:
+                continue
+
+            if ext == 'direntries':
+                yield key, {
+                    'direntries': data,
+                    'dircomplete': os.path.exists(
+                        os.path.join(containerPath, f'{key}.dircomplete'))
+                }
+            elif isinstance(data, dict):
+                yield key, {'metadata': data}
+
+    try:
+        for cname in os.listdir(srcPath):
+            containerPath = os.path.join(srcPath, cname)
+
+            if not os.path.isdir(containerPath):
+                continue
+
+            batch = {}
+            for key, entry in entries(containerPath):
+                batch.setdefault(key, {}).update(entry)
+                count += 1
+
+                if len(batch) >= batchSize:
+                    store._write(batch)
+                    batch = {}
+
+            store._write(batch)
+
+            # Committed, remove the container
+            shutil.rmtree(containerPath, ignore_errors=True)
+    finally:
+        store._close()
+        store._exec.shutdown()
+
+    return count
+
+
+class IPFSObjectMetadataDatabase:
+    """
+    Database holding metadata about IPFS objects by path
+
+    The storage backend is either 'sqlite' (the database is stored
+    in the objmeta.sqlite file inside metaDbPath), or 'files' (one
+    JSON file per object). Existing file-based databases are migrated
+    to the SQLite backend by migrate().
+    """
+
+    backends = ['files', 'sqlite']
+
+    def __init__(self, metaDbPath, loop=None, backend='sqlite',
+                 batchSize=256, flushDelay=0.5):
+        self._metaDbPath = metaDbPath
+
+        if backend == 'files':
+            self._store = FilesMetadataStore(metaDbPath, loop=loop)
+        elif backend == 'sqlite':
+            self._store = SqliteMetadataStore(
+                self.sqliteDbPath,
+                batchSize=batchSize,
+                flushDelay=flushDelay
+            )
+        else:
+            raise ValueError(f'Invalid metadata DB backend: {backend}')
+
+    @property
+    def metaDbPath(self):
+        return self._metaDbPath
+
+    @property
+    def sqliteDbPath(self):
+        return os.path.join(self.metaDbPath, 'objmeta.sqlite')
+
+    @property
+    def backend(self):
+        return self._store
+
+    async def migrate(self):
+        """
+        Migrate the objects stored in the file-based layout to the
+        SQLite backend (if there are any)
+
+        The migration uses its own connection and runs in the default
+        executor, so the store's thread stays available for reads.
+        """
+
+        if not isinstance(self._store, SqliteMetadataStore) or \
+                not os.path.isdir(self.metaDbPath):
+            return 0
+
+        if not any(os.path.isdir(os.path.join(self.metaDbPath, name))
+                   for name in os.listdir(self.metaDbPath)):
+            return 0
+
+        count = await asyncio.get_event_loop().run_in_executor(
+            None, metaDbMigrate, self.metaDbPath, self.sqliteDbPath)
+
+        log.info(f'Metadata DB: migrated {count} objects to SQLite')
+        return count
+
+    async def store(self, rscPath, **data):
+        key = metaKey(rscPath)
+
+        if key:
+            await self._store.store(key, data)
+
+    async def get(self, rscPath):
+        key = metaKey(rscPath)
+
+        if key:
+            return await self._store.get(key)
+
+    async def writeDirEntries(self, rscPath, data, complete=False):
+        key = metaKey(rscPath)
+
+        if key:
+            await self._store.writeDirEntries(key, data, complete=complete)
+
+    async def hasDirEntries(self, rscPath, complete=False):
+        key = metaKey(rscPath)
+
+        if not key:
+            return False
+
+        return await self._store.hasDirEntries(key, complete=complete)
+
+    async def getDirEntries(self, rscPath, egenCount=16):
+        key = metaKey(rscPath)
+
+        try:
+            data = await self._store.getDirEntries(key) if key else None
+
+            for pack in dirEntriesPacks(data, egenCount=egenCount):
+                yield pack
+        except GeneratorExit:
+            log.debug(f'getDirEntries {rscPath}: generator exit')
+            raise
+        except BaseException as err:
+            log.debug(f'getDirEntries error: {rscPath}: {err}')
+
+    async def flush(self):
+        await self._store.flush()
+
+    async def close(self):
+        await self._store.close()
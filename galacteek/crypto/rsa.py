@@ -4,6 +4,7 @@ import concurrent.futures
 import functools
 import base64
 import hashlib
+import secrets
 
 from cachetools import TTLCache
 
@@ -77,6 +78,19 @@ class RSAExecutor(object):
 
         return await self._exec(_generateKeypair, keysize, passphrase)
 
+    async def _getKeyCached(self, keyData):
+        hasher = hashlib.sha3_256()
+        hasher.update(keyData)
+        dig = hasher.hexdigest()
+
+        key = self._keysCache.get(dig)
+
+        if not key:
+            key = await self._getKey(keyData)
+            self._keysCache[dig] = key
+
+        return key
+
     async def encryptData(self, data, recipientKeyData, sessionKey=None,
                           cacheKey=False, aesMode='CBC'):
         if not isinstance(data, BytesIO):
@@ -84,15 +98,7 @@ class RSAExecutor(object):
 
         try:
             if cacheKey:
-                hasher = hashlib.sha3_256()
-                hasher.update(recipientKeyData)
-                dig = hasher.hexdigest()
-
-                key = self._keysCache.get(dig)
-
-                if not key:
-                    key = await self._getKey(recipientKeyData)
-                    self._keysCache[dig] = key
+                key = await self._getKeyCached(recipientKeyData)
             else:
                 key = await self._getKey(recipientKeyData)
         except Exception as err:
@@ -229,6 +235,113 @@ class RSAExecutor(object):
             log.debug('Type error on decryption, check privkey')
             return None
 
+    async def encryptEnvelope(self, data: bytes, recipientKeys: list):
+        """
+        Multi-recipient (hybrid) encryption
+
+        The data is encrypted once with a random AES-256 (CBC) session
+        key, and only the session key is encrypted (PKCS1-OAEP) for
+        each recipient. The key wraps are computed concurrently
+        in the executor.
+
+        Key slots are anonymous (they are not labelled with the
+        recipient's identity) and shuffled, a recipient finds its slot
+        by trial decryption.
+
+        :param bytes data: data to encrypt
+        :param list recipientKeys: recipients RSA public keys
+        :return: envelope dict (values are base64-encoded), or None
+        """
+
+        sessionKey = get_random_bytes(32)
+
+        def _encrypt(data, sessionKey):
+            cipherAes = AES.new(sessionKey, AES.MODE_CBC)
+            return cipherAes.iv, cipherAes.encrypt(pad(data, AES.block_size))
+
+        def _wrap(sessionKey, key):
+            try:
+                return PKCS1_OAEP.new(key).encrypt(sessionKey)
+            except Exception as err:
+                log.debug(f'Session key wrap error: {err}')
+
+        async def _wrapFor(keyData):
+            try:
+                key = await self._getKeyCached(keyData)
+                assert key is not None
+            except Exception as err:
+                log.debug(f'Cannot load RSA key: {err}')
+                return None
+
+            return await self._exec(_wrap, sessionKey, key)
+
+        try:
+            iv, ctb = await self._exec(_encrypt, data, sessionKey)
+
+            wraps = await asyncio.gather(*[
+                _wrapFor(keyData) for keyData in recipientKeys
+            ])
+        except Exception as err:
+            log.debug(f'Envelope encryption error: {err}')
+            return None
+
+        slots = [
+            base64.b64encode(wrapped).decode()
+            for wrapped in wraps if wrapped
+        ]
+
+        if not slots:
+            return None
+
+        secrets.SystemRandom().shuffle(slots)
+
+        return {
+            'slots': slots,
+            'iv': base64.b64encode(iv).decode(),
+            'data': base64.b64encode(ctb).decode()
+        }
+
+    async def decryptEnvelope(self, envelope: dict, privKeyData):
+        """
+        Decrypt an envelope created by encryptEnvelope() with our
+        private key, trying every key slot. Returns None if none of
+        the slots was wrapped for us.
+        """
+
+        def _decrypt(slots, iv, ctb, privKey):
+            cipherRsa = PKCS1_OAEP.new(privKey)
+
+            for wrapped in slots:
+                try:
+                    sessionKey = cipherRsa.decrypt(wrapped)
+                except (ValueError, TypeError):
+                    # Not our slot
+                    continue
+
+                try:
+                    cipherAes = AES.new(sessionKey, AES.MODE_CBC, iv)
+                    return unpad(cipherAes.decrypt(ctb), AES.block_size)
+                except (ValueError, TypeError) as err:
+                    log.debug(f'Envelope decryption error: {err}')
+                    return None
+
+        try:
+            slots = envelope['slots']
+            assert isinstance(slots, list)
+
+            privKey = await self._getKey(privKeyData)
+
+            return await self._exec(
+                _decrypt,
+                [base64.b64decode(wrapped) for wrapped in slots],
+                base64.b64decode(envelope['iv']),
+                base64.b64decode(envelope['data']),
+                privKey
+            )
+        except Exception as err:
+            log.debug(f'Invalid envelope: {err}')
+            return None
+
     async def pssSign(self, message: bytes, privRsaKey):
         privKey = await self._getKey(privRsaKey)
         return await self._exec(self._pssSign, message, privKey)
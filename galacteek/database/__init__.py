@@ -20,9 +20,47 @@ from galacteek.database.models import *  # noqa
 
 from galacteek.database.ops.bm import *  # noqa
 from galacteek.database.ops.pinning import *  # noqa
+from galacteek.database.psmanager import psRecordsWriter
 
 databaseLock = asyncio.Lock()
 
+# Full-text index of the hashmarks (kept in sync by triggers)
+hashmarksFtsScript = '''
+CREATE VIRTUAL TABLE if not exists hashmark_fts
+USING fts5(path, url, title, description, content='hashmark',
+content_rowid='id', prefix='2 3');
+
+CREATE TRIGGER if not exists hashmark_fts_ai AFTER INSERT ON hashmark
+BEGIN
+  INSERT INTO hashmark_fts(rowid, path, url, title, description)
+  VALUES (new.id, new.path, new.url, new.title, new.description);
+END;
+
+CREATE TRIGGER if not exists hashmark_fts_ad AFTER DELETE ON hashmark
+BEGIN
+  INSERT INTO hashmark_fts(hashmark_fts, rowid, path, url, title,
+    description)
+  VALUES ('delete', old.id, old.path, old.url, old.title, old.description);
+END;
+
+CREATE TRIGGER if not exists hashmark_fts_au AFTER UPDATE OF
+  path, url, title, description ON hashmark
+BEGIN
+  INSERT INTO hashmark_fts(hashmark_fts, rowid, path, url, title,
+    description)
+  VALUES ('delete', old.id, old.path, old.url, old.title, old.description);
+  INSERT INTO hashmark_fts(rowid, path, url, title, description)
+  VALUES (new.id, new.path, new.url, new.title, new.description);
+END;
+'''
+
+# bm25() weights for the path, url, title and description columns
+hashmarksFtsWeights = (1.0, 1.0, 10.0, 4.0)
+
+hashmarksFts = {
+    'available': False
+}
+
 
 def dbLock(func):
     @functools.wraps(func)
@@ -47,10 +85,33 @@ async def initOrm(dbpath):
         traceback.print_exc()
         return False
     else:
+        await hashmarksFtsSetup()
         return True
 
 
+async def hashmarksFtsSetup():
+    conn = Tortoise.get_connection('default')
+
+    try:
+        count, rows = await conn.execute_query(
+            "SELECT name FROM sqlite_master WHERE type='table' "
+            "AND name='hashmark_fts'")
+
+        await conn.execute_script(hashmarksFtsScript)
+
+        if not rows:
+            # Index the existing hashmarks
+            await conn.execute_query(
+                "INSERT INTO hashmark_fts(hashmark_fts) VALUES('rebuild')")
+    except Exception as err:
+        log.debug(f'Hashmarks full-text index not available: {err}')
+        hashmarksFts['available'] = False
+    else:
+        hashmarksFts['available'] = True
+
+
 async def closeOrm():
+    await psRecordsWriter.stop()
     await Tortoise.close_connections()
 
 
@@ -73,7 +134,63 @@ async def hashmarksByPath(ref):
         Q(path=str(iPath)) | Q(url=ref)).first()
 
 
+def hashmarksFtsQuery(query: str):
+    """
+    Convert a search string to an FTS5 query (every word is
+    prefix-matched)
+    """
+
+    words = [w.replace('"', '""') for w in query.split()]
+    return ' '.join(f'"{w}"*' for w in words if w)
+
+
+async def hashmarksFtsSearch(query: str, category=None, limit=256):
+    """
+    Full-text search of the hashmarks, with the results ordered
+    by relevance
+    """
+
+    ftsQuery = hashmarksFtsQuery(query)
+    if not ftsQuery:
+        return []
+
+    # The active and category filters are applied in the same query,
+    # so that the limit only applies to the matching hashmarks
+    sql = 'SELECT hashmark.id AS id FROM hashmark_fts ' \
+        'INNER JOIN hashmark ON hashmark.id = hashmark_fts.rowid '
+    params = [ftsQuery]
+
+    if category:
+        sql += 'INNER JOIN category ON category.id = hashmark.category_id '
+
+    sql += 'WHERE hashmark_fts MATCH ? AND hashmark.active = 1 '
+
+    if category:
+        sql += 'AND category.name = ? '
+        params.append(category)
+
+    sql += 'ORDER BY bm25(hashmark_fts, {w}) LIMIT ?'.format(
+        w=', '.join(str(w) for w in hashmarksFtsWeights))
+    params.append(limit)
+
+    conn = Tortoise.get_connection('default')
+    count, rows = await conn.execute_query(sql, params)
+
+    ranks = {row['id']: idx for idx, row in enumerate(rows)}
+    if not ranks:
+        return []
+
+    return sorted(await Hashmark.filter(id__in=list(ranks.keys())),
+                  key=lambda mark: ranks[mark.id])
+
+
 async def hashmarksSearch(query=None, category=None):
+    if query and hashmarksFts['available']:
+        try:
+            return await hashmarksFtsSearch(query, category=category)
+        except Exception as err:
+            log.debug(f'Hashmarks full-text search error: {err}')
+
     filter = Q(active=True)
 
     if query:
@@ -99,30 +216,42 @@ async def hashmarksByObjTagLatest(tag):
     ).order_by('-datecreated').first()
 
 
+async def ipTagsIds(tags: list, strict=False):
+    """
+    Return the ids of the tags matching a list of tag names
+
+    The tags table is small, so we look up the matching tags first
+    instead of joining the hashmarks with every tag condition
+    """
+
+    filter = Q(name__in=tags)
+
+    if not strict:
+        for tag in tags:
+            filter = filter | Q(name__icontains=tag)
+
+    return await IPTag.filter(filter).values_list('id', flat=True)
+
+
 async def hashmarksByTags(taglist, strict=False, limit=0, **kw):
     tags = iptags.ipTagsFormatList(taglist, **kw)
 
-    filter = Q(iptags__name__in=tags)
-
-    for tag in tags:
-        if strict:
-            filter = filter | Q(iptags__name=tag)
-        else:
-            filter = filter | Q(iptags__name__icontains=tag)
+    tagIds = await ipTagsIds(tags, strict=strict)
+    if not tagIds:
+        return []
 
-    return await Hashmark.filter(filter).limit(
+    return await Hashmark.filter(iptags__id__in=tagIds).distinct().limit(
         limit if limit > 0 else 32768)
 
 
 async def hashmarksByObjTags(taglist, **kw):
     tags = iptags.ipTagsFormatList(taglist, **kw)
 
-    filter = Q(objtags__name__in=tags)
-
-    for tag in tags:
-        filter = filter | Q(objtags__name__icontains=tag)
+    tagIds = await ipTagsIds(tags)
+    if not tagIds:
+        return []
 
-    return await Hashmark.filter(filter)
+    return await Hashmark.filter(objtags__id__in=tagIds).distinct()
 
 
 async def hashmarksPopularTags(min=1, limit=64):
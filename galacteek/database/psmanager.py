@@ -1,35 +1,299 @@
+import asyncio
+import collections
 from datetime import datetime
 from datetime import timedelta
 
+from galacteek import log
+from galacteek import ensure
+from galacteek.core.asynclib import loopTime
 from galacteek.database.models.pubsub import *
 
 
+class PSRecordsWriter:
+    """
+    Write-behind buffer for pubsub message records
+
+    Message records are queued and written with a single bulk_create()
+    every flushInterval seconds (or as soon as maxPending records are
+    queued). Channel activity dates are collapsed to one update per
+    channel per flush.
+    """
+
+    def __init__(self, flushInterval=2.0, maxPending=512):
+        self.flushInterval = flushInterval
+        self.maxPending = maxPending
+
+        self._pending = []
+        self._channels = {}
+        self._lock = asyncio.Lock()
+        self._evFlush = asyncio.Event()
+        self._task = None
+
+        # Metrics
+        self.flushCount = 0
+        self.recordsFlushed = 0
+        self.channelUpdates = 0
+        self.flushLatencyLast = 0
+        self.flushLatencyMax = 0
+
+    @property
+    def queueDepth(self):
+        return len(self._pending)
+
+    def metrics(self):
+        return {
+            'queueDepth': self.queueDepth,
+            'flushCount': self.flushCount,
+            'recordsFlushed': self.recordsFlushed,
+            'channelUpdates': self.channelUpdates,
+            'flushLatencyLast': self.flushLatencyLast,
+            'flushLatencyMax': self.flushLatencyMax
+        }
+
+    def configure(self, flushInterval=None, maxPending=None):
+        if flushInterval:
+            self.flushInterval = flushInterval
+        if maxPending:
+            self.maxPending = maxPending
+
+    def push(self, rec, channel):
+        self._pending.append(rec)
+        self._channels[channel.id] = (channel, datetime.now())
+
+        if not self._task or self._task.done():
+            self._task = ensure(self.flusher())
+
+        if len(self._pending) >= self.maxPending:
+            self._evFlush.set()
+
+    async def persist(self, rec):
+        """
+        Make sure that a queued record is in the database (when we need
+        its primary key) and return it
+        """
+
+        async with self._lock:
+            if rec.pk is not None:
+                return rec
+
+            # Unsaved models all compare equal (no pk), compare by identity
+            for idx, pRec in enumerate(self._pending):
+                if pRec is rec:
+                    del self._pending[idx]
+                    await rec.save()
+                    return rec
+
+        # Flushed by bulk_create(), which does not fetch primary keys
+        return await PubSubMsgRecord.filter(
+            channel_id=rec.channel_id,
+            senderPeerId=rec.senderPeerId,
+            seqNo=rec.seqNo
+        ).first()
+
+    def requeue(self, records, channels):
+        """
+        Put back records and channel updates that could not be
+        written (newer channel updates take precedence)
+        """
+
+        self._pending[0:0] = records
+
+        for chanId, entry in channels.items():
+            self._channels.setdefault(chanId, entry)
+
+        overflow = len(self._pending) - (self.maxPending * 8)
+        if overflow > 0:
+            log.warning(f'PS records queue full: dropping {overflow} '
+                        'records')
+            del self._pending[0:overflow]
+
+    async def flush(self):
+        async with self._lock:
+            records, self._pending = self._pending, []
+            channels, self._channels = self._channels, {}
+
+            if not records and not channels:
+                return
+
+            ltStart = loopTime()
+
+            try:
+                if records:
+                    await PubSubMsgRecord.bulk_create(records)
+            except Exception as err:
+                # bulk_create() is atomic: requeue the records (and the
+                # channel updates) for the next flush
+                self.requeue(records, channels)
+
+                log.warning(f'PS records flush error: {err} '
+                            f'({len(records)} records requeued)')
+                return
+
+            try:
+                for chanId, (channel, date) in channels.items():
+                    channel.dateActiveLast = date
+
+                    await PubSubChannel.filter(id=chanId).update(
+                        dateActiveLast=date)
+            except Exception as err:
+                self.requeue([], channels)
+
+                log.warning(f'PS channels update error: {err}')
+                return
+
+            latency = loopTime() - ltStart
+
+            self.flushCount += 1
+            self.recordsFlushed += len(records)
+            self.channelUpdates += len(channels)
+            self.flushLatencyLast = latency
+            self.flushLatencyMax = max(latency, self.flushLatencyMax)
+
+    async def flusher(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._evFlush.wait(),
+                                           self.flushInterval)
+                except asyncio.TimeoutError:
+                    pass
+
+                self._evFlush.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+        self._task = None
+        await self.flush()
+
+
+psRecordsWriter = PSRecordsWriter()
+
+
+class PSAttrIndex:
+    """
+    Time-windowed, in-memory index of the message attributes recorded
+    on a channel, used for duplicate detection.
+
+    Each (msgType, attrName, value) key maps to the time it was last
+    seen, and a ring of (time, key) entries is used to expire keys
+    older than the window. The PubSubMsgAttrRecord table is only read
+    once, to warm up the index.
+    """
+
+    def __init__(self, channel, window=timedelta(days=1)):
+        self.channel = channel
+        self.window = window
+
+        self._seen = {}
+        self._ring = collections.deque()
+        self._warm = False
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def key(self, msgType, attrName, value):
+        return (msgType, attrName, str(value))
+
+    def expire(self, now=None):
+        dateMin = (now if now else datetime.now()) - self.window
+
+        while self._ring and self._ring[0][0] <= dateMin:
+            date, key = self._ring.popleft()
+
+            if self._seen.get(key) == date:
+                del self._seen[key]
+
+    def add(self, msgType, attrName, value, date=None):
+        date = date if date else datetime.now()
+        key = self.key(msgType, attrName, value)
+
+        self._seen[key] = date
+        self._ring.append((date, key))
+
+    def seen(self, msgType, attrName, value):
+        self.expire()
+        return self.key(msgType, attrName, value) in self._seen
+
+    async def warmup(self):
+        async with self._lock:
+            if self._warm:
+                return
+
+            dateMin = datetime.now() - self.window
+
+            try:
+                records = await PubSubMsgAttrRecord.filter(
+                    msgrecord__channel__id=self.channel.id,
+                    date__gt=dateMin).order_by('date').values(
+                        'msgType', 'attrName', 'attrStrValue', 'date')
+            except Exception as err:
+                log.debug(f'Attributes index warmup error: {err}')
+                records = []
+
+            for rec in records:
+                date = rec['date']
+
+                if date.tzinfo is not None:
+                    date = date.astimezone().replace(tzinfo=None)
+
+                self.add(rec['msgType'], rec['attrName'],
+                         rec['attrStrValue'], date=date)
+
+            self._warm = True
+
+
+psAttrIndexes = {}
+
+
 class PSTopicManager:
     def __init__(self, channel):
         self.channel = channel
+        self.attrIndex = psAttrIndexes.setdefault(
+            channel.id, PSAttrIndex(channel))
 
     async def active(self):
         self.channel.dateActiveLast = datetime.now()
         await self.channel.save()
 
     async def recordMessage(self, sender, size, **kw):
+        """
+        Queue a message record (written later by psRecordsWriter)
+        """
+
         rec = PubSubMsgRecord(channel=self.channel, sizeRaw=size,
                               senderPeerId=sender, **kw)
-        await rec.save()
-
-        await self.active()
+        psRecordsWriter.push(rec, self.channel)
         return rec
 
     async def recordMsgAttribute(self, msgrecord, msgType, attrName, value):
         try:
+            msgrecord = await psRecordsWriter.persist(msgrecord)
+
             rec = PubSubMsgAttrRecord(msgrecord=msgrecord, attrName=attrName,
                                       msgType=msgType,
                                       attrStrValue=str(value))
             await rec.save()
+
+            self.attrIndex.add(msgType, attrName, value)
             return rec
         except Exception:
             pass
 
+    async def msgAttributeSeen(self, msgType, attrName, value):
+        """
+        Return True if this attribute value was recorded on this
+        channel during the attributes index's time window
+        """
+
+        await self.attrIndex.warmup()
+        return self.attrIndex.seen(msgType, attrName, value)
+
     async def searchMsgAttribute(self, msgType, attrName, value, dateMin=None):
         dateMin = dateMin if dateMin else datetime.now() - timedelta(days=1)
 
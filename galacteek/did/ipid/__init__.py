@@ -7,10 +7,11 @@ import random
 import string
 import weakref
 
+from functools import partial
+
 from aiohttp.web_exceptions import HTTPOk
 
 from yarl import URL
-from cachetools import LRUCache
 
 from urllib.parse import urlencode
 
@@ -37,11 +38,12 @@ from galacteek.core import nonce
 from galacteek.core import unusedTcpPort
 from galacteek.core import runningApp
 from galacteek.core.asynclib import async_enterable
-from galacteek.core.asynccache import amlrucache
 from galacteek.crypto.rsa import RSAExecutor
 
 from galacteek.ld.signatures import jsonldsig
 
+from galacteek.did.ipid.cache import DIDExpandedCache
+from galacteek.did.ipid.cache import DIDResolveCache
 from galacteek.did.ipid.services import IPService
 from galacteek.did.ipid.services import IPServiceRegistry
 from galacteek.did.ipid.services import IPServiceEditor
@@ -65,7 +67,8 @@ class IPIdentifier(DAGOperations):
     This tries to follow the IPID spec as much as possible.
     """
 
-    def __init__(self, did, localId=False, ldCache=None):
+    def __init__(self, did, localId=False, ldCache=None,
+                 resolveCache=None):
         self._did = did
         self._p2pServices = weakref.WeakValueDictionary()
         self._document = {}
@@ -76,14 +79,17 @@ class IPIdentifier(DAGOperations):
         self._unlocked = False
         self.rsaAgent = None
 
-        # JSON-LD expanded cache
-        self.cache = ldCache if ldCache else LRUCache(4)
+        # JSON-LD expanded documents cache
+        self.cache = ldCache if ldCache else DIDExpandedCache(
+            memMaxEntries=4)
+
+        # DID resolution cache (shared by all the DIDs)
+        self.resolveCache = resolveCache
 
         # Async sigs
         self.sChanged = AsyncSignal(str)
         self.sServicesChanged = AsyncSignal()
         self.sServiceAvailable = AsyncSignal(IPIdentifier, IPService)
-        self.sChanged.connectTo(self.onDidChanged)
 
     @property
     def local(self):
@@ -193,13 +199,6 @@ class IPIdentifier(DAGOperations):
 
         print(json.dumps(self.doc, indent=4))
 
-    async def onDidChanged(self, cid):
-        cacheKey = repr(self)
-        if cacheKey in self.cache:
-            # Reset expanded cache
-            self.message('LRU cache reset')
-            del self.cache[cacheKey]
-
     @ipfsOp
     async def unlock(self, ipfsop, rsaPassphrase=None):
         rsaAgent = await self.rsaAgentGet(ipfsop)
@@ -258,9 +257,27 @@ class IPIdentifier(DAGOperations):
                 self.dagIpfsPath
             )
 
-    @amlrucache
     async def expand(self):
-        return await self._expand()
+        """
+        Return the expanded DID document (cached by document CID,
+        the returned object should not be modified)
+        """
+
+        docCid = self.docCid
+        if not docCid:
+            return None
+
+        expanded = await self.cache.get(docCid)
+
+        if expanded is None:
+            ctxVersion = self.cache.contextsVersion
+            expanded = await self._expand()
+
+            # Don't cache it if the contexts changed in the meantime
+            if expanded and ctxVersion == self.cache.contextsVersion:
+                await self.cache.put(docCid, expanded)
+
+        return expanded
 
     @ipfsOp
     async def _expand(self, ipfsop, path=''):
@@ -506,6 +523,22 @@ class IPIdentifier(DAGOperations):
             maxCacheLifetime=maxLifetime
         )
 
+    async def resolveCid(self, resolveTimeout=None, force=False):
+        """
+        Resolve the DID to the CID of its latest DID document
+        (using the shared resolution cache if we have one)
+        """
+
+        async def resolver():
+            resolved = await self.resolve(resolveTimeout=resolveTimeout)
+            return stripIpfs(resolved['Path']) if resolved else None
+
+        if self.resolveCache:
+            return await self.resolveCache.resolve(
+                self.did, resolver, force=force)
+
+        return await resolver()
+
     async def refresh(self):
         staleValue = cGet('resolve.staleAfterDelay')
         last = self._lastResolve
@@ -519,13 +552,11 @@ class IPIdentifier(DAGOperations):
     async def load(self, ipfsop, pin=True, initialCid=None,
                    resolveTimeout=30):
         if not initialCid:
-            resolved = await self.resolve()
+            dagCid = await self.resolveCid(resolveTimeout=resolveTimeout)
 
-            if not resolved:
+            if not dagCid:
                 self.message('Failed to resolve ?')
                 return False
-
-            dagCid = stripIpfs(resolved['Path'])
         else:
             self.message('Loading from initial CID: {}'.format(initialCid))
             dagCid = initialCid
@@ -545,7 +576,11 @@ class IPIdentifier(DAGOperations):
 
         self.message('Load: IPNS key resolved to {}'.format(dagCid))
 
-        doc = await ipfsop.dagGet(dagCid)
+        if self.resolveCache:
+            doc = await self.resolveCache.document(
+                dagCid, partial(ipfsop.dagGet, dagCid))
+        else:
+            doc = await ipfsop.dagGet(dagCid)
 
         if doc:
             self._document = doc
@@ -600,6 +635,10 @@ class IPIdentifier(DAGOperations):
                                     cacheOrigin='ipidmanager',
                                     timeout=timeout):
                 self.message('Published !')
+
+                if self.resolveCache:
+                    self.resolveCache.resolvedSet(self.did, self.docCid)
+
                 self.message(
                     'Published IPID {did} with docCid: {docCid}'.format(
                         did=self.did, docCid=self.docCid))
@@ -792,14 +831,53 @@ class IPIdentifier(DAGOperations):
 
 @SingletonDecorator
 class IPIDManager:
-    def __init__(self):
+    def __init__(self, ldCachePath=None):
         self._managedIdentifiers = {}
         self._lock = asyncio.Lock()
         self._resolveTimeout = cGet('resolve.timeout')
         self._rsaExec = RSAExecutor()
 
-        # JSON-LD cache
-        self._ldCache = LRUCache(256)
+        # JSON-LD expanded documents cache
+        ldCfg = cGet('ldCache')
+        self._ldCache = DIDExpandedCache(
+            path=ldCachePath,
+            memMaxEntries=ldCfg.get(
+                'memMaxEntries', 256) if ldCfg else 256,
+            diskMaxSize=ldCfg.get(
+                'diskMaxSize', 67108864) if ldCfg else 67108864
+        )
+
+        # DID resolution cache
+        cacheCfg = cGet('resolve.cache')
+        self._resolveCache = DIDResolveCache(
+            ttl=cacheCfg.get('ttl', 300) if cacheCfg else 300,
+            maxDids=cacheCfg.get('maxDids', 2048) if cacheCfg else 2048,
+            maxDocuments=cacheCfg.get(
+                'maxDocuments', 512) if cacheCfg else 512,
+            concurrency=cGet('resolve.concurrency') or 6
+        )
+
+    @property
+    def resolveCache(self):
+        return self._resolveCache
+
+    def resolveCacheStats(self):
+        return self._resolveCache.stats.asDict()
+
+    def ldCacheStats(self):
+        return self._ldCache.stats.asDict()
+
+    async def onLdContextsChanged(self, version: str):
+        self._ldCache.contextsChanged(version)
+
+    async def ldCacheWarm(self):
+        count = cGet('ldCache.warmCount')
+
+        try:
+            await self._ldCache.warm(
+                count=count if isinstance(count, int) else 64)
+        except Exception as err:
+            log.debug(f'Could not warm the expanded DIDs cache: {err}')
 
     async def stopManager(self):
         async with self._lock:
@@ -869,7 +947,8 @@ class IPIDManager:
         rTimeout = timeout if timeout else self._resolveTimeout
 
         ipid = IPIdentifier(
-            did, localId=localIdentifier, ldCache=self._ldCache)
+            did, localId=localIdentifier, ldCache=self._ldCache,
+            resolveCache=self._resolveCache)
 
         if ipid.local:
             ipid.sServiceAvailable.connectTo(
@@ -915,7 +994,9 @@ class IPIDManager:
 
         now = normedUtcDate()
 
-        identifier = IPIdentifier(didId, localId=True)
+        identifier = IPIdentifier(didId, localId=True,
+                                  ldCache=self._ldCache,
+                                  resolveCache=self._resolveCache)
 
         # Initial document
         initialDoc = {
@@ -0,0 +1,335 @@
+import asyncio
+import copy
+import orjson
+
+from pathlib import Path
+
+from cachetools import LRUCache
+from cachetools import TTLCache
+
+from galacteek import log
+from galacteek.ipfs.ipfsops.objcache import IPFSObjectCache
+
+
+class DIDResolveCacheStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.docHits = 0
+        self.docMisses = 0
+
+    @property
+    def hitRatio(self):
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def asDict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'joined': self.joined,
+            'docHits': self.docHits,
+            'docMisses': self.docMisses
+        }
+
+
+class DIDResolveCache:
+    """
+    DID resolution cache shared by all the IPID loaders
+
+    There are two levels:
+
+    - DID -> DID document CID (the result of the IPNS resolve),
+      which is only reused for a limited time (ttl)
+    - DID document CID -> DID document, which never goes stale
+      (the document is immutable), so there's only eviction
+
+    Concurrent lookups of the same key share a single resolve, and
+    the number of resolves running at the same time is bounded.
+    """
+
+    def __init__(self, ttl=300, maxDids=2048, maxDocuments=512,
+                 concurrency=6):
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.stats = DIDResolveCacheStats()
+
+        self._resolved = TTLCache(maxDids, ttl)
+        self._docs = LRUCache(maxDocuments)
+        self._inflight = {}
+        self._sem = None
+
+    @property
+    def sem(self):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        return self._sem
+
+    def resolved(self, did: str):
+        return self._resolved.get(did)
+
+    def resolvedSet(self, did: str, docCid: str):
+        self._resolved[did] = docCid
+
+    def invalidate(self, did: str):
+        self._resolved.pop(did, None)
+
+    async def _shared(self, key, coro):
+        """
+        Run coro() (bounded by the semaphore), unless it's already
+        running for this key, in which case we wait for its result
+        """
+
+        fut = self._inflight.get(key)
+
+        if fut:
+            self.stats.joined += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_event_loop().create_future()
+        self._inflight[key] = fut
+        result = None
+
+        try:
+            async with self.sem:
+                result = await coro()
+        finally:
+            self._inflight.pop(key, None)
+
+            if not fut.done():
+                fut.set_result(result)
+
+        return result
+
+    async def resolve(self, did: str, resolver, force=False):
+        """
+        Return the CID of the latest DID document for a DID.
+
+        :param resolver: coroutine function returning the document
+            CID, only called when there's no valid cache entry
+        :param bool force: ignore the cache entry
+        """
+
+        if not force:
+            docCid = self._resolved.get(did)
+
+            if docCid:
+                self.stats.hits += 1
+                return docCid
+
+        self.stats.misses += 1
+
+        docCid = await self._shared(('did', did), resolver)
+
+        if docCid:
+            self._resolved[did] = docCid
+
+        return docCid
+
+    async def document(self, docCid: str, getter):
+        """
+        Return (a copy of) the DID document with the given CID.
+
+        :param getter: coroutine function returning the document,
+            only called on a cache miss
+        """
+
+        doc = self._docs.get(docCid)
+
+        if doc is None:
+            self.stats.docMisses += 1
+
+            doc = await self._shared(('doc', docCid), getter)
+
+            if not isinstance(doc, dict):
+                return doc
+
+            self._docs[docCid] = doc
+        else:
+            self.stats.docHits += 1
+
+        # The document is modified in place by IPIdentifier
+        return copy.deepcopy(doc)
+
+    def clear(self):
+        self._resolved.clear()
+        self._docs.clear()
+        self.stats.reset()
+
+
+class DIDExpandedCacheStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hitsMem = 0
+        self.hitsDisk = 0
+        self.misses = 0
+        self.warmed = 0
+        self.invalidations = 0
+
+    @property
+    def hits(self):
+        return self.hitsMem + self.hitsDisk
+
+    @property
+    def hitRatio(self):
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def asDict(self):
+        return {
+            'hits': self.hits,
+            'hitsMem': self.hitsMem,
+            'hitsDisk': self.hitsDisk,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'warmed': self.warmed,
+            'invalidations': self.invalidations
+        }
+
+
+class DIDExpandedCache:
+    """
+    Cache of JSON-LD expanded DID documents, keyed by DID document CID
+
+    DID documents are immutable, but their expansion depends on the
+    JSON-LD contexts: entries are tagged with the contexts version
+    (see contextsChanged()) and entries expanded with other contexts
+    are ignored. Expanded documents are kept in an in-memory LRU
+    cache, and (if a path is given) stored on disk (as JSON) in a
+    size-bounded LRU store which survives restarts.
+
+    The returned documents are shared and must not be modified.
+    """
+
+    def __init__(self, path: Path = None,
+                 memMaxEntries=256,
+                 diskMaxSize=64 * 1024 * 1024,
+                 objMaxSize=1024 * 1024):
+        self.stats = DIDExpandedCacheStats()
+
+        self._ctxVersion = None
+        self._mem = LRUCache(memMaxEntries)
+        self._store = IPFSObjectCache(
+            path,
+            memMaxSize=1,
+            diskMaxSize=diskMaxSize,
+            objMaxSize=objMaxSize
+        ) if path else None
+
+    @property
+    def persistent(self):
+        return self._store is not None
+
+    def __len__(self):
+        return len(self._mem)
+
+    @property
+    def contextsVersion(self):
+        return self._ctxVersion
+
+    def contextsChanged(self, version: str):
+        """
+        Set the version of the JSON-LD contexts (e.g the CID of the
+        contexts directory). The documents expanded with other
+        contexts are not used anymore.
+        """
+
+        if version == self._ctxVersion:
+            return
+
+        self._ctxVersion = version
+        self._mem.clear()
+        self.stats.invalidations += 1
+
+    def diskKey(self, docCid: str):
+        # Stored per contexts version, an entry expanded with older
+        # contexts is never reused nor overwritten (only evicted)
+        return f'{self._ctxVersion}:{docCid}'
+
+    async def get(self, docCid: str):
+        expanded = self._mem.get(docCid)
+
+        if expanded is not None:
+            self.stats.hitsMem += 1
+            return expanded
+
+        if self._store:
+            data = await self._store.get(self.diskKey(docCid))
+
+            if data:
+                try:
+                    entry = orjson.loads(data)
+                    expanded = entry['expanded']
+                except Exception as err:
+                    log.debug(f'Expanded DID cache: {docCid}: {err}')
+                else:
+                    if entry.get('ctx') == self._ctxVersion:
+                        self._mem[docCid] = expanded
+                        self.stats.hitsDisk += 1
+                        return expanded
+
+        self.stats.misses += 1
+
+    async def put(self, docCid: str, expanded: dict):
+        self._mem[docCid] = expanded
+
+        if self._store:
+            try:
+                data = orjson.dumps({
+                    'cid': docCid,
+                    'ctx': self._ctxVersion,
+                    'expanded': expanded
+                })
+            except Exception as err:
+                log.debug(f'Expanded DID cache: {docCid}: {err}')
+                return False
+
+            return await self._store.put(self.diskKey(docCid), data)
+
+        return True
+
+    async def warm(self, count=64):
+        """
+        Load the most recently used expanded documents from the
+        on-disk store into memory
+        """
+
+        if not self._store or count <= 0:
+            return 0
+
+        loop = asyncio.get_event_loop()
+
+        entries = await loop.run_in_executor(
+            None, lambda: list(self._store.diskReadRecent(count)))
+
+        for data in entries:
+            try:
+                entry = orjson.loads(data)
+
+                if entry.get('ctx') != self._ctxVersion:
+                    continue
+
+                self._mem[entry['cid']] = entry['expanded']
+                self.stats.warmed += 1
+            except Exception:
+                continue
+
+        log.debug(f'Expanded DID cache: warmed {self.stats.warmed} '
+                  f'documents ({self._store.diskSize} bytes on disk)')
+
+        return self.stats.warmed
+
+    def clear(self):
+        self._mem.clear()
+
+        if self._store:
+            self._store.clear()
+
+        self.stats.reset()
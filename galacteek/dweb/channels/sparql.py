@@ -1,5 +1,3 @@
-from rdflib.plugins.sparql import prepareQuery
-
 from PyQt5.QtCore import pyqtSlot
 from PyQt5.QtCore import QVariant
 from PyQt5.QtCore import QJsonValue
@@ -7,6 +5,7 @@ from PyQt5.QtCore import QJsonValue
 from galacteek import services
 from galacteek import log
 from galacteek.ld.rdf import dbpedia
+from galacteek.ld.sparql.registry import queryRegistry
 
 from . import GAsyncObject
 
@@ -23,7 +22,7 @@ class SparQLInterface(object):
 
         reply = []
         try:
-            q = prepareQuery(query)
+            q = queryRegistry.prepare(query)
             graph = self.rdfService.graphByUri(graphIri)
             assert graph is not None
 
@@ -1,5 +1,8 @@
 import asyncio
 import aiorwlock
+import hashlib
+import orjson
+import weakref
 from cachetools import TTLCache
 
 from async_generator import async_generator, yield_, yield_from_
@@ -9,6 +12,7 @@ from PyQt5.QtCore import (pyqtSignal, QObject)
 from galacteek import log
 from galacteek import ensure
 from galacteek import AsyncSignal
+from galacteek.config import cParentGet
 from galacteek.ipfs.paths import posixIpfsPath
 from galacteek.ipfs.wrappers import ipfsOp
 from galacteek.ipfs.cidhelpers import joinIpfs
@@ -22,6 +26,37 @@ from galacteek.core import utcDatetimeIso
 from galacteek.core.asynccache import selfcachedcoromethod
 
 
+# Key of the index node replacing a sharded map in a stored DAG
+shardsMarker = '_gshards'
+
+
+# EDAGs with changes waiting to be saved (write-coalescing mode)
+_pendingEDags = weakref.WeakSet()
+
+
+async def edagsFlush(timeout=10):
+    """
+    Save all the EDAGs with pending changes (called on shutdown)
+    """
+
+    edags = list(_pendingEDags)
+
+    if edags:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*[edag.flush() for edag in edags],
+                               return_exceptions=True),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            log.debug('EDAGs flush: timeout')
+
+
+def shardDigest(bucket: dict) -> str:
+    return hashlib.sha256(
+        orjson.dumps(bucket, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
 class DAGObj:
     def __init__(self, data):
         self.data = data
@@ -177,6 +212,54 @@ class DAGOperations:
         elif isinstance(cid, dict) and 'Hash' in cid:
             return {"/": cid['Hash']}
 
+    @ipfsOp
+    async def shardsExpand(self, op, node, path='', cache=None):
+        """
+        Rebuild the maps that were stored as sharded sub-nodes
+        in this DAG node (recursively)
+
+        :param dict cache: if set, the (digest, cid) of each bucket
+            is stored in this dict, by map path
+        """
+
+        if not isinstance(node, dict):
+            return node
+
+        index = node.get(shardsMarker)
+
+        if isinstance(index, dict):
+            buckets = index.get('buckets', {})
+            pCache = cache.setdefault(path, {}) if cache is not None \
+                else None
+
+            async def getBucket(bkey, link):
+                bucket = await op.dagGet(link['/'])
+
+                if not isinstance(bucket, dict):
+                    raise DAGError(f'{path}: cannot load shard {bkey}')
+
+                if pCache is not None:
+                    pCache[bkey] = (shardDigest(bucket), link['/'])
+
+                return bucket
+
+            mapping = {}
+            for bucket in await asyncio.gather(*[
+                    getBucket(bkey, link) for bkey, link in buckets.items()]):
+                mapping.update(bucket)
+
+            return mapping
+
+        for key, value in node.items():
+            if isinstance(value, dict):
+                node[key] = await self.shardsExpand(
+                    value,
+                    path=f'{path}/{key}' if path else key,
+                    cache=cache
+                )
+
+        return node
+
     @ipfsOp
     async def inline(self, ipfsop):
         # In-line the JSON-LD contexts in the DAG for JSON-LD usage
@@ -269,6 +352,8 @@ class DAGPortal(QObject, DAGOperations):
         )
 
         if self.dagRoot:
+            self._dagRoot = await self.shardsExpand(self._dagRoot)
+
             self.evLoaded.set()
             self.loaded.emit(self.dagCid)
             return self.dagRoot
@@ -313,6 +398,20 @@ class EvolvingDAG(QObject, DAGOperations):
 
     :param str dagMetaMfsPath: the path inside the MFS for the metadata
         describing this DAG
+
+    Large maps can be stored as sharded sub-nodes linked by CID:
+    shardedPaths lists the paths of these maps in the DAG ('*' matches
+    any key, e.g 'c/seeds/*'). A map with at least shardMinKeys keys
+    is split in shardsCount buckets (by hash of the key), and only the
+    buckets that changed since the last save are stored again.
+
+    Sharding is opt-in (sharding=True, or the edags.sharding.enabled
+    setting) since peers running older versions cannot read sharded
+    DAGs. Sharded DAGs are always read transparently.
+
+    With saveCoalesce (or a positive saveInterval), edits only mark the
+    DAG as dirty, and the DAG is saved at most once per saveInterval
+    seconds. Call flush() to save the pending changes right away.
     """
 
     changed = pyqtSignal()
@@ -321,11 +420,19 @@ class EvolvingDAG(QObject, DAGOperations):
 
     keyCidLatest = 'cidlatest'
 
+    shardedPaths = []
+    shardsCount = 64
+    shardMinKeys = 256
+
+    saveCoalesce = False
+
     def __init__(self, dagMetaMfsPath, dagMetaHistoryMax=12, offline=False,
                  unpinOnUpdate=False, autoPreviousNode=True,
                  cipheredMeta=False,
                  autoUpdateDates=False, loop=None,
-                 portalCacheTtl=60):
+                 portalCacheTtl=60,
+                 saveInterval=None,
+                 sharding=None):
         super().__init__()
 
         self.loop = loop if loop else asyncio.get_event_loop()
@@ -345,10 +452,89 @@ class EvolvingDAG(QObject, DAGOperations):
         self._autoUpdateDates = autoUpdateDates
         self._cipheredMeta = cipheredMeta
 
+        # (digest, cid) of the stored shards, by map path
+        self._shards = {}
+        self._sharding = sharding
+
+        self._saveInterval = saveInterval
+        self._saveDirty = False
+        self._saveTask = None
+        self._flushLock = asyncio.Lock()
+
         self.dagUpdated = AsyncSignal(str)
         self.available = AsyncSignal(object)
 
-        self.changed.connect(lambda: ensure(self.ipfsSave()))
+        self.changed.connect(self.onChanged)
+
+    @property
+    def saveInterval(self):
+        if self._saveInterval is None:
+            cfg = cParentGet('edags') if self.saveCoalesce else None
+            self._saveInterval = cfg.get('saveInterval', 0) if cfg else 0
+
+        return self._saveInterval
+
+    @property
+    def shardingEnabled(self):
+        if self._sharding is None:
+            cfg = cParentGet('edags')
+            sCfg = cfg.get('sharding') if cfg else None
+            self._sharding = sCfg.get('enabled', False) if sCfg else False
+
+        return self._sharding and len(self.shardedPaths) > 0
+
+    @property
+    def saveDirty(self):
+        return self._saveDirty
+
+    def onChanged(self):
+        if self.saveInterval <= 0:
+            ensure(self.ipfsSave())
+            return
+
+        self._saveDirty = True
+        _pendingEDags.add(self)
+
+        if not self._saveTask or self._saveTask.done():
+            self._saveTask = ensure(self.saveScheduled())
+
+    async def saveScheduled(self):
+        try:
+            await asyncio.sleep(self.saveInterval)
+        except asyncio.CancelledError:
+            return
+
+        self._saveTask = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Save the pending changes now (if any), and return the DAG's CID
+        """
+
+        if self._saveTask and not self._saveTask.done():
+            self._saveTask.cancel()
+
+        self._saveTask = None
+
+        # Also waits for a save started by saveScheduled() to finish
+        async with self._flushLock:
+            if self._saveDirty:
+                self._saveDirty = False
+                _pendingEDags.discard(self)
+
+                try:
+                    saved = await self.ipfsSave()
+                except Exception as err:
+                    self.debug(f'Save error: {err}')
+                    saved = False
+
+                if saved is not True:
+                    # Keep the changes pending
+                    self._saveDirty = True
+                    _pendingEDags.add(self)
+
+        return self.dagCid
 
     @property
     def wLock(self):
@@ -428,6 +614,10 @@ class EvolvingDAG(QObject, DAGOperations):
                 self.debug('Getting DAG: {cid}'.format(cid=self.dagCid))
                 self._dagRoot = await op.dagGet(self.dagCid)
 
+                if self.dagRoot:
+                    self._dagRoot = await self.shardsExpand(
+                        self._dagRoot, cache=self._shards)
+
                 if self.dagRoot:
                     if self.updateDagSchema(self.dagRoot) is True:
                         # save right away
@@ -453,6 +643,103 @@ class EvolvingDAG(QObject, DAGOperations):
         self.parser = traverseParser(self.dagRoot)
         await self.available.emit(self.dagRoot)
 
+    def shardKey(self, key: str) -> str:
+        h = hashlib.blake2b(key.encode(), digest_size=4).digest()
+        return '{0:03x}'.format(int.from_bytes(h, 'big') % self.shardsCount)
+
+    async def shardMap(self, op, mapping: dict, path: str):
+        """
+        Store a map as sharded sub-nodes, and return the index node
+        (or the map itself if it's too small to be sharded)
+        """
+
+        if len(mapping) < self.shardMinKeys:
+            self._shards.pop(path, None)
+            return mapping
+
+        buckets = {}
+        pCache = self._shards.setdefault(path, {})
+        sem = asyncio.Semaphore(8)
+
+        for key, value in mapping.items():
+            buckets.setdefault(self.shardKey(key), {})[key] = value
+
+        async def putBucket(bkey, bucket):
+            digest = shardDigest(bucket)
+            cached = pCache.get(bkey)
+
+            if cached and cached[0] == digest:
+                # Unchanged since the last save
+                return bkey, cached[1]
+
+            async with sem:
+                # The root node is pinned recursively
+                cid = await op.dagPut(bucket, pin=False,
+                                      offline=self._offline)
+
+            if not cid:
+                raise DAGError(f'{path}: could not store shard {bkey}')
+
+            pCache[bkey] = (digest, cid)
+            return bkey, cid
+
+        links = await asyncio.gather(*[
+            putBucket(bkey, bucket) for bkey, bucket in buckets.items()])
+
+        for bkey in list(pCache.keys()):
+            if bkey not in buckets:
+                del pCache[bkey]
+
+        return {
+            shardsMarker: {
+                'v': 1,
+                'n': self.shardsCount,
+                'buckets': {bkey: self.mkLink(cid) for bkey, cid in links}
+            }
+        }
+
+    async def shardsPack(self, op, node, comps: list, path=''):
+        # Copy of node, with the maps matching the path
+        # components replaced by their shards index
+
+        if not isinstance(node, dict) or not comps:
+            return node
+
+        comp, rest = comps[0], comps[1:]
+        keys = list(node.keys()) if comp == '*' else \
+            [comp] if comp in node else []
+        copy = dict(node)
+
+        for key in keys:
+            child = node[key]
+            cpath = f'{path}/{key}' if path else key
+
+            if not isinstance(child, dict):
+                continue
+
+            if rest:
+                copy[key] = await self.shardsPack(op, child, rest, cpath)
+            else:
+                copy[key] = await self.shardMap(op, child, cpath)
+
+        return copy
+
+    async def dagStored(self, op):
+        """
+        Return the root node as it should be stored
+        (with sharded maps if sharding is enabled)
+        """
+
+        root = self.dagRoot
+
+        if not self.shardingEnabled:
+            return root
+
+        for spath in self.shardedPaths:
+            root = await self.shardsPack(op, root, spath.split('/'))
+
+        return root
+
     @ipfsOp
     async def ipfsSave(self, op):
         self.debug('Saving (acquiring lock)')
@@ -474,7 +761,13 @@ class EvolvingDAG(QObject, DAGOperations):
             # We always PIN the latest DAG and do a pin update using the
             # previous item in the history
 
-            cid = await op.dagPut(self.dagRoot, pin=True,
+            try:
+                stored = await self.dagStored(op)
+            except DAGError as err:
+                self.debug(f'Sharding error: {err}')
+                return False
+
+            cid = await op.dagPut(stored, pin=True,
                                   offline=self._offline)
             if cid is not None:
                 if prevCid is not None and prevCid not in history:
@@ -550,6 +843,9 @@ class EvolvingDAG(QObject, DAGOperations):
                     raise DAGRewindException(
                         'Previous object unavailable')
 
+                self._shards.clear()
+                pDag = await self.shardsExpand(pDag, cache=self._shards)
+
                 # Pop it now and set the latest CID
                 history.pop(0)
                 self.dagMeta[self.keyCidLatest] = newCid
@@ -101,6 +101,13 @@ class IpfsRSAAgent:
         return await self.rsaExec.decryptData(BytesIO(data),
                                               await self._privateKey())
 
+    async def encryptEnvelope(self, data: bytes, recipientKeys: list):
+        return await self.rsaExec.encryptEnvelope(data, recipientKeys)
+
+    async def decryptEnvelope(self, envelope: dict):
+        return await self.rsaExec.decryptEnvelope(
+            envelope, await self._privateKey())
+
     @ipfsOp
     async def storeSelf(self, op, data, offline=False, wrap=False):
         """
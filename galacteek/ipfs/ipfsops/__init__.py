@@ -50,6 +50,7 @@ from galacteek import AsyncSignal
 import aioipfs
 
 from .nscache import IPNSCache
+from .objcache import IPFSObjectCache  # noqa
 from .pinops import RemotePinningOps
 from .pinops import RemotePinningServiceOps
 from .ldops import LinkedDataOps
@@ -276,6 +277,7 @@ class IPFSOperator(RemotePinningOps,
     def __init__(self, client, ctx=None, rsaAgent=None, debug=False,
                  offline=False,
                  nsCache=None,
+                 objCache=None,
                  objectMapping=False):
         super().__init__()
 
@@ -287,6 +289,7 @@ class IPFSOperator(RemotePinningOps,
         self._rsaAgent = rsaAgent
         self._curve25519Agent = None
         self._nsCache = nsCache if nsCache else IPNSCache(Path('ncache.json'))
+        self._objCache = objCache
         self._noPeers = True
         self._ldDocLoader = None
         self.debugInfo = debug
@@ -307,6 +310,10 @@ class IPFSOperator(RemotePinningOps,
     def nsCache(self):
         return self._nsCache
 
+    @property
+    def objCache(self):
+        return self._objCache
+
     @property
     def offline(self):
         return self._offline
@@ -370,7 +377,9 @@ class IPFSOperator(RemotePinningOps,
 
     @async_enterable
     async def offlineMode(self):
-        clone = IPFSOperator(self.client, ctx=self.ctx)
+        clone = IPFSOperator(self.client, ctx=self.ctx,
+                             nsCache=self.nsCache,
+                             objCache=self.objCache)
         return IPFSOperatorOfflineContext(clone)
 
     async def __aenter__(self):
@@ -1216,7 +1225,9 @@ class IPFSOperator(RemotePinningOps,
             self.debug(f'listStreamed ({path}): IPFS error: {e.message}')
             raise e
         except asyncio.CancelledError:
-            self.debug('listStreamed ({path}): cancelled')
+            # Don't end the listing silently, it would look complete
+            self.debug(f'listStreamed ({path}): cancelled')
+            raise
         except BaseException as err:
             self.debug(f'listStreamed ({path}): unknown error: {err}')
             raise err
@@ -1593,14 +1604,36 @@ class IPFSOperator(RemotePinningOps,
 
     async def catObject(self, path, offset=None, length=None, timeout=None):
         cfg = self.opConfig('catObject')
+        cache = self.objCache
+
+        mPath = await self.objectPathMapper(path)
+        key = cache.cacheKey(mPath) if cache and cache.enabled else None
+
+        if key:
+            data = await cache.get(key)
+
+            if data is not None:
+                if offset is None and length is None:
+                    return data
 
-        return await self.waitFor(
+                start = offset if offset else 0
+                return data[start:start + length] if length is not None \
+                    else data[start:]
+
+        data = await self.waitFor(
             self.client.cat(
-                await self.objectPathMapper(path),
+                mPath,
                 offset=offset, length=length
             ), timeout if timeout else cfg.timeout
         )
 
+        if key and data is not None and not offset and \
+                (length is None or len(data) < length):
+            # Got the whole object
+            await cache.put(key, data)
+
+        return data
+
     async def listObject(self, path, timeout=None):
         cfg = self.opConfig('listObject')
         try:
@@ -1612,28 +1645,124 @@ class IPFSOperator(RemotePinningOps,
         except (aioipfs.APIError, aioipfs.UnknownAPIError):
             pass
 
-    async def walk(self, path):
+    async def walkListDir(self, path, cid=None):
         """
-        Walks over UnixFS nodes and yields only paths of
-        file objects.
+        Returns the entries of a UnixFS directory, from the directory
+        entries cached in the objects metadata DB if available (only
+        complete listings are used)
         """
+
+        app = getattr(self.ctx, 'app', None) if self.ctx else None
+        metaDb = getattr(app, 'multihashDb', None)
+
+        if metaDb:
+            for key in [path, joinIpfs(cid) if cid else None]:
+                if not key or not await metaDb.hasDirEntries(
+                        key, complete=True):
+                    continue
+
+                entries = []
+                async for pack in metaDb.getDirEntries(key):
+                    entries += pack
+
+                if entries:
+                    return entries
+
+        result = await self.listObject(cid if cid else path)
+
+        if isinstance(result, dict):
+            objects = result.get('Objects', [])
+
+            if len(objects) > 0:
+                return objects.pop().get('Links', [])
+
+        return []
+
+    async def walk(self, path, concurrency=None, maxDepth=None,
+                   maxFiles=None, bufferSize=64):
+        """
+        Walks over UnixFS nodes (breadth-first) and yields only paths
+        of file objects, as (filePath, parentPath) tuples.
+
+        Directories are listed concurrently, by a limited number of
+        listing tasks. The tasks are cancelled when the generator is
+        closed: if you leave the loop early, call aclose() on the
+        generator (or use core.asynclib.aclosing) so that they don't
+        keep running until it's garbage-collected.
+
+        :param int concurrency: max number of directories being listed
+            at the same time
+        :param int maxDepth: max depth of the directories walked
+            (0: only the root directory, -1: no limit)
+        :param int maxFiles: stop after yielding this number of
+            files (0: no limit)
+        :param int bufferSize: max number of files found and waiting
+            to be yielded (listing pauses when the caller falls behind)
+        """
+
+        cfg = self.opConfig('walk')
+        concurrency = concurrency if concurrency else cfg.concurrency
+        maxDepth = maxDepth if maxDepth is not None else cfg.maxDepth
+        maxFiles = maxFiles if maxFiles is not None else cfg.maxFiles
+
+        dirs = asyncio.Queue()
+        results = asyncio.Queue(maxsize=max(bufferSize, 1))
+        pending = 1
+
+        async def lister():
+            nonlocal pending
+
+            while True:
+                dPath, dCid, depth = await dirs.get()
+
+                try:
+                    links = await self.walkListDir(dPath, cid=dCid)
+
+                    for entry in links:
+                        ePath = IPFSPath(dPath).child(entry['Name'])
+
+                        if not ePath.valid:
+                            continue
+
+                        if entry['Type'] == 1 and (
+                                maxDepth < 0 or depth < maxDepth):
+                            pending += 1
+                            dirs.put_nowait(
+                                (str(ePath), entry['Hash'], depth + 1))
+                        elif entry['Type'] == 2:
+                            await results.put((str(ePath), dPath))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    self.debug(f'walk: error listing {dPath}: {err}')
+
+                pending -= 1
+
+                if pending == 0:
+                    # Everything was listed
+                    await results.put(None)
+
+        dirs.put_nowait((path, None, 0))
+
+        workers = [asyncio.ensure_future(lister())
+                   for x in range(max(concurrency, 1))]
+        count = 0
+
         try:
-            result = await self.listObject(path)
-        except aioipfs.APIError:
-            pass
-        else:
-            _olist = result.get('Objects', [])
-            if len(_olist) > 0:
-                links = _olist.pop()['Links']
-
-                for entry in links:
-                    if entry['Type'] == 1:
-                        async for value in self.walk(entry['Hash']):
-                            yield value
-                    elif entry['Type'] == 2:
-                        fPath = IPFSPath(path).child(entry['Name'])
-                        if fPath.valid:
-                            yield (str(fPath), path)
+            while True:
+                item = await results.get()
+
+                if item is None:
+                    break
+
+                yield item
+
+                count += 1
+                if maxFiles > 0 and count >= maxFiles:
+                    break
+        finally:
+            for worker in workers:
+                worker.cancel()
 
     async def dagPut(self, data, pin=True, offline=False):
         """
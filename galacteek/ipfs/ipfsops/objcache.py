@@ -0,0 +1,280 @@
+import asyncio
+import aiofiles
+import hashlib
+import os
+import os.path
+import collections
+from pathlib import Path
+
+from cachetools import LRUCache
+
+from galacteek import log
+from galacteek.config import cParentGet
+from galacteek.ipfs.cidhelpers import IPFSPath
+
+
+class IPFSObjectCacheStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hitsMem = 0
+        self.hitsDisk = 0
+        self.misses = 0
+        self.bytesServed = 0
+        self.bytesStored = 0
+        self.evictions = 0
+
+    @property
+    def hits(self):
+        return self.hitsMem + self.hitsDisk
+
+    @property
+    def hitRatio(self):
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def asDict(self):
+        return {
+            'hits': self.hits,
+            'hitsMem': self.hitsMem,
+            'hitsDisk': self.hitsDisk,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'bytesServed': self.bytesServed,
+            'bytesStored': self.bytesStored,
+            'evictions': self.evictions
+        }
+
+
+class IPFSObjectCache:
+    """
+    Content-addressed cache for the data returned by catObject()
+
+    Entries are keyed by the resolved (immutable) /ipfs/ path of
+    the object, so there's never anything to invalidate, only
+    eviction. There are two levels: an in-memory LRU cache bounded
+    by the total size of the objects, and an on-disk LRU store.
+    """
+
+    def __init__(self, path: Path,
+                 memMaxSize=None,
+                 diskMaxSize=None,
+                 objMaxSize=None):
+        self.cachePath = Path(path)
+        self.stats = IPFSObjectCacheStats()
+
+        self._memMaxSize = memMaxSize
+        self._diskMaxSize = diskMaxSize
+        self._objMaxSize = objMaxSize
+        self._lock = asyncio.Lock()
+        self._mem = LRUCache(self.memMaxSize, getsizeof=len)
+        self._disk = collections.OrderedDict()
+        self._diskSize = 0
+        self._diskLoaded = False
+
+    @property
+    def cObjCache(self):
+        return cParentGet('objCache')
+
+    @property
+    def enabled(self):
+        cfg = self.cObjCache
+        return cfg.enabled if cfg else False
+
+    @property
+    def memMaxSize(self):
+        if self._memMaxSize is None:
+            cfg = self.cObjCache
+            self._memMaxSize = cfg.memMaxSize if cfg else 32 * 1024 * 1024
+        return self._memMaxSize
+
+    @property
+    def diskMaxSize(self):
+        if self._diskMaxSize is None:
+            cfg = self.cObjCache
+            self._diskMaxSize = cfg.diskMaxSize if cfg else \
+                256 * 1024 * 1024
+        return self._diskMaxSize
+
+    @property
+    def objMaxSize(self):
+        if self._objMaxSize is None:
+            cfg = self.cObjCache
+            self._objMaxSize = cfg.objMaxSize if cfg else 4 * 1024 * 1024
+        return self._objMaxSize
+
+    @property
+    def diskSize(self):
+        return self._diskSize
+
+    def cacheKey(self, path):
+        """
+        Return the cache key for a path, or None if the path
+        is not immutable (IPNS paths are never cached)
+        """
+
+        ipfsPath = path if isinstance(path, IPFSPath) else \
+            IPFSPath(str(path), autoCidConv=True)
+
+        if ipfsPath.valid and ipfsPath.isIpfs:
+            return ipfsPath.objPath.rstrip('/')
+
+    def keyDigest(self, key: str):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def diskPath(self, digest: str):
+        return self.cachePath.joinpath(digest[0:2]).joinpath(digest)
+
+    def diskLoad(self):
+        """
+        Scan the on-disk store, ordering entries by access time
+        """
+
+        if self._diskLoaded:
+            return
+
+        self._diskLoaded = True
+        entries = []
+
+        try:
+            self.cachePath.mkdir(parents=True, exist_ok=True)
+
+            for container in self.cachePath.iterdir():
+                if not container.is_dir():
+                    continue
+
+                for entry in container.iterdir():
+                    if entry.name.endswith('.tmp'):
+                        entry.unlink()
+                        continue
+
+                    st = entry.stat()
+                    entries.append((st.st_atime, entry.name, st.st_size))
+        except Exception as err:
+            log.debug(f'Object cache: error scanning {self.cachePath}: {err}')
+
+        for atime, digest, size in sorted(entries):
+            self._disk[digest] = size
+            self._diskSize += size
+
+        log.debug(f'Object cache: {len(self._disk)} objects on disk '
+                  f'({self._diskSize} bytes)')
+
+    def diskReadRecent(self, count: int):
+        """
+        Read the most recently used objects of the on-disk store
+        (blocking, used to warm up caches from an executor)
+        """
+
+        self.diskLoad()
+
+        for digest in list(self._disk.keys())[-count:]:
+            try:
+                with open(str(self.diskPath(digest)), 'rb') as fd:
+                    yield fd.read()
+            except Exception:
+                continue
+
+    def diskEvict(self):
+        while self._disk and self._diskSize > self.diskMaxSize:
+            digest, size = self._disk.popitem(last=False)
+            self._diskSize -= size
+            self.stats.evictions += 1
+
+            try:
+                os.unlink(str(self.diskPath(digest)))
+            except Exception:
+                continue
+
+    def memStore(self, key, data):
+        try:
+            self._mem[key] = data
+        except ValueError:
+            # Too large for the memory cache
+            pass
+
+    async def get(self, key):
+        data = self._mem.get(key)
+
+        if data is not None:
+            self.stats.hitsMem += 1
+            self.stats.bytesServed += len(data)
+            return data
+
+        self.diskLoad()
+
+        digest = self.keyDigest(key)
+        if digest not in self._disk:
+            self.stats.misses += 1
+            return None
+
+        try:
+            async with aiofiles.open(
+                    str(self.diskPath(digest)), 'rb') as fd:
+                data = await fd.read()
+        except Exception as err:
+            log.debug(f'Object cache: cannot read {key}: {err}')
+
+            self._diskSize -= self._disk.pop(digest, 0)
+            self.stats.misses += 1
+            return None
+
+        self._disk.move_to_end(digest)
+        self.memStore(key, data)
+
+        self.stats.hitsDisk += 1
+        self.stats.bytesServed += len(data)
+        return data
+
+    async def put(self, key, data):
+        if not isinstance(data, bytes) or len(data) > self.objMaxSize:
+            return False
+
+        self.memStore(key, data)
+        self.diskLoad()
+
+        digest = self.keyDigest(key)
+        if digest in self._disk:
+            return True
+
+        fPath = self.diskPath(digest)
+        tmpPath = f'{fPath}.tmp'
+
+        async with self._lock:
+            if digest in self._disk:
+                # Stored by a concurrent put while we were waiting
+                return True
+
+            try:
+                fPath.parent.mkdir(parents=True, exist_ok=True)
+
+                async with aiofiles.open(tmpPath, 'wb') as fd:
+                    await fd.write(data)
+
+                os.replace(tmpPath, str(fPath))
+            except Exception as err:
+                log.debug(f'Object cache: cannot store {key}: {err}')
+                return False
+
+            self._disk[digest] = len(data)
+            self._diskSize += len(data)
+            self.stats.bytesStored += len(data)
+
+            self.diskEvict()
+
+        return True
+
+    def clear(self):
+        self._mem.clear()
+        self._diskLoaded = True
+
+        for digest in list(self._disk.keys()):
+            try:
+                os.unlink(str(self.diskPath(digest)))
+            except Exception:
+                pass
+
+        self._disk.clear()
+        self._diskSize = 0
+        self.stats.reset()
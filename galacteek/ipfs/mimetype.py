@@ -1,17 +1,26 @@
 import asyncio
 import shutil
-import functools
 import re
 import binascii
 import struct
 import platform
+import posixpath
+import threading
+import orjson
 import os
 import os.path
 
+from concurrent.futures import ThreadPoolExecutor
+
 import aioipfs
 
+from cachetools import LRUCache
+
 from galacteek import log
+from galacteek.config import cParentGet
 from galacteek.ipfs import ipfsOpFn
+from galacteek.ipfs.cidhelpers import IPFSPath
+from galacteek.ipfs.cidhelpers import cidValid
 from galacteek.ipfs.ipfsops import APIErrorDecoder
 from galacteek.core.asynclib import asyncReadFile
 from galacteek.core import inPyInstaller
@@ -19,6 +28,7 @@ from galacteek.core import pyInstallerBundleFolder
 
 
 iMagic = None
+iMagicLocal = threading.local()
 
 
 try:
@@ -196,25 +206,108 @@ mimeTypeDagUnknown = MIMEType('ipfs/dag-unknown')
 mimeTypeWasm = MIMEType('application/wasm')
 
 
+# Well-known file signatures (magic numbers at offset 0)
+mimeSignatures = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+    (b'\x00asm', 'application/wasm'),
+    (b'\x1f\x8b\x08', 'application/gzip'),
+    (b'\xfd7zXZ\x00', 'application/x-xz'),
+    (b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed'),
+    (b'fLaC', 'audio/flac')
+]
+
+# Well-known file extensions
+mimeExtensions = {
+    'css': 'text/css',
+    'htm': 'text/html',
+    'html': 'text/html',
+    'js': 'application/javascript',
+    'json': 'application/json',
+    'jsonld': 'application/ld+json',
+    'mjs': 'application/javascript',
+    'svg': 'image/svg+xml',
+    'torrent': 'application/x-bittorrent',
+    'ttl': 'text/turtle',
+    'txt': 'text/plain',
+    'wasm': 'application/wasm',
+    'webm': 'video/webm',
+    'webp': 'image/webp',
+    'yaml': 'application/yaml',
+    'yml': 'application/yaml'
+}
+
+
+def mimeTypeFromSignature(buff: bytes):
+    """
+    Returns the MIME type of the buffer if it starts with a
+    well-known signature, None otherwise
+
+    :rtype: MIMEType
+    """
+
+    if buff[0:4] == b'RIFF' and buff[8:12] == b'WEBP':
+        return MIMEType('image/webp')
+
+    for sig, mType in mimeSignatures:
+        if buff.startswith(sig):
+            return MIMEType(mType)
+
+
+def mimeTypeFromName(name: str):
+    """
+    Returns the MIME type associated with the file extension
+    of name if it's a well-known extension, None otherwise
+
+    :rtype: MIMEType
+    """
+
+    ext = posixpath.splitext(name)[1].lstrip('.').lower()
+
+    if ext in mimeExtensions:
+        return MIMEType(mimeExtensions[ext])
+
+
+def magicCreate():
+    dbPath = os.environ.get('GALACTEEK_MAGIC_DBPATH')
+    sys = platform.system()
+
+    if sys in ['Darwin', 'Windows']:
+        if inPyInstaller():
+            dbPath = str(pyInstallerBundleFolder().joinpath('magic.mgc'))
+
+    if dbPath and os.path.isfile(dbPath):
+        log.debug(f'Using magic DB from path: {dbPath}')
+
+        return magic.Magic(mime=True, magic_file=dbPath)
+    else:
+        return magic.Magic(mime=True)
+
+
 def magicInstance():
     global iMagic
 
     if iMagic is None:
-        dbPath = os.environ.get('GALACTEEK_MAGIC_DBPATH')
-        sys = platform.system()
+        iMagic = magicCreate()
 
-        if sys in ['Darwin', 'Windows']:
-            if inPyInstaller():
-                dbPath = str(pyInstallerBundleFolder().joinpath('magic.mgc'))
+    return iMagic
 
-        if dbPath and os.path.isfile(dbPath):
-            log.debug(f'Using magic DB from path: {dbPath}')
 
-            iMagic = magic.Magic(mime=True, magic_file=dbPath)
-        else:
-            iMagic = magic.Magic(mime=True)
+def magicFromBuffer(buff):
+    """
+    Run libmagic on a buffer. libmagic handles can't be shared
+    between threads, so there's one Magic instance per thread.
+    """
 
-    return iMagic
+    m = getattr(iMagicLocal, 'magic', None)
+
+    if m is None:
+        m = iMagicLocal.magic = magicCreate()
+
+    return m.from_buffer(buff)
 
 
 def mimeTypeProcess(mTypeText, buff, info=None):
@@ -237,59 +330,295 @@ def mimeTypeProcess(mTypeText, buff, info=None):
     return MIMEType(mTypeText)
 
 
-async def detectMimeTypeFromBuffer(buff):
+class MIMETypeDetectorStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.signatures = 0
+        self.extensions = 0
+        self.magicRuns = 0
+
+    @property
+    def hitRatio(self):
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def asDict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'signatures': self.signatures,
+            'extensions': self.extensions,
+            'magicRuns': self.magicRuns
+        }
+
+
+class MIMETypeDetector:
     """
-    Guess the MIME type from a bytes buffer, using either libmagic or file(1)
+    MIME type detection service
 
-    Returns a MIMEType object
+    Buffers are checked against well-known signatures first, then
+    the file extension (when known) is used, and libmagic is only
+    run as a last resort, in a dedicated thread pool.
 
-    :param bytes buff: buffer data
-    :rtype: MIMEType
+    The MIME types of IPFS objects (immutable /ipfs/ paths only)
+    are kept in an LRU cache which, once persist() has been called,
+    is saved to disk (shortly after it changes, and on close()).
     """
 
-    infoString = None
-    if haveMagic:
-        # Use libmagic
-        # Run it in an asyncio executor
-        loop = asyncio.get_event_loop()
+    def __init__(self, workers=2, cacheMaxEntries=16384, saveDelay=10):
+        self.workers = workers
+        self.saveDelay = saveDelay
+        self.extensionsFastPath = True
+        self.stats = MIMETypeDetectorStats()
+
+        self._cache = LRUCache(cacheMaxEntries)
+        self._cachePath = None
+        self._cacheDirty = False
+        self._saveHandle = None
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='mimedetect'
+            )
+
+        return self._executor
+
+    def cacheKey(self, rscPath):
+        """
+        Returns the cache key for an IPFS resource, or None if
+        the path is mutable
+        """
+
+        path = rscPath.objPath if isinstance(rscPath, IPFSPath) else \
+            str(rscPath)
+
+        if path.startswith('/ipfs/'):
+            return path.rstrip('/')
+        elif cidValid(path):
+            return f'/ipfs/{path}'
+
+    def cached(self, rscPath):
+        key = self.cacheKey(rscPath)
+        mType = self._cache.get(key) if key else None
+
+        return MIMEType(mType) if mType else None
+
+    def cacheStore(self, rscPath, mimeType: MIMEType):
+        key = self.cacheKey(rscPath)
+
+        if key and mimeType and mimeType.valid:
+            self._cache[key] = mimeType.type
+            self._cacheDirty = True
+            self.cacheSaveLater()
+
+    def persist(self, path):
+        """
+        Load the on-disk cache from path, and save the cache
+        there from now on
+        """
+
+        cfg = cParentGet('mimeDetect')
+
+        if cfg:
+            cacheCfg = cfg.get('cache', {})
+
+            self.workers = cfg.get('workers', self.workers)
+            self.extensionsFastPath = cfg.get('extensionsFastPath', True)
+            self.saveDelay = cacheCfg.get('saveDelay', self.saveDelay)
+
+            self._cache = LRUCache(
+                cacheCfg.get('maxEntries', self._cache.maxsize))
+
+        self._cachePath = str(path)
+
+        if not os.path.isfile(self._cachePath):
+            return
 
         try:
-            m = magicInstance()
-            mime = await loop.run_in_executor(
-                None, functools.partial(m.from_buffer, buff))
+            with open(self._cachePath, 'rb') as fd:
+                entries = orjson.loads(fd.read())
+
+            for key, mType in entries.items():
+                self._cache[key] = mType
         except Exception as err:
-            log.debug(f'Error running magic: {err}')
-            return None
+            log.debug(f'MIME cache: could not load cache: {err}')
         else:
-            if isinstance(mime, str):
-                return mimeTypeProcess(mime, buff, info=infoString)
-    elif shutil.which('file'):
-        # Libmagic not available, go with good'ol file
+            log.debug(f'MIME cache: loaded {len(self._cache)} entries')
+
+    def _cacheWrite(self, data: bytes):
+        tmpPath = f'{self._cachePath}.tmp'
 
         try:
-            proc = await asyncio.create_subprocess_shell(
-                'file --mime-type -',
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate(buff)
+            with open(tmpPath, 'wb') as fd:
+                fd.write(data)
 
-            out = stdout.decode().strip()
-            spl = out.split(':')
-        except:
+            os.replace(tmpPath, self._cachePath)
+        except Exception as err:
+            log.debug(f'MIME cache: could not save cache: {err}')
+
+    def cacheSave(self):
+        """
+        Save the cache from the detection thread pool (returns
+        the future), if it has changed
+        """
+
+        self._saveHandle = None
+
+        if not self._cachePath or not self._cacheDirty:
             return None
+
+        self._cacheDirty = False
+
+        return self.executor.submit(
+            self._cacheWrite, orjson.dumps(dict(self._cache.items())))
+
+    def cacheSaveLater(self):
+        if not self._cachePath or self._saveHandle:
+            return
+
+        try:
+            loop = asyncio.get_event_loop()
+            self._saveHandle = loop.call_later(self.saveDelay, self.cacheSave)
+        except Exception:
+            self.cacheSave()
+
+    def close(self):
+        if self._saveHandle:
+            self._saveHandle.cancel()
+            self._saveHandle = None
+
+        fut = self.cacheSave()
+        if fut:
+            fut.result()
+
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def fromBuffer(self, buff, name=None):
+        """
+        Guess the MIME type from a bytes buffer
+
+        :param bytes buff: buffer data
+        :param str name: file name (used for the extension fast path)
+        :rtype: MIMEType
+        """
+
+        mType = mimeTypeFromSignature(buff)
+        if mType:
+            self.stats.signatures += 1
+            return mType
+
+        if name and self.extensionsFastPath:
+            mType = mimeTypeFromName(name)
+            if mType:
+                self.stats.extensions += 1
+                return mType
+
+        if haveMagic:
+            # Use libmagic, in the detection thread pool
+            loop = asyncio.get_event_loop()
+
+            try:
+                self.stats.magicRuns += 1
+                mime = await loop.run_in_executor(
+                    self.executor, magicFromBuffer, buff)
+            except Exception as err:
+                log.debug(f'Error running magic: {err}')
+                return None
+            else:
+                if isinstance(mime, str):
+                    return mimeTypeProcess(mime, buff)
+        elif shutil.which('file'):
+            # Libmagic not available, go with good'ol file
+
+            try:
+                proc = await asyncio.create_subprocess_shell(
+                    'file --mime-type -',
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE
+                )
+                stdout, stderr = await proc.communicate(buff)
+
+                out = stdout.decode().strip()
+                spl = out.split(':')
+            except:
+                return None
+            else:
+                if len(spl) == 2 and spl[0] == '/dev/stdin':
+                    return mimeTypeProcess(spl[1].strip(), buff)
         else:
-            if len(spl) == 2 and spl[0] == '/dev/stdin':
-                return mimeTypeProcess(spl[1].strip(), buff)
-    else:
-        raise MimeDecodeError('No MIME detection method available')
+            raise MimeDecodeError('No MIME detection method available')
+
+    async def fromPath(self, ipfsop, rscPath, bufferSize=131070, timeout=15):
+        """
+        Returns the MIME type of an IPFS resource (from the cache
+        if possible)
+
+        :rtype: MIMEType
+        """
+
+        mimeType = self.cached(rscPath)
+
+        if mimeType:
+            self.stats.hits += 1
+            return mimeType
+
+        self.stats.misses += 1
+
+        try:
+            buff = await ipfsop.catObject(
+                rscPath, length=bufferSize, timeout=timeout)
+        except aioipfs.APIError as err:
+            dec = APIErrorDecoder(err)
+
+            if dec.errIsDirectory():
+                mimeType = MIMEType('inode/directory')
+            elif dec.errUnknownNode():
+                # Unknown kind of node, let the caller analyze the DAG
+                return mimeTypeDagUnknown
+        else:
+            if not buff:
+                return None
+
+            mimeType = await self.fromBuffer(
+                buff, name=posixpath.basename(str(rscPath).rstrip('/')))
+
+        self.cacheStore(rscPath, mimeType)
+        return mimeType
+
+
+mimeDetector = MIMETypeDetector()
+
+
+async def detectMimeTypeFromBuffer(buff):
+    """
+    Guess the MIME type from a bytes buffer, using either libmagic or file(1)
+
+    Returns a MIMEType object
+
+    :param bytes buff: buffer data
+    :rtype: MIMEType
+    """
+
+    return await mimeDetector.fromBuffer(buff)
 
 
 async def detectMimeTypeFromFile(filePath, bufferSize=131070):
     buff = await asyncReadFile(filePath, size=bufferSize)
 
     if buff:
-        return await detectMimeTypeFromBuffer(buff)
+        return await mimeDetector.fromBuffer(
+            buff, name=os.path.basename(filePath))
 
 
 @ipfsOpFn
@@ -303,6 +632,7 @@ async def detectMimeType(ipfsop, rscPath, bufferSize=131070, timeout=15):
         * for IPFS DAG nodes it will return 'ipfs/dag-pb'
 
     A chunk of the file is read and used to determine its MIME type
+    (results for immutable paths are cached by mimeDetector)
 
     Returns a MIMEType object
 
@@ -312,19 +642,6 @@ async def detectMimeType(ipfsop, rscPath, bufferSize=131070, timeout=15):
     :param int timeout: operation timeout (in seconds)
     :rtype: MIMEType
     """
-    try:
-        buff = await ipfsop.catObject(
-            rscPath, length=bufferSize, timeout=timeout)
-    except aioipfs.APIError as err:
-        dec = APIErrorDecoder(err)
-
-        if dec.errIsDirectory():
-            return MIMEType('inode/directory')
-        elif dec.errUnknownNode():
-            # Unknown kind of node, let the caller analyze the DAG
-            return mimeTypeDagUnknown
-    else:
-        if not buff:
-            return None
 
-        return await detectMimeTypeFromBuffer(buff)
+    return await mimeDetector.fromPath(
+        ipfsop, rscPath, bufferSize=bufferSize, timeout=timeout)
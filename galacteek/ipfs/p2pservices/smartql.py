@@ -11,9 +11,9 @@ from galacteek.ipfs.tunnel import P2PListener
 from galacteek.ipfs.p2pservices import P2PService
 from galacteek.core import runningApp
 from galacteek.ld.rdf import BaseGraph
+from galacteek.ld.sparql.registry import queryRegistry
 from galacteek import log
 
-from rdflib.plugins.sparql.parser import parseQuery
 from rdflib_jsonld.serializer import resource_from_rdf
 
 from aiohttp import web
@@ -165,7 +165,7 @@ class SparQLSiteHandler:
 
     def isAllowedSparqlQuery(self, query: str):
         try:
-            parseQuery(query)
+            queryRegistry.prepare(query)
             return True
         except Exception:
             return False
@@ -190,13 +190,11 @@ class SparQLSiteHandler:
 
             try:
                 assert isinstance(q, str)
-                assert self.isAllowedSparqlQuery(q) is True
 
-                r = await self.app.loop.run_in_executor(
-                    self.app.executor,
-                    self.service.graph.query,
-                    q
-                )
+                # Parsed once, and reused for identical queries
+                prepared = queryRegistry.prepare(q)
+
+                r = await self.service.graph.queryAsync(prepared)
                 assert r is not None
 
                 if 'application/json' in acceptl:
@@ -4,6 +4,8 @@ import orjson
 import os.path
 import time
 
+from collections import deque
+
 import aioipfs
 
 from galacteek import log
@@ -20,11 +22,318 @@ class Cancelled(Exception):
     pass
 
 
+class PinOrder:
+    def __init__(self, qname, path, recursive, callback):
+        self.qname = qname
+        self.path = path
+        self.recursive = recursive
+        self.callbacks = [callback] if callback else []
+        self.tsQueued = time.monotonic()
+
+
+class PinOrdersQueue:
+    """
+    Pinning orders queue
+
+    Orders are kept per named queue. get() returns the oldest order
+    of the queue with the highest priority, skipping the queues which
+    already have their maximum number of orders being processed.
+
+    :param int maxsize: max number of waiting orders (0: no limit)
+    :param qsettings: callable returning the (priority, maxActive)
+        tuple for a queue name (maxActive 0: no limit)
+    """
+
+    def __init__(self, maxsize=0, qsettings=None):
+        self.maxsize = maxsize
+        self._qsettings = qsettings
+        self._orders = {}
+        self._paths = {}
+        self._active = {}
+        self._changedEv = None
+
+    @property
+    def _changed(self):
+        if self._changedEv is None:
+            self._changedEv = asyncio.Event()
+        return self._changedEv
+
+    def qsize(self):
+        return len(self._paths)
+
+    def full(self):
+        return self.maxsize > 0 and self.qsize() >= self.maxsize
+
+    def queued(self, path):
+        return path in self._paths
+
+    def activeCount(self, qname=None):
+        if qname:
+            return self._active.get(qname, 0)
+
+        return sum(self._active.values())
+
+    def pending(self):
+        for qname, orders in self._orders.items():
+            for order in orders:
+                yield order
+
+    def qSettings(self, qname):
+        if self._qsettings:
+            return self._qsettings(qname)
+
+        return 0, 0
+
+    def _notify(self):
+        self._changed.set()
+
+    async def _waitChange(self):
+        self._changed.clear()
+        await self._changed.wait()
+
+    def _pick(self):
+        best, bestPrio = None, None
+
+        for qname, orders in self._orders.items():
+            if not orders:
+                continue
+
+            priority, maxActive = self.qSettings(qname)
+
+            if maxActive > 0 and self.activeCount(qname) >= maxActive:
+                continue
+
+            if best is None or priority > bestPrio or (
+                    priority == bestPrio and
+                    orders[0].tsQueued < best[0].tsQueued):
+                best, bestPrio = orders, priority
+
+        if best:
+            order = best.popleft()
+            self._paths.pop(order.path, None)
+            self._active[order.qname] = self.activeCount(order.qname) + 1
+            return order
+
+    def _merge(self, order: PinOrder):
+        """
+        Merge an order with the waiting order for the same path: the
+        callbacks are added to the waiting order, which is moved to
+        the order's queue if it has a higher priority
+        """
+
+        waiting = self._paths.get(order.path)
+
+        if not waiting:
+            return False
+
+        waiting.callbacks += order.callbacks
+        waiting.recursive = waiting.recursive or order.recursive
+
+        if self.qSettings(order.qname)[0] > self.qSettings(waiting.qname)[0]:
+            self._orders[waiting.qname].remove(waiting)
+            self._orders.setdefault(order.qname, deque()).append(waiting)
+            waiting.qname = order.qname
+
+        self._notify()
+        return True
+
+    async def put(self, order: PinOrder):
+        """
+        Queue an order (waits if the queue is full). Returns False
+        if an order for this path is already waiting (the orders are
+        merged, see _merge()).
+        """
+
+        if self._merge(order):
+            return False
+
+        while self.full():
+            await self._waitChange()
+
+            if self._merge(order):
+                return False
+
+        self._orders.setdefault(order.qname, deque()).append(order)
+        self._paths[order.path] = order
+        self._notify()
+        return True
+
+    async def get(self) -> PinOrder:
+        order = self._pick()
+
+        while order is None:
+            await self._waitChange()
+            order = self._pick()
+
+        self._notify()
+        return order
+
+    def release(self, order: PinOrder, requeue=False):
+        """
+        Called when an order is done. If requeue is set, the order
+        is put back in front of its queue.
+        """
+
+        self._active[order.qname] = max(self.activeCount(order.qname) - 1, 0)
+
+        if requeue and not self._merge(order):
+            self._orders.setdefault(order.qname, deque()).appendleft(order)
+            self._paths[order.path] = order
+
+        self._notify()
+
+    def remove(self, qname, path):
+        orders = self._orders.get(qname)
+
+        for order in list(orders if orders else []):
+            if order.path == path:
+                orders.remove(order)
+                self._paths.pop(path, None)
+                self._notify()
+                return True
+
+        return False
+
+
+class PinProgressTracker:
+    """
+    Tracks the status messages of a pin/add stream
+
+    Messages are consumed as soon as the daemon sends them. The
+    object is considered stalled when no progress has been made
+    for stallTimeout seconds, and status change notifications are
+    limited to one every emitInterval seconds.
+    """
+
+    def __init__(self, stallTimeout=60, emitInterval=0.5):
+        self.stallTimeout = stallTimeout
+        self.emitInterval = emitInterval
+        self.status = None
+        self.progress = None
+        self.messages = 0
+
+        self._tsProgress = time.monotonic()
+        self._tsEmit = 0
+        self._emitPending = False
+
+    @property
+    def timeLeft(self):
+        return self.stallTimeout - (time.monotonic() - self._tsProgress)
+
+    @property
+    def stalled(self):
+        return self.timeLeft <= 0
+
+    async def next(self, stream):
+        """
+        Return the next message from the stream, waiting at most
+        until the stall deadline (raises asyncio.TimeoutError)
+        """
+
+        return await asyncio.wait_for(stream.__anext__(),
+                                      max(self.timeLeft, 0))
+
+    def update(self, status: dict):
+        """
+        Process a status message. Returns True if the status change
+        should be notified now.
+        """
+
+        now = time.monotonic()
+        progress = status.get('Progress', None)
+
+        self.messages += 1
+
+        if status.get('Pins', None) or (
+                progress is not None and progress != self.progress):
+            self.progress = progress
+            self._tsProgress = now
+
+        if status != self.status:
+            self.status = status
+            self._emitPending = True
+
+        if self._emitPending and now - self._tsEmit >= self.emitInterval:
+            self._tsEmit = now
+            self._emitPending = False
+            return True
+
+        return False
+
+    def flush(self):
+        """
+        Returns True if the last status change hasn't been notified
+        """
+
+        pending, self._emitPending = self._emitPending, False
+        return pending
+
+
+class PinningStats:
+    def __init__(self, window=60):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.queued = 0
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+        self._tsDone = deque()
+
+    @property
+    def latencyAvg(self):
+        return (self.latencyTotal / self.started) if self.started else 0.0
+
+    @property
+    def throughput(self):
+        """
+        Number of orders completed per minute (over the last window)
+        """
+
+        now = time.monotonic()
+
+        while self._tsDone and now - self._tsDone[0] > self.window:
+            self._tsDone.popleft()
+
+        return len(self._tsDone) * (60 / self.window)
+
+    def orderStarted(self, order: PinOrder):
+        latency = time.monotonic() - order.tsQueued
+
+        self.started += 1
+        self.latencyTotal += latency
+        self.latencyMax = max(self.latencyMax, latency)
+
+    def orderDone(self, success: bool):
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+        self._tsDone.append(time.monotonic())
+
+    def asDict(self):
+        return {
+            'queued': self.queued,
+            'started': self.started,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'latencyAvg': self.latencyAvg,
+            'latencyMax': self.latencyMax,
+            'throughput': self.throughput
+        }
+
+
 class PinningMaster(Configurable):
     """
     The Local pinning orchestrator
 
-    Pins objects on request through an async queue
+    Pins objects on request through an async queue, processed
+    by a pool of workers. The number of objects pinned at the same
+    time is limited globally (workers) and per named queue.
     """
 
     def __init__(self, ctx, checkPinned=False, statusFilePath=None):
@@ -32,14 +341,19 @@ class PinningMaster(Configurable):
 
         self.lock = asyncio.Lock()
         self.sflock = asyncio.Lock()
-        self._ordersQueue = asyncio.Queue(maxsize=self.cQueueSize)
+        self._ordersQueue = PinOrdersQueue(
+            maxsize=self.cQueueSize,
+            qsettings=self.queueSettings
+        )
 
         self._ctx = ctx
         self._pinStatus = {}
         self._processTask = None
         self._statusFilePath = statusFilePath
+        self._statusDirty = False
         self._checkPinned = checkPinned
         self._sCleanupLast = None
+        self._stats = PinningStats()
 
         database.HashmarkAdded.connectTo(self.onMarkAdded)
 
@@ -48,13 +362,29 @@ class PinningMaster(Configurable):
         return cObjectGet('lpOrchestrator')
 
     @property
-    def cMaxStalled(self):
-        return self.config.maxStalledMessages
+    def cStallTimeout(self):
+        return self.config.get('stallTimeout', 60)
+
+    @property
+    def cStatusEmitInterval(self):
+        return self.config.get('statusEmitInterval', 0.5)
 
     @property
     def cQueueSize(self):
         return self.config.queue.size
 
+    @property
+    def cWorkers(self):
+        return max(self.config.get('workers', 4), 1)
+
+    @property
+    def cStatusSaveInterval(self):
+        return self.config.get('statusSaveInterval', 5)
+
+    @property
+    def stats(self):
+        return self._stats
+
     @property
     def cPinnedExpires(self):
         return self.config.pinnedExpires
@@ -78,6 +408,16 @@ class PinningMaster(Configurable):
     def configApply(self, cfg):
         pass
 
+    def queueSettings(self, qname):
+        """
+        Return the (priority, maxWorkers) settings for a queue
+        """
+
+        queues = self.config.get('queues', {})
+        qcfg = queues.get(qname, queues.get('default', {}))
+
+        return qcfg.get('priority', 0), qcfg.get('maxWorkers', 0)
+
     async def onMarkAdded(self, hashmark):
         if hashmark.pin == hashmark.PIN_SINGLE:
             ensure(self.queue(hashmark.path, False, None, qname='hashmarks'))
@@ -172,6 +512,7 @@ class PinningMaster(Configurable):
                 'cancel': False
             }
 
+        self.statusChanged()
         self.ipfsCtx.pinNewItem.emit(path)
         await self._emitItemsCount()
         return self.pinStatus[qname][path]
@@ -189,6 +530,7 @@ class PinningMaster(Configurable):
                         item=self.pinStatus[qname][path]))
                     del self._pinStatus[qname][path]
                     self.ipfsCtx.pinItemRemoved.emit(qname, path)
+                    self.statusChanged()
 
         await self._emitItemsCount()
 
@@ -211,42 +553,39 @@ class PinningMaster(Configurable):
 
         pItem = await self.pathRegister(qname, path, recursive)
 
-        await self.saveStatus()
+        tracker = PinProgressTracker(
+            stallTimeout=self.cStallTimeout,
+            emitInterval=self.cStatusEmitInterval
+        )
+        stream = None
 
         try:
-            stalledCn = 0
-            lastPTime = None
+            stream = op.client.pin.add(
+                await op.objectPathMapper(path), recursive=recursive)
 
-            async for pinned in op.client.pin.add(
-                    await op.objectPathMapper(path), recursive=recursive):
-                await asyncio.sleep(0)
-
-                now = time.time()
+            while True:
+                try:
+                    pinned = await tracker.next(stream)
+                except StopAsyncIteration:
+                    break
 
                 if pItem['cancel'] is True:
                     raise Cancelled()
 
-                pins = pinned.get('Pins', None)
-                progress = pinned.get('Progress', None)
+                pItem['status'] = pinned
 
-                if progress:
-                    lastPTime = now
-                    self.debug('Progress {0}: {1}'.format(path, progress))
-
-                if pinned != pItem['status']:
-                    pItem['status'] = pinned
+                if tracker.update(pinned):
+                    self.debug('Progress {0}: {1}'.format(
+                        path, tracker.progress))
                     self.ipfsCtx.pinItemStatusChanged.emit(qname, path, pItem)
 
-                if pins is None and progress is None and not lastPTime:
-                    # Never received any progress status yet
-                    stalledCn += 1
-
-                if stalledCn >= self.cMaxStalled:
-                    self.debug('{0}: stalled (removing)'.format(path))
-                    await self.pathDelete(path)
-                    return (path, 2, 'Stalled')
-
-                await asyncio.sleep(1)
+            if tracker.flush():
+                self.ipfsCtx.pinItemStatusChanged.emit(qname, path, pItem)
+        except asyncio.TimeoutError:
+            self.debug('{0}: stalled for {1} seconds (removing)'.format(
+                path, tracker.stallTimeout))
+            await self.pathDelete(path)
+            return (path, 2, 'Stalled')
         except aioipfs.APIError as err:
             self.debug('Pinning error {path}: {msg}'.format(
                 path=path, msg=err.message))
@@ -274,15 +613,27 @@ class PinningMaster(Configurable):
                 pItem['ts_pinned'] = now
                 self.ipfsCtx.pinFinished.emit(path)
 
-            await self.saveStatus()
+            self.statusChanged()
 
             await self._emitItemsCount()
 
             return (path, 0, 'OK')
+        finally:
+            if stream is not None:
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
 
     async def queue(self, path, recursive, onSuccess, qname='default'):
         """ Queue an item for processing """
-        await self.ordersQueue.put((qname, path, recursive, onSuccess))
+        if await self.ordersQueue.put(
+                PinOrder(qname, path, recursive, onSuccess)):
+            self.stats.queued += 1
+            self.statusChanged()
+        else:
+            self.debug(f'{path}: already queued, merged with ({qname})')
+
         self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
 
     async def start(self):
@@ -293,6 +644,8 @@ class PinningMaster(Configurable):
         if self._processTask:
             await self._processTask.close()
 
+        self.debug(f'Stats: {self.stats.asDict()}')
+
         await self.saveStatus()
 
     def restoreStatus(self, data):
@@ -309,16 +662,100 @@ class PinningMaster(Configurable):
                         path=path, recursive=recursive))
                     ensure(self.queue(path, recursive, None, qname=qname))
 
+    def statusChanged(self):
+        self._statusDirty = True
+
     async def saveStatus(self):
+        """
+        Save the pinning status (items being pinned and waiting
+        orders) to the status file
+        """
+
         async with self.sflock:
+            self._statusDirty = False
+
+            status = await self.status()
+
+            for order in self.ordersQueue.pending():
+                status.setdefault(order.qname, []).append({
+                    'path': order.path,
+                    'recursive': order.recursive,
+                    'pinned': False,
+                    'ts_queued': None,
+                    'progress': None
+                })
+
             async with aiofiles.open(self._statusFilePath, 'w+b') as fd:
-                await fd.write(orjson.dumps(await self.status()))
+                await fd.write(orjson.dumps(status))
+
+    async def statusSaver(self):
+        """
+        Periodically save the pinning status (if it has changed)
+        """
+
+        while True:
+            await asyncio.sleep(self.cStatusSaveInterval)
+
+            await self.cleanupStatus()
+
+            if self._statusDirty:
+                try:
+                    await self.saveStatus()
+                except Exception as err:
+                    self.debug(f'Could not save status: {err}')
 
     async def cancel(self, qname, path):
+        if self.ordersQueue.remove(qname, path):
+            self.statusChanged()
+            self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
+            return
+
         status = await self.statusFromPath(path, qname=qname)
         if status:
             status['cancel'] = True
-            await self.saveStatus()
+            self.statusChanged()
+
+    async def worker(self, wid: int):
+        while True:
+            order = await self.ordersQueue.get()
+
+            self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
+
+            try:
+                await self.processOrder(wid, order)
+            except asyncio.CancelledError:
+                # Keep the order so that it's saved with the status
+                self.ordersQueue.release(order, requeue=True)
+                raise
+            except Exception as err:
+                self.debug(f'Worker {wid}: {order.path}: error: {err}')
+                self.stats.orderDone(False)
+
+            self.ordersQueue.release(order)
+
+    async def processOrder(self, wid: int, order: PinOrder):
+        if await self.pathRegistered(order.path):
+            self.debug(f'{order.path}: already being pinned')
+            return
+
+        self.stats.orderStarted(order)
+
+        f = asyncio.ensure_future(
+            self.pin(order.path, recursive=order.recursive,
+                     qname=order.qname))
+
+        for callback in order.callbacks:
+            f.add_done_callback(callback)
+
+        try:
+            # Shielded, so that cancelling the worker always
+            # raises CancelledError here
+            path, code, msg = await asyncio.shield(f)
+        except asyncio.CancelledError:
+            f.cancel()
+            raise
+
+        self.stats.orderDone(code == 0)
 
     async def process(self):
         if os.path.exists(self._statusFilePath):
@@ -332,30 +769,18 @@ class PinningMaster(Configurable):
                 if isinstance(data, dict):
                     self.restoreStatus(data)
 
-        try:
-            while True:
-                await self.cleanupStatus()
-
-                item = await self.ordersQueue.get()
-                if item is None:
-                    self.debug('null item in queue')
-                    continue
-
-                self.ipfsCtx.pinQueueSizeChanged.emit(self.ordersQueue.qsize())
-
-                try:
-                    qname, path, recursive, callback = item
+        tasks = [asyncio.ensure_future(self.worker(wid))
+                 for wid in range(self.cWorkers)]
+        tasks.append(asyncio.ensure_future(self.statusSaver()))
 
-                    if await self.pathRegistered(path):
-                        self.debug(f'{path}: already queued')
-                        continue
+        self.debug(f'Started {self.cWorkers} workers')
 
-                    f = asyncio.ensure_future(
-                        self.pin(path, recursive=recursive, qname=qname))
-                    if callback:
-                        f.add_done_callback(callback)
-                except Exception:
-                    self.debug('Invalid item in queue')
-                    continue
+        try:
+            await asyncio.gather(*tasks)
         except asyncio.CancelledError:
             self.debug('Task was cancelled')
+
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -36,6 +36,7 @@ from galacteek.core.ps import psSubscriber
 from galacteek.core.ps import gHub
 
 from galacteek.database.psmanager import psManagerForTopic
+from galacteek.database.psmanager import psRecordsWriter
 
 from galacteek.services import GService
 
@@ -60,12 +61,11 @@ class MsgSpy(object):
         self.msgRecord = msgRecord
 
     async def __aenter__(self):
-        entries = await self.psDbManager.searchMsgAttribute(
+        self.found = await self.psDbManager.msgAttributeSeen(
             self.msgType,
             self.attrName,
             self.value
         )
-        self.found = len(entries) > 0
 
         if self.found:
             raise MsgAttributeRecordError(
@@ -121,6 +121,11 @@ class PubsubService(Configurable, GService):
         self._ltServeStart = 0
         self._serveLifetime = serveLifetime  # in seconds
         self._metrics = metrics
+        self._workersCount = 0
+        self._processedCount = 0
+        self._processedBytes = 0
+        self._decodeErrorsCount = 0
+        self._ltProcessStart = 0
 
         GService.__init__(self, **kw)
         Configurable.__init__(self, applyNow=True)
@@ -194,6 +199,13 @@ class PubsubService(Configurable, GService):
         if cfg.filters.filterSelf.enabled and self._filterSelfLegacy:
             self.addMessageFilter(self.filterSelf)
 
+        wCfg = cParentGet('recordsWriter')
+        if wCfg:
+            psRecordsWriter.configure(
+                flushInterval=wCfg.flushInterval,
+                maxPending=wCfg.maxPending
+            )
+
     def debug(self, msg):
         logger.debug('PS[{0}]: {1}'.format(self.topic(), msg))
 
@@ -469,13 +481,55 @@ class JSONPubsubService(PubsubService):
             logger.debug('Could not decode JSON message data')
             return None
 
+    def msgSender(self, data):
+        return data['from'] if isinstance(
+            data['from'], str) else data['from'].decode()
+
+    def throughput(self):
+        """
+        Processing metrics (throughput is in messages per second
+        since the processing task started)
+        """
+
+        runtime = loopTime() - self._ltProcessStart \
+            if self._ltProcessStart else 0
+
+        return {
+            'workers': self._workersCount,
+            'processed': self._processedCount,
+            'processedBytes': self._processedBytes,
+            'decodeErrors': self._decodeErrorsCount,
+            'msgPerSec': (self._processedCount / runtime) if runtime > 0
+            else 0.0
+        }
+
     async def processMessages(self):
+        """
+        Dispatch the messages from inQueue to the processing workers.
+
+        Messages are dispatched by sender, so that messages from a
+        given peer are always processed in order by the same worker.
+        """
+
         try:
             asyncConv = getattr(self, 'asyncMsgDataToJson')
         except Exception:
             useAsyncConv = False
         else:
             useAsyncConv = asyncio.iscoroutinefunction(asyncConv)
+            asyncConv = asyncConv if useAsyncConv else None
+
+        cfg = self.config()
+        wCount = max(cfg.get('workers', 1), 1)
+
+        self._workersCount = wCount
+        self._ltProcessStart = loopTime()
+
+        queues = [asyncio.Queue(maxsize=64) for idx in range(wCount)]
+        workers = [
+            asyncio.ensure_future(self.processWorker(queue, asyncConv))
+            for queue in queues
+        ]
 
         try:
             while not self._shuttingDown:
@@ -484,54 +538,82 @@ class JSONPubsubService(PubsubService):
                 if data is None:
                     continue
 
-                async with self.throttler:
-                    if self._shuttingDown:
-                        return
-
-                    if useAsyncConv is True:
-                        msg = await asyncConv(data)
-                    else:
-                        msg = self.msgDataToJson(data)
-
-                    if msg is None:
-                        self.debug('Invalid JSON message')
-                        continue
-
-                    sender = data['from'] if isinstance(
-                        data['from'], str) else data['from'].decode()
-
-                    try:
-                        if self.hubPublish:
-                            gHub.publish(
-                                self.hubKey, (sender, self.topic(), msg))
-
-                        if self._metrics:
-                            rec = await self.psDbManager.recordMessage(
-                                sender,
-                                len(data['data']),
-                                seqNo=data['seqno']
-                            )
-                        else:
-                            rec = None
-
-                        await self.processJsonMessage(
-                            sender, msg,
-                            msgDbRecord=rec
-                        )
-                    except Exception as exc:
-                        self.debug(
-                            'processJsonMessage error: {}'.format(str(exc)))
-                        traceback.print_exc()
-                        await self.errorsQueue.put((msg, exc))
-                        self._errorsCount += 1
-
+                try:
+                    sender = self.msgSender(data)
+                except Exception:
                     self.inQueue.task_done()
+                    continue
 
+                await queues[hash(sender) % wCount].put((sender, data))
         except asyncio.CancelledError:
             self.debug('JSON process cancelled')
         except Exception as err:
             self.debug('JSON process exception: {}'.format(
                 str(err)))
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def processWorker(self, queue, asyncConv):
+        try:
+            while not self._shuttingDown:
+                sender, data = await queue.get()
+
+                try:
+                    async with self.throttler:
+                        if self._shuttingDown:
+                            return
+
+                        await self.processMessage(sender, data, asyncConv)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as err:
+                    # Keep the worker alive for the next messages
+                    self.debug('JSON process worker exception: {}'.format(
+                        str(err)))
+                finally:
+                    self.inQueue.task_done()
+        except asyncio.CancelledError:
+            pass
+
+    async def processMessage(self, sender, data, asyncConv=None):
+        if asyncConv:
+            msg = await asyncConv(data)
+        else:
+            msg = self.msgDataToJson(data)
+
+        if msg is None:
+            self.debug('Invalid JSON message')
+            self._decodeErrorsCount += 1
+            return
+
+        try:
+            if self.hubPublish:
+                gHub.publish(
+                    self.hubKey, (sender, self.topic(), msg))
+
+            if self._metrics:
+                rec = await self.psDbManager.recordMessage(
+                    sender,
+                    len(data['data']),
+                    seqNo=data['seqno']
+                )
+            else:
+                rec = None
+
+            await self.processJsonMessage(
+                sender, msg,
+                msgDbRecord=rec
+            )
+        except Exception as exc:
+            self.debug(
+                'processJsonMessage error: {}'.format(str(exc)))
+            traceback.print_exc()
+            await self.errorsQueue.put((msg, exc))
+            self._errorsCount += 1
+        else:
+            self._processedCount += 1
+            self._processedBytes += len(data['data'])
 
     async def processJsonMessage(self, sender, msg, msgDbRecord=None):
         """ Implement this method to process incoming JSON messages"""
@@ -673,11 +755,24 @@ class RSAEncryptedJSONPubsubService(JSONPubsubService):
         base = super().config()
         return configMerge(base, cParentGet('serviceTypes.rsaEncJson'))
 
+    envelopeType = 'rsa-aes256cbc'
+
     @ipfsOp
     async def asyncMsgDataToJson(self, ipfsop, msg):
         try:
-            dec = await ipfsop.rsaAgent.decrypt(
-                base64.b64decode(msg['data']))
+            data = msg['data']
+
+            if data.startswith(b'{'):
+                # Multi-recipient envelope (never starts with '{'
+                # for base64-encoded single-recipient messages)
+                envelope = orjson.loads(data)
+                assert envelope.get('envelope') == self.envelopeType
+
+                dec = await ipfsop.rsaAgent.decryptEnvelope(envelope)
+            else:
+                dec = await ipfsop.rsaAgent.decrypt(
+                    base64.b64decode(data))
+
             return orjson.loads(dec.decode())
         except Exception as err:
             logger.debug(f'Could not decode encrypted message: {err}')
@@ -694,6 +789,12 @@ class RSAEncryptedJSONPubsubService(JSONPubsubService):
 
     @ipfsOp
     async def send(self, ipfsop, msg):
+        eCfg = self.config().get('envelope')
+
+        if eCfg and eCfg.enabled:
+            return await self.sendEnvelopes(
+                ipfsop, msg, maxRecipients=eCfg.maxRecipients)
+
         async for peerId, piCtx, sessionKey, _topic in self.peersToSend():
             if await self.peerEncFilter(piCtx, msg) is True:
                 continue
@@ -705,23 +806,70 @@ class RSAEncryptedJSONPubsubService(JSONPubsubService):
             if not pubKey:
                 continue
 
-            enc = await ipfsop.rsaAgent.encrypt(
-                str(msg).encode(),
-                pubKey,
-                sessionKey=sessionKey,
-                cacheKey=True
+            await self.sendToPeer(ipfsop, msg, pubKey, sessionKey, topic)
+
+    async def sendToPeer(self, ipfsop, msg, pubKey, sessionKey, topic):
+        enc = await ipfsop.rsaAgent.encrypt(
+            str(msg).encode(),
+            pubKey,
+            sessionKey=sessionKey,
+            cacheKey=True
+        )
+
+        await ipfsop.sleep(0.05)
+
+        if enc:
+            await super().send(
+                base64.b64encode(enc).decode(),
+                topic=topic
             )
 
-            await ipfsop.sleep(0.05)
+        await ipfsop.sleep(0.05)
+
+    async def sendEnvelopes(self, ipfsop, msg, maxRecipients=32):
+        """
+        Encrypt the message once and publish it in multi-recipient
+        envelopes (one per topic and per batch of maxRecipients peers)
+
+        Peers for which peersToSend() gives a session key get their
+        own message, encrypted with that key.
+        """
+
+        byTopic = {}
+
+        async for peerId, piCtx, sessionKey, _topic in self.peersToSend():
+            if await self.peerEncFilter(piCtx, msg) is True:
+                continue
+
+            pubKey = await piCtx.defaultRsaPubKey()
+
+            if not pubKey:
+                continue
+
+            topic = _topic if _topic else self.topic()
+
+            if sessionKey:
+                await self.sendToPeer(ipfsop, msg, pubKey, sessionKey, topic)
+            else:
+                byTopic.setdefault(topic, []).append(pubKey)
+
+        data = str(msg).encode()
+
+        for topic, pubKeys in byTopic.items():
+            for idx in range(0, len(pubKeys), maxRecipients):
+                envelope = await ipfsop.rsaAgent.encryptEnvelope(
+                    data, pubKeys[idx:idx + maxRecipients])
+
+                if not envelope:
+                    continue
+
+                envelope['envelope'] = self.envelopeType
 
-            if enc:
                 await super().send(
-                    base64.b64encode(enc).decode(),
+                    orjson.dumps(envelope).decode(),
                     topic=topic
                 )
 
-            await ipfsop.sleep(0.05)
-
 
 class Curve25519JSONPubsubService(JSONPubsubService):
     encodingType = PS_ENCTYPE_CURVE25519
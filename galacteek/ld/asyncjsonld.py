@@ -19,10 +19,11 @@ import asyncio
 import copy
 import hashlib
 import json
+import orjson
 import re
 import sys
 import traceback
-from collections import deque, namedtuple
+from collections import OrderedDict, namedtuple
 from numbers import Integral, Real
 from pyld.__about__ import (__copyright__, __license__, __version__)
 
@@ -5891,26 +5892,89 @@ class ActiveContextCache(object):
     """
     An ActiveContextCache caches active contexts so they can be reused without
     the overhead of recomputing them.
+
+    Entries are keyed by content hashes of the active and local contexts
+    (the hash of an active context produced by the cache is computed once
+    and stored in the context itself). Cached active contexts are shared,
+    not copied: the processor never modifies an active context once it has
+    been processed (apart from its lazily computed inverse context, which
+    is not part of the hash).
     """
 
+    hashKey = '_ctxHash'
+
     def __init__(self, size=100):
-        self.order = deque()
-        self.cache = {}
+        self.cache = OrderedDict()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def resize(self, size):
         self.size = size
 
+        while len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.cache)
+
+    @staticmethod
+    def content_hash(obj):
+        try:
+            data = orjson.dumps(
+                obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            data = json.dumps(obj, sort_keys=True).encode()
+
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def active_hash(self, active_ctx):
+        key = active_ctx.get(self.hashKey)
+
+        if key is None:
+            key = self.content_hash({
+                k: v for k, v in active_ctx.items()
+                if k not in ('inverse', self.hashKey)
+            })
+            active_ctx[self.hashKey] = key
+
+        return key
+
     def get(self, active_ctx, local_ctx):
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        return self.cache.get(key1, {}).get(key2)
+        key = (self.active_hash(active_ctx), self.content_hash(local_ctx))
+        result = self.cache.get(key)
+
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.cache.move_to_end(key)
+        self.hits += 1
+        return result
 
     def set(self, active_ctx, local_ctx, result):
-        if len(self.order) == self.size:
-            entry = self.order.popleft()
-            del self.cache[entry['activeCtx']][entry['localCtx']]
-        key1 = json.dumps(active_ctx)
-        key2 = json.dumps(local_ctx)
-        self.order.append({'activeCtx': key1, 'localCtx': key2})
-        self.cache.setdefault(key1, {})[key2] = json.loads(json.dumps(result))
+        key = (self.active_hash(active_ctx), self.content_hash(local_ctx))
+
+        # The result will be used as an active context
+        self.active_hash(result)
+
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
+
+
+def active_context_cache_resize(size):
+    """
+    Change the size of the shared active contexts cache
+    """
+    if _cache.get('activeCtx') is not None and isinstance(size, int):
+        _cache['activeCtx'].resize(size)
 
 
 # Shared in-memory caches.
@@ -1,12 +1,17 @@
+import copy
 import orjson
 import asyncio
 import aioipfs
 
+from pathlib import Path
+
 from cachetools import cached
+from cachetools import LRUCache
 from cachetools import TTLCache
 
 from urllib.parse import urlparse
 
+from galacteek.config import cParentGet
 from galacteek.ipfs.cidhelpers import IPFSPath
 from galacteek.ipfs.cidhelpers import joinIpns
 from galacteek import log
@@ -19,6 +24,116 @@ async def keysList(client):
     return await client.key.list()
 
 
+class LDContextCacheStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.loaderCalls = 0
+        self.hitsMem = 0
+        self.hitsDisk = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def hits(self):
+        return self.hitsMem + self.hitsDisk
+
+    @property
+    def hitRatio(self):
+        return (self.hits / self.loaderCalls) if self.loaderCalls > 0 \
+            else 0.0
+
+    def asDict(self):
+        return {
+            'loaderCalls': self.loaderCalls,
+            'hits': self.hits,
+            'hitsMem': self.hitsMem,
+            'hitsDisk': self.hitsDisk,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'invalidations': self.invalidations
+        }
+
+
+class LDContextCache:
+    """
+    Cache for the JSON-LD context documents loaded by the IPFS
+    document loader
+
+    The first level maps context URLs to the parsed documents
+    (in memory), and is invalidated when the LD contexts change.
+    The second level stores the raw documents on disk (if
+    persist() was called), keyed by immutable /ipfs/ path.
+    """
+
+    def __init__(self, memMaxEntries=None):
+        cfg = cParentGet('contextsCache')
+
+        self._mem = LRUCache(
+            memMaxEntries if memMaxEntries else
+            cfg.get('memMaxEntries', 128) if cfg else 128
+        )
+        self._store = None
+        self.stats = LDContextCacheStats()
+
+    def persist(self, path: Path, diskMaxSize=None):
+        from galacteek.ipfs.ipfsops.objcache import IPFSObjectCache
+
+        cfg = cParentGet('contextsCache')
+
+        self._store = IPFSObjectCache(
+            path,
+            memMaxSize=1,
+            diskMaxSize=diskMaxSize if diskMaxSize else
+            cfg.get('diskMaxSize', 16777216) if cfg else 16777216
+        )
+
+    def get(self, url: str):
+        """
+        Return (a copy of) the cached context document for a URL
+        """
+
+        doc = self._mem.get(url)
+
+        if doc is not None:
+            self.stats.hitsMem += 1
+
+            # The JSON-LD processor modifies contexts in place
+            return copy.deepcopy(doc)
+
+    async def fetch(self, client, url: str, path: IPFSPath):
+        """
+        Return the context document at path, from the on-disk
+        store or from IPFS
+        """
+
+        key = self._store.cacheKey(path) if self._store else None
+        data = await self._store.get(key) if key else None
+
+        if data:
+            self.stats.hitsDisk += 1
+        else:
+            self.stats.misses += 1
+
+            data = await asyncio.wait_for(
+                client.cat(path.objPath), 10
+            )
+
+            if key:
+                await self._store.put(key, data)
+
+        obj = orjson.loads(data)
+        assert obj is not None
+
+        self._mem[url] = copy.deepcopy(obj)
+        return obj
+
+    def invalidate(self):
+        self._mem.clear()
+        self.stats.invalidations += 1
+
+
 async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
                                   ldSchemas,
                                   loop=None,
@@ -26,13 +141,27 @@ async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
     if loop is None:
         loop = asyncio.get_event_loop()
 
+    ctxCache = ldSchemas.ctxCache
+
     async def async_loader(client, url, options={}):
         """
         :param url: the URL to retrieve.
 
         :return: the RemoteDocument.
         """
+        ctxCache.stats.loaderCalls += 1
+
         try:
+            obj = ctxCache.get(url)
+
+            if obj is not None:
+                return {
+                    'contentType': 'application/ld+json',
+                    'document': obj,
+                    'documentUrl': url,
+                    'contextUrl': None
+                }
+
             o = urlparse(url)
             if o.scheme in ['ipschema', 'ips']:
                 ipsKey = o.netloc
@@ -63,12 +192,7 @@ async def aioipfs_document_loader(ipfsClient: aioipfs.AsyncIPFS,
                     raise Exception(f'Not a valid path: {url}')
 
             if path and path.valid:
-                data = await asyncio.wait_for(
-                    client.cat(path.objPath), 10
-                )
-
-                obj = orjson.loads(data.decode())
-                assert obj is not None
+                obj = await ctxCache.fetch(client, url, path)
 
                 return {
                     'contentType': 'application/ld+json',
@@ -2,6 +2,7 @@ from pathlib import Path
 
 from galacteek import log
 from galacteek import ensure
+from galacteek import AsyncSignal
 
 from galacteek.ipfs import ipfsOp
 from galacteek.ipfs.cidhelpers import IPFSPath
@@ -9,6 +10,9 @@ from galacteek.ipfs.cidhelpers import IPFSPath
 from galacteek.core import pkgResourcesRscFilename
 from galacteek.core import pkgResourcesListDir
 from galacteek.core.fswatcher import FileWatcher
+from galacteek.config import cParentGet
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld.ldloader import LDContextCache
 
 
 class LDSchemasImporter:
@@ -22,6 +26,16 @@ class LDSchemasImporter:
         # NS <=> IPFS paths mapping
         self._nsMappings = {}
 
+        # Context documents cache (used by the JSON-LD document loader)
+        self.ctxCache = LDContextCache()
+
+        # Emitted with the new contexts version when the contexts change
+        self.contextsVersion = ''
+        self.sContextsChanged = AsyncSignal(str)
+
+        jsonld.active_context_cache_resize(
+            cParentGet('activeContextCache.size'))
+
     @ipfsOp
     async def nsToIpfs(self, ipfsop, ns) -> IPFSPath:
         path = self._nsMappings.get(ns, None)
@@ -37,8 +51,23 @@ class LDSchemasImporter:
             )
 
             self._nsMappings[ns] = IPFSPath(cid)
+            self.contextsVersionUpdate()
             return self._nsMappings[ns]
 
+    def contextsVersionUpdate(self):
+        """
+        The contexts version identifies the imported contexts
+        (namespaces and CIDs of the contexts directories)
+        """
+
+        version = ','.join(sorted(
+            f'{ns}:{path}' for ns, path in self._nsMappings.items()
+        ))
+
+        if version != self.contextsVersion:
+            self.contextsVersion = version
+            ensure(self.sContextsChanged.emit(version))
+
     def discover(self):
         # TODO: move to config.yaml
         pkgList = [
@@ -117,4 +146,9 @@ class LDSchemasImporter:
             return entry['Hash']
 
     def onLdContextsChanged(self, path):
-        pass
+        log.debug(f'LD contexts changed ({path}), invalidating cache')
+
+        # The contexts will be imported again on the next lookup
+        self._nsMappings.clear()
+        self.ctxCache.invalidate()
+        self.contextsVersionUpdate()
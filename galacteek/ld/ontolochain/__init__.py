@@ -5,9 +5,21 @@ from galacteek.ipfs import ipfsOpFn
 from galacteek.core import utcDatetimeIso
 from galacteek.ld import gLdDefaultContext
 from galacteek.ld.sparql import select, where, T
+from galacteek.ld.sparql.registry import queryRegistry
 from galacteek import log
 
 
+queryRegistry.register(
+    'ontolochain.byUri',
+    '''
+    SELECT ?chainUri
+    WHERE {
+        ?chainUri a gs:OntoloChain .
+    }
+    '''
+)
+
+
 class OntoloChain(Resource):
     def qgenAllGeoEmitters(self):
         return select(
@@ -57,15 +69,10 @@ def didMainChainUri(ipid):
 
 async def selectByUri(graph, chainUri):
     async with graph.lock:
-        return list(await graph.queryAsync(
-            '''
-                PREFIX gs: <ips://galacteek.ld/>
-                SELECT ?chainUri
-                WHERE {
-                    ?chainUri a gs:OntoloChain .
-                }
-                ''',
-            initBindings={
+        return list(await queryRegistry.run(
+            graph,
+            'ontolochain.byUri',
+            bindings={
                 'chainUri': chainUri
             }
         ))
@@ -1,6 +1,7 @@
 import orjson
 import asyncio
 import io
+import itertools
 from pathlib import Path
 
 from rdflib import RDF
@@ -17,6 +18,7 @@ from galacteek.core import runningApp
 from galacteek.core.asynclib import asyncWriteFile
 from galacteek.ld import asyncjsonld as jsonld
 from galacteek.ld import gLdDefaultContext
+from galacteek.ld.rdf.querycache import GraphQueryCache
 
 
 # Default NS bindings used by BaseGraph
@@ -47,6 +49,99 @@ def purgeBlank(graph: Graph):
     return cn
 
 
+# Number of triples added to a graph in one go by graphTransfer()
+tripleBatchSize = 2048
+
+
+def graphContext(graph: Graph) -> Graph:
+    # Where triples are added when calling add() on the graph
+    if isinstance(graph, ConjunctiveGraph):
+        return graph.default_context
+
+    return graph
+
+
+def graphAddBatch(dst: Graph, ctx: Graph, triples, batchSize: int) -> int:
+    batch = list(itertools.islice(triples, batchSize))
+
+    if batch:
+        dst.addN((s, p, o, ctx) for s, p, o in batch)
+
+    return len(batch)
+
+
+async def graphTransfer(src, dst: Graph,
+                        batchSize: int = tripleBatchSize) -> int:
+    """
+    Add the triples of src (a graph or an iterable of triples) to
+    the dst graph, in batches, in the application's executor.
+
+    Returns the number of triples transferred
+    """
+
+    app = runningApp()
+    loop = asyncio.get_event_loop()
+    ctx = graphContext(dst)
+    triples = iter(src)
+    count = 0
+
+    while True:
+        added = await loop.run_in_executor(
+            app.executor if app else None,
+            graphAddBatch, dst, ctx, triples, batchSize
+        )
+
+        if added == 0:
+            break
+
+        count += added
+
+    return count
+
+
+class GraphVersioned(object):
+    """
+    Keeps a version counter, incremented on every change made through
+    the graph. The counter is kept on the store, so that all the graphs
+    sharing a store (e.g a conjunctive graph and its subgraphs) see
+    changes made through any of them.
+    """
+
+    @property
+    def gVersion(self) -> int:
+        return getattr(self.store, '_gVersion', 0)
+
+    def gVersionBump(self):
+        self.store._gVersion = self.gVersion + 1
+
+    def add(self, triple):
+        result = super().add(triple)
+        self.gVersionBump()
+        return result
+
+    def addN(self, quads):
+        result = super().addN(quads)
+        self.gVersionBump()
+        return result
+
+    def remove(self, triple):
+        result = super().remove(triple)
+        self.gVersionBump()
+        return result
+
+    def parse(self, *args, **kw):
+        try:
+            return super().parse(*args, **kw)
+        finally:
+            self.gVersionBump()
+
+    def update(self, *args, **kw):
+        try:
+            return super().update(*args, **kw)
+        finally:
+            self.gVersionBump()
+
+
 class Common(object):
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
@@ -94,15 +189,57 @@ class Common(object):
         return await self.loop.run_in_executor(
             None, self._serial, 'pretty-xml')
 
-    async def queryAsync(self, query, initBindings=None):
+    @property
+    def queryCache(self) -> GraphQueryCache:
+        if getattr(self, '_queryCache', None) is None:
+            self._queryCache = GraphQueryCache()
+
+        return self._queryCache
+
+    def queryCacheStats(self) -> dict:
+        stats = self.queryCache.stats.asDict()
+        stats['entries'] = len(self.queryCache)
+        stats['memUsed'] = self.queryCache.memUsed
+        return stats
+
+    async def queryAsync(self, query, initBindings=None, cache=True):
         def runQuery(q, bindings):
-            return self.query(q, initBindings=bindings)
+            result = self.query(q, initBindings=bindings)
 
-        return await self.loop.run_in_executor(
+            if result.type == 'SELECT':
+                # Materialize the rows so that the result
+                # can be iterated more than once
+                result.bindings
+
+            return result
+
+        qcache = self.queryCache
+        version = self.gVersion
+        key = qcache.cacheKey(query, initBindings) if \
+            cache and qcache.enabled else None
+
+        if key is not None:
+            result = qcache.get(key, version)
+            if result is not None:
+                return result
+
+        result = await self.loop.run_in_executor(
             runningApp().executor,
             runQuery, query, initBindings
         )
 
+        if key is not None and result.type in ['SELECT', 'ASK']:
+            # CONSTRUCT/DESCRIBE results are graphs, not cached
+            qcache.put(key, result, version)
+
+        return result
+
+    async def pullGraph(self, graph: Graph) -> int:
+        """
+        Add all the triples of a graph to this graph
+        """
+        return await graphTransfer(graph, self)
+
     @ipfsOp
     async def pullObject(self, ipfsop, doc: dict):
         try:
@@ -112,11 +249,44 @@ class Common(object):
             async with ipfsop.ldOps() as ld:
                 graph = await ld.rdfify(doc)
 
-            # Could be optimized using another rdflib method
-            self.parse(await graph.ttlize(), format='ttl')
+            await self.pullGraph(graph)
         except Exception as err:
             log.debug(f'Error pulling object {doc}: {err}')
 
+    @ipfsOp
+    async def pullObjects(self, ipfsop, docs: list,
+                          concurrency: int = 8) -> int:
+        """
+        Bulk ingest: convert a list of JSON-LD documents to RDF
+        (concurrently) and add all the resulting triples to this
+        graph in batches.
+
+        Returns the number of documents successfully converted
+        """
+
+        sem = asyncio.Semaphore(concurrency)
+
+        async def rdfify(ld, doc):
+            async with sem:
+                try:
+                    if '@context' not in doc:
+                        doc.update(gLdDefaultContext)
+
+                    return await ld.rdfify(doc)
+                except Exception as err:
+                    log.debug(f'Error converting object {doc}: {err}')
+
+        async with ipfsop.ldOps() as ld:
+            graphs = [g for g in await asyncio.gather(
+                *[rdfify(ld, doc) for doc in docs]) if g]
+
+        await graphTransfer(
+            itertools.chain.from_iterable(graphs),
+            self
+        )
+
+        return len(graphs)
+
     def replace(self, s, p, o):
         self.remove((s, p, None))
         self.add((s, p, o))
@@ -125,7 +295,7 @@ class Common(object):
         return list(self.subject_objects(RDF.type))
 
 
-class BaseGraph(Graph, Common):
+class BaseGraph(GraphVersioned, Graph, Common):
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
 
@@ -143,8 +313,7 @@ class BaseGraph(Graph, Common):
                 format='json-ld'
             )
 
-            # Could be optimized using another rdflib method
-            self.parse(await graph.ttlize())
+            await self.pullGraph(graph)
         except Exception as err:
             log.debug(f'Error pulling object {doc}: {err}')
 
@@ -153,6 +322,7 @@ class IGraph(BaseGraph):
     def __init__(self, store,
                  rPath: Path,
                  name: str = None,
+                 dbUri: str = None,
                  **kw):
         super(IGraph, self).__init__(store, **kw)
 
@@ -162,8 +332,9 @@ class IGraph(BaseGraph):
         self.xmlExportPath = self.exportsPath.joinpath('graph.xml')
 
         self.dbPath = str(self.rPath.joinpath('g_rdf.db'))
-        self.dbUri = Literal(f"sqlite:///{self.dbPath}")
+        self.dbUri = Literal(dbUri if dbUri else f"sqlite:///{self.dbPath}")
         self.cid = None
+        self.exportedVersion = None
 
         self.sCidChanged = AsyncSignal(str, str)
 
@@ -171,13 +342,22 @@ class IGraph(BaseGraph):
     def xmlExportUrl(self):
         return f'file:///{self.xmlExportPath}'
 
-    async def exportTtl(self):
+    async def exportTtl(self, force=False):
+        version = self.gVersion
+
+        if not force and version == self.exportedVersion:
+            # Unchanged since the last export
+            return False
+
         self.exportsPath.mkdir(parents=True, exist_ok=True)
         await asyncWriteFile(
             str(self.exportsPath.joinpath('export.ttl')),
             await self.ttlize()
         )
 
+        self.exportedVersion = version
+        return True
+
     async def exportXml(self):
         self.exportsPath.mkdir(parents=True, exist_ok=True)
         await asyncWriteFile(
@@ -208,5 +388,5 @@ class IGraph(BaseGraph):
             self.parse(obj, format=format)
 
 
-class IConjunctiveGraph(Common, ConjunctiveGraph):
+class IConjunctiveGraph(GraphVersioned, Common, ConjunctiveGraph):
     pass
@@ -11,6 +11,7 @@ from galacteek import log
 from galacteek import cached_property
 
 from galacteek.ipfs import ipfsOp
+from galacteek.ld.rdf import graphTransfer
 
 
 @attr.s(auto_attribs=True)
@@ -203,18 +204,43 @@ class GraphGuardian:
         (upgrade, trigger, ..).
 
         Trigger calls a coroutine.
+
+        Triples are added to the destination graph in batches
+        (off the event loop), pending triples being flushed before
+        running a trigger.
         """
 
         residue = []
+        pending = []
+        pendingKeys = set()
+        upgrades = set()
+
+        async def flush():
+            # Upgrades replace the existing values of (s, p)
+            for s, p in upgrades:
+                dst.remove((s, p, None))
+
+            await graphTransfer(pending, dst)
+
+            upgrades.clear()
+            pending.clear()
+            pendingKeys.clear()
 
         for s, p, o in graph:
             action = self.decide(dst, s, p, o)
 
             if action:
                 if action.do == 'upgrade':
-                    dst.remove((s, p, None))
+                    upgrades.add((s, p))
+
+                    if (s, p) in pendingKeys:
+                        # The last value wins
+                        pending[:] = [t for t in pending
+                                      if (t[0], t[1]) != (s, p)]
 
                 elif action.do == 'trigger':
+                    await flush()
+
                     try:
                         coro = getattr(action, action.call)
                         assert asyncio.iscoroutinefunction(coro)
@@ -229,18 +255,23 @@ class GraphGuardian:
                         traceback.print_exc()
                         continue
 
-            dst.add((s, p, o))
-            await asyncio.sleep(0.05)
+            pending.append((s, p, o))
+            pendingKeys.add((s, p))
+
+        await flush()
 
         return residue
 
     async def mergeReplace(self, graph: Graph, dst: Graph):
-        try:
-            for s, p, o in graph:
+        def removeObjects(triples):
+            for s, p, o in triples:
                 dst.remove((s, p, None))
-                await asyncio.sleep(0)
 
-            dst += graph
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, removeObjects, list(graph))
+
+            await graphTransfer(graph, dst)
         except Exception:
             log.debug('mergeReplace failure !')
             return False
@@ -0,0 +1,174 @@
+import re
+
+from cachetools import LRUCache
+
+from galacteek.config import cParentGet
+
+
+# Whitespace runs outside of quoted literals
+queryWsRe = re.compile(
+    r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+'
+)
+
+
+def queryNormalize(query) -> str:
+    """
+    Normalize a SPARQL query string for use as a cache key
+    (whitespace is collapsed, string literals are kept as is)
+    """
+
+    return queryWsRe.sub(
+        lambda m: m.group(1) if m.group(1) else ' ',
+        query
+    ).strip()
+
+
+def bindingsKey(bindings: dict):
+    if not bindings:
+        return None
+
+    return tuple(sorted(
+        ((str(k), v) for k, v in bindings.items()),
+        key=lambda b: b[0]
+    ))
+
+
+def resultSize(result) -> int:
+    """
+    Rough estimate of the memory used by a (materialized)
+    SPARQL query result
+    """
+
+    size = 64
+
+    if getattr(result, 'type', None) == 'SELECT':
+        for row in result.bindings:
+            size += 64 + sum(len(str(v)) for v in row.values())
+
+    return size
+
+
+class GraphQueryCacheStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @property
+    def hitRatio(self):
+        total = self.hits + self.misses
+        return (self.hits / total) if total > 0 else 0.0
+
+    def asDict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': self.hitRatio,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions
+        }
+
+
+class GraphQueryCache:
+    """
+    SPARQL query results cache for a graph
+
+    Entries are keyed by (normalized query, bindings) and are only
+    valid for the graph version they were computed from: as soon as
+    the graph's version changes, the whole cache is dropped.
+
+    The cache is bounded by the number of entries and by the
+    (estimated) memory used by the results.
+    """
+
+    def __init__(self, maxEntries=None, maxMemory=None):
+        cfg = self.cQueryCache
+
+        self.maxEntries = maxEntries if maxEntries else \
+            cfg.get('maxEntries', 256) if cfg else 256
+        self.maxMemory = maxMemory if maxMemory else \
+            cfg.get('maxMemory', 8388608) if cfg else 8388608
+
+        self._enabled = cfg.get('enabled', True) if cfg else True
+
+        self.stats = GraphQueryCacheStats()
+        self._version = None
+        self._cache = LRUCache(self.maxMemory, getsizeof=lambda e: e[1])
+
+    @property
+    def cQueryCache(self):
+        return cParentGet('queryCache')
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @property
+    def memUsed(self):
+        return self._cache.currsize
+
+    def __len__(self):
+        return len(self._cache)
+
+    def cacheKey(self, query, bindings=None):
+        if isinstance(query, str):
+            qkey = queryNormalize(query)
+        else:
+            # Prepared query (hashed by identity)
+            qkey = query
+
+        try:
+            key = (qkey, bindingsKey(bindings))
+            hash(key)
+            return key
+        except TypeError:
+            return None
+
+    def sync(self, version: int):
+        if version != self._version:
+            if len(self._cache) > 0:
+                self.stats.invalidations += 1
+                self._cache.clear()
+
+            self._version = version
+
+    def get(self, key, version: int):
+        self.sync(version)
+
+        entry = self._cache.get(key)
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        return entry[0]
+
+    def put(self, key, result, version: int, size: int = None):
+        if version != self._version:
+            # Graph changed while the query was running
+            return False
+
+        entry = (result, size if size else resultSize(result))
+        count = len(self._cache) + (0 if key in self._cache else 1)
+
+        try:
+            self._cache[key] = entry
+        except ValueError:
+            # Too large
+            return False
+
+        while len(self._cache) > self.maxEntries:
+            self._cache.popitem()
+
+        self.stats.evictions += count - len(self._cache)
+
+        return True
+
+    def clear(self):
+        self._cache.clear()
+        self.stats.reset()
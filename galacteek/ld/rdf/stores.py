@@ -0,0 +1,99 @@
+from pathlib import Path
+
+from rdflib import plugin
+from rdflib.store import Store
+from rdflib.plugin import PluginException
+
+from galacteek import log
+
+
+class StoreBackendError(Exception):
+    pass
+
+
+# Store backends that can be selected for a graph in the pronto
+# service's config (graph 'store.backend' setting)
+#
+# sqlalchemy: SQLite database (or any SQLAlchemy URI set with 'dbUri'),
+#             with an index on every statement column
+# berkeleydb: BerkeleyDB environment, with SPO/POS/OSP indexes
+# memory:     non-persistent
+
+storeBackends = {
+    'sqlalchemy': ['SQLAlchemy'],
+    'berkeleydb': ['BerkeleyDB', 'Sleepycat'],
+    'memory': ['Memory', 'IOMemory']
+}
+
+defaultStoreBackend = 'sqlalchemy'
+
+
+def storeBackendName(cfg) -> str:
+    try:
+        backend = cfg.get('store', {}).get('backend', defaultStoreBackend)
+    except Exception:
+        backend = defaultStoreBackend
+
+    return backend.lower() if isinstance(backend, str) else \
+        defaultStoreBackend
+
+
+def graphStore(backend: str, identifier) -> Store:
+    """
+    Instantiate an rdflib store for the given backend name
+    """
+
+    names = storeBackends.get(backend)
+
+    if not names:
+        raise StoreBackendError(f'Unknown store backend: {backend}')
+
+    for name in names:
+        try:
+            return plugin.get(name, Store)(identifier=identifier)
+        except PluginException:
+            continue
+
+    raise StoreBackendError(f'Store backend {backend} is not available')
+
+
+def graphStoreUri(backend: str, rootPath: Path, cfg=None):
+    """
+    Return the configuration string used to open a store of the
+    given backend, with its data in rootPath (None for
+    non-persistent stores)
+    """
+
+    if backend == 'sqlalchemy':
+        try:
+            dbUri = cfg.get('store', {}).get('dbUri')
+        except Exception:
+            dbUri = None
+
+        return dbUri if dbUri else \
+            'sqlite:///{}'.format(str(rootPath.joinpath('g_rdf.db')))
+    elif backend == 'berkeleydb':
+        path = rootPath.joinpath('g_bdb')
+        path.mkdir(parents=True, exist_ok=True)
+        return str(path)
+
+
+def graphStoreFromConfig(cfg, identifier, rootPath: Path):
+    """
+    Create the store configured for a graph, falling back to the
+    default backend if the configured one is not available.
+
+    Returns a (store, backend, openUri) tuple
+    """
+
+    backend = storeBackendName(cfg)
+
+    try:
+        store = graphStore(backend, identifier)
+    except StoreBackendError as err:
+        log.warning(f'{identifier}: {err}, using {defaultStoreBackend}')
+
+        backend = defaultStoreBackend
+        store = graphStore(backend, identifier)
+
+    return store, backend, graphStoreUri(backend, rootPath, cfg)
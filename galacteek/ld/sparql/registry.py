@@ -0,0 +1,100 @@
+from cachetools import LRUCache
+
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query
+
+from galacteek import log
+
+
+# Prefixes available to all registered queries
+defaultNs = {
+    'gs': 'ips://galacteek.ld/',
+    'dc': 'http://purl.org/dc/terms/',
+    'schema': 'https://schema.org/',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'sec': 'https://w3id.org/security#',
+    'didv': 'https://w3id.org/did#'
+}
+
+
+class PreparedQueryRegistry:
+    """
+    Registry of prepared SPARQL queries
+
+    Named queries are registered once (parsed and translated to
+    the SPARQL algebra with prepareQuery()), and then executed
+    with bindings only.
+
+    Ad-hoc query strings (e.g coming from the P2P SparQL endpoint)
+    are prepared on demand and kept in an LRU cache.
+    """
+
+    def __init__(self, adhocMaxSize=128):
+        self._queries = {}
+        self._sources = {}
+        self._adhoc = LRUCache(adhocMaxSize)
+
+    def __contains__(self, name):
+        return name in self._queries
+
+    def register(self, name: str, query: str, initNs: dict = None) -> Query:
+        """
+        Register a named query (registering the same query twice
+        does not parse it again)
+        """
+
+        if self._sources.get(name) == query and name in self._queries:
+            return self._queries[name]
+
+        ns = defaultNs.copy()
+        if initNs:
+            ns.update(initNs)
+
+        prepared = prepareQuery(query, initNs=ns)
+
+        self._queries[name] = prepared
+        self._sources[name] = query
+
+        log.debug(f'SparQL registry: registered query {name}')
+        return prepared
+
+    def get(self, name: str) -> Query:
+        return self._queries.get(name)
+
+    def prepare(self, query: str) -> Query:
+        """
+        Return the prepared query for an ad-hoc query string.
+        Raises an exception if the query can't be parsed.
+        """
+
+        prepared = self._adhoc.get(query)
+
+        if prepared is None:
+            prepared = prepareQuery(query, initNs=defaultNs)
+            self._adhoc[query] = prepared
+
+        return prepared
+
+    async def run(self, graph, name: str, bindings: dict = None):
+        """
+        Run a named query on a graph (asynchronously)
+        """
+
+        prepared = self.get(name)
+
+        if prepared is None:
+            raise ValueError(f'Unknown query: {name}')
+
+        return await graph.queryAsync(prepared, initBindings=bindings)
+
+    def runSync(self, graph, name: str, bindings: dict = None):
+        prepared = self.get(name)
+
+        if prepared is None:
+            raise ValueError(f'Unknown query: {name}')
+
+        return graph.query(prepared, initBindings=bindings)
+
+
+queryRegistry = PreparedQueryRegistry()
@@ -20,10 +20,9 @@ from galacteek.ipfs.p2pservices import smartql as p2psmartql
 from galacteek.ld.rdf import IGraph
 from galacteek.ld.rdf import IConjunctiveGraph
 from galacteek.ld.rdf.guardian import GraphGuardian
+from galacteek.ld.rdf.stores import graphStoreFromConfig
 
-from rdflib import plugin
 from rdflib import URIRef
-from rdflib.store import Store
 
 from galacteek.ld.rdf.sync import *
 
@@ -104,20 +103,24 @@ class RDFStoresService(GService):
         await self.initializeGraphs()
 
     async def registerRegularGraph(self, uri, cfg):
-        self.store = plugin.get("SQLAlchemy", Store)(
-            identifier=self.rdfIdent
-        )
-
         rootPath = self.storesPath.joinpath(f'igraph_{cfg.name}')
         rootPath.mkdir(parents=True, exist_ok=True)
 
+        self.store, backend, storeUri = graphStoreFromConfig(
+            cfg, self.rdfIdent, rootPath)
+
         graph = IGraph(
             self.store,
             rootPath,
             name=cfg.name,
+            dbUri=storeUri,
             identifier=uri
         )
-        graph.open(graph.dbUri, create=True)
+
+        if storeUri:
+            graph.open(graph.dbUri, create=True)
+
+        log.debug(f'Graph {uri}: using store backend {backend}')
 
         # XXX: NS bind
         graph.iNsBind()
@@ -129,18 +132,21 @@ class RDFStoresService(GService):
         self._graphs[cfg.name] = graph
 
     async def registerConjunctive(self, uri, cfg):
-        store = plugin.get("SQLAlchemy", Store)(
-            identifier=uri
-        )
-
         rootPath = self.storesPath.joinpath(f'ipcg_{cfg.name}')
         rootPath.mkdir(parents=True, exist_ok=True)
         dbPath = rootPath.joinpath('g_rdf.db')
 
+        store, backend, storeUri = graphStoreFromConfig(cfg, uri, rootPath)
+
         cgraph = IConjunctiveGraph(store=store, identifier=uri)
-        cgraph.open('sqlite:///{}'.format(str(dbPath)), create=True)
+
+        if storeUri:
+            cgraph.open(storeUri, create=True)
+
         cgraph.iNsBind()
 
+        log.debug(f'Graph {uri}: using store backend {backend}')
+
         subgraphs = cfg.get('subgraphs', {})
 
         for guri, gcfg in subgraphs.items():
@@ -298,10 +304,6 @@ class RDFStoresService(GService):
             if not objGraph:
                 return False
 
-            ttl = io.BytesIO()
-            objGraph.serialize(ttl, 'ttl')
-            ttl.seek(0, 0)
-
             for uri in dst:
                 destGraph = self.graphByUri(uri)
 
@@ -332,14 +334,18 @@ class RDFStoresService(GService):
 
     async def gQuery(self, query, initBindings=None):
         try:
-            return await self.app.loop.run_in_executor(
-                None,
-                self.graphG.query,
-                query
+            return await self.graphG.queryAsync(
+                query,
+                initBindings=initBindings
             )
         except Exception as err:
-            print('query error', str(err))
-            pass
+            log.debug(f'gQuery error: {err}')
+
+    def queryCacheStats(self) -> dict:
+        return {
+            name: graph.queryCacheStats()
+            for name, graph in self._graphs.items()
+        }
 
     async def onGraphCidChanged(self, name, cid):
         return
@@ -426,6 +432,7 @@ class RDFStoresService(GService):
         while not self.should_stop:
             await asyncio.sleep(60 * 10)
 
+            # Only re-exported if the graph has changed
             await self.graphHistory.exportTtl()
 
 
@@ -16,6 +16,36 @@ from galacteek.ipfs.pubsub.messages.ld import SparQLHeartbeatMessage
 from galacteek.ld import gLdDefaultContext
 from galacteek.ld import ontolochain
 from galacteek.ld.sparql.aioclient import Sparkie
+from galacteek.ld.sparql.registry import queryRegistry
+
+
+queryRegistry.register(
+    'history.trustTokenForDid',
+    '''
+    PREFIX trustToken: <ips://galacteek.ld/OntoloTrustToken#>
+    SELECT ?uri
+    WHERE {
+        ?uri a gs:OntoloTrustToken ;
+          trustToken:holder ?did .
+    }
+    LIMIT 1
+    '''
+)
+
+queryRegistry.register(
+    'history.chainLastRecord',
+    '''
+    SELECT ?uri ?date ?objNum
+    WHERE {
+        ?uri a gs:OntoloChainRecord ;
+          gs:dateCreated ?date ;
+          gs:objectNumber ?objNum ;
+          gs:ontoloChain ?chainUri .
+    }
+    ORDER BY DESC(?date)
+    LIMIT 1
+    '''
+)
 
 
 class GraphHistorySynchronizer:
@@ -127,18 +157,10 @@ class GraphingHistoryService(GService):
         await self.hGraph.pullObject(doc)
 
     async def trustTokenForDid(self, did: str):
-        tokens = list(await self.mainGraph.queryAsync(
-            '''
-            PREFIX gs: <ips://galacteek.ld/>
-            PREFIX trustToken: <ips://galacteek.ld/OntoloTrustToken#>
-            SELECT ?uri
-            WHERE {
-                ?uri a gs:OntoloTrustToken ;
-                  trustToken:holder ?did .
-            }
-            LIMIT 1
-            ''',
-            initBindings={'did': did}
+        tokens = list(await queryRegistry.run(
+            self.mainGraph,
+            'history.trustTokenForDid',
+            bindings={'did': did}
         ))
         if tokens:
             return tokens.pop(0)[0]
@@ -188,20 +210,10 @@ class GraphingHistoryService(GService):
             await self.ontoloChainCreate(
                 ipid, chainId, ipfsCtx.node.id)
 
-        lastObjs = list(await dstGraph.queryAsync(
-            '''
-            PREFIX gs: <ips://galacteek.ld/>
-            SELECT ?uri ?date ?objNum
-            WHERE {
-                ?uri a gs:OntoloChainRecord ;
-                  gs:dateCreated ?date ;
-                  gs:objectNumber ?objNum ;
-                  gs:ontoloChain ?chainUri .
-            }
-            ORDER BY DESC(?date)
-            LIMIT 1
-            ''',
-            initBindings={'chainUri': chainId}
+        lastObjs = list(await queryRegistry.run(
+            dstGraph,
+            'history.chainLastRecord',
+            bindings={'chainUri': chainId}
         ))
 
         if not lastObjs:
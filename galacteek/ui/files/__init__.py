@@ -58,6 +58,7 @@ from galacteek.config import configModRegCallback
 
 from galacteek.core import modelhelpers
 from galacteek.core import datetimeIsoH
+from galacteek.core.asynclib import aclosing
 from galacteek.core.models.mfs import MFSItem
 from galacteek.core.models.mfs import MFSNameItem
 from galacteek.core.models.mfs import MFSTimeFrameItem
@@ -1461,8 +1462,13 @@ class FileManager(QWidget):
     async def mediaPlayerQueueDir(self, ipfsop, ipfsPath):
         objList = []
 
-        async for objPath, parent in ipfsop.walk(str(ipfsPath)):
-            objList.append(objPath)
+        walker = ipfsop.walk(
+            str(ipfsPath),
+            maxFiles=cGet('fileManager.mediaPlayerQueueMaxFiles'))
+
+        async with aclosing(walker):
+            async for objPath, parent in walker:
+                objList.append(objPath)
 
         if objList:
             self.app.mainWindow.mediaPlayerQueue(objList)
@@ -811,11 +811,9 @@ class IPFSHashExplorerWidget(QWidget):
         startLt = self.app.loop.time()
         stCount, stLt = None, None
 
-        _cp, dePath, deExists = self.app.multihashDb.pathDirEntries(
-            self.rootPath.objPath)
-
         # Load from local cache or do a streamed ls
-        if deExists:
+        if await self.app.multihashDb.hasDirEntries(
+                self.rootPath.objPath, complete=True):
             eGenerator = self.app.multihashDb.getDirEntries(
                 self.rootPath.objPath)
         else:
@@ -898,18 +896,17 @@ class IPFSHashExplorerWidget(QWidget):
 
         await ipfsop.ctx.pin(str(path), recursive=False)
 
-        _c, _de, deExists = self.app.multihashDb.pathDirEntries(
-            self.rootPath.objPath)
-
-        if not deExists:
+        if not await self.app.multihashDb.hasDirEntries(
+                self.rootPath.objPath, complete=True):
             await self.serializeEntries()
 
     async def serializeEntries(self):
         fEntries = self.model.formatEntries()
 
         if fEntries:
+            # Only called once the listing went through
             await self.app.multihashDb.writeDirEntries(
-                self.rootPath.objPath, fEntries
+                self.rootPath.objPath, fEntries, complete=True
             )
 
     @ipfsStatOp
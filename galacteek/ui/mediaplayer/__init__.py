@@ -43,6 +43,7 @@ from galacteek.ipfs.paths import posixIpfsPath
 
 from galacteek.core.ps import KeyListener
 from galacteek.core.ps import keyLdObjects
+from galacteek.core.asynclib import aclosing
 from galacteek.core.asynclib import asyncWriteFile
 
 from galacteek.core.models.sparql.playlists import *
@@ -788,9 +789,11 @@ class MediaPlayerTab(GalacteekTab, KeyListener):
 
         if self.clipboardMediaItem.mimeType.isDir:
             # Queue from directory
-            async for objPath, parent in ipfsop.walk(
-                    str(self.clipboardMediaItem.path)):
-                self.queueFromPath(objPath)
+            walker = ipfsop.walk(str(self.clipboardMediaItem.path))
+
+            async with aclosing(walker):
+                async for objPath, parent in walker:
+                    self.queueFromPath(objPath)
         else:
             self.queueFromPath(self.clipboardMediaItem.path)
 
@@ -982,8 +982,11 @@ class SeedsTrackerTab(GalacteekTab):
         try:
             self.ui.treeAllSeeds.setHeaderHidden(False)
 
+            # Full-text search on the index, the regexp is used if
+            # the text isn't a valid FTS query
             async for result in seedsDag.search(
-                    sRegexp, dateFrom=dateFrom, dateTo=dateTo):
+                    sRegexp, query=text,
+                    dateFrom=dateFrom, dateTo=dateTo):
                 section, name, date, dCid = result
 
                 try:
@@ -1011,7 +1014,7 @@ class SeedsTrackerTab(GalacteekTab):
                 ensure(self.findSeed(seedsDag, item, dCid))
 
                 self.ui.seedsSearch.setEnabled(True)
-                await ipfsop.sleep(0.1)
+                await ipfsop.sleep()
         except asyncio.CancelledError:
             pass
 
@@ -105,6 +105,94 @@ class TestDatabase:
 
         await database.closeOrm()
 
+    @pytest.mark.asyncio
+    async def test_hashmarks_search(self, dbpath):
+        await database.initOrm(dbpath)
+
+        await database.hashmarkAdd(
+            '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV',
+            title='Interplanetary music', description='Dweb radio',
+            category='music')
+        mark = await database.hashmarkAdd(
+            '/ipfs/Qma1TPVjdZ9CReqwyQ9Wvv3oRgRRi5FrEyWufenu92SuUV',
+            title='Radio stations', description='Music from the dweb')
+
+        if database.hashmarksFts['available']:
+            # Prefix matching, title matches rank first
+            res = await database.hashmarksFtsSearch('radi')
+            assert [m.title for m in res] == [
+                'Radio stations', 'Interplanetary music']
+
+            res = await database.hashmarksFtsSearch('mus',
+                                                    category='music')
+            assert [m.title for m in res] == ['Interplanetary music']
+
+            # The limit applies after the category filter
+            res = await database.hashmarksFtsSearch('radi', limit=1,
+                                                    category='music')
+            assert [m.title for m in res] == ['Interplanetary music']
+
+            mark.title = 'Streams'
+            await mark.save()
+            res = await database.hashmarksFtsSearch('stream')
+            assert res.pop().title == 'Streams'
+
+            await database.hashmarkDelete(mark.path)
+            assert await database.hashmarksFtsSearch('stream') == []
+
+        res = await database.hashmarksSearch('interplanetary')
+        assert res.pop().title == 'Interplanetary music'
+
+        await database.closeOrm()
+
+    @pytest.mark.asyncio
+    async def test_psrecords_writer(self, dbpath, monkeypatch):
+        from galacteek.database.psmanager import PSRecordsWriter
+        from galacteek.database.psmanager import psManagerForTopic
+
+        await database.initOrm(dbpath)
+
+        writer = PSRecordsWriter(flushInterval=60)
+        manager = await psManagerForTopic('galacteek.test')
+        channel = manager.channel
+
+        def record(idx):
+            return PubSubMsgRecord(channel=channel, sizeRaw=idx,
+                                   senderPeerId='peer', seqNo=bytes([idx]))
+
+        recs = [record(idx) for idx in range(3)]
+        for rec in recs:
+            writer.push(rec, channel)
+
+        # Persisting a pending record saves this record only
+        assert await writer.persist(recs[1]) is recs[1]
+        assert recs[1].pk is not None
+        assert writer.queueDepth == 2
+        assert not any(rec is recs[1] for rec in writer._pending)
+
+        await writer.flush()
+        assert await PubSubMsgRecord.filter(
+            channel_id=channel.id).count() == 3
+
+        # A failed flush requeues the records
+        async def bulkCreateFail(*args, **kw):
+            raise Exception('Database error')
+
+        with monkeypatch.context() as mp:
+            mp.setattr(PubSubMsgRecord, 'bulk_create', bulkCreateFail)
+
+            writer.push(record(3), channel)
+            await writer.flush()
+            assert writer.queueDepth == 1
+
+        await writer.flush()
+        assert writer.queueDepth == 0
+        assert await PubSubMsgRecord.filter(
+            channel_id=channel.id).count() == 4
+
+        await writer.stop()
+        await database.closeOrm()
+
     def test_iptags(self):
         assert iptags.ipTag('test') == '@Earth#test'
         assert iptags.ipTag('test', 'Mars') == '@Mars#test'
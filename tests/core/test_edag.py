@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from galacteek.ipfs.dag import EvolvingDAG
+from galacteek.ipfs.dag import shardsMarker
+from galacteek.ipfs.ipfsops import IPFSOpRegistry
+
+
+class MapDAG(EvolvingDAG):
+    async def initDag(self, ipfsop):
+        return {
+            'params': {},
+            'c': {
+                'items': {}
+            }
+        }
+
+
+class ShardedMapDAG(MapDAG):
+    shardedPaths = ['c/items']
+    shardMinKeys = 64
+
+
+async def saveLatency(edag, size: int, rounds=5):
+    if edag.dagMeta is None:
+        await edag.load()
+
+    async with edag as dag:
+        for idx in range(size):
+            dag.root['c']['items'][f'item{idx}'] = {
+                'name': f'Item {idx}',
+                'description': 'x' * 128
+            }
+
+    await edag.ipfsSave()
+
+    start = time.perf_counter()
+    for rnd in range(rounds):
+        # Small edit
+        edag.root['c']['items'][f'item{rnd}']['name'] = f'Renamed {rnd}'
+        assert await edag.ipfsSave() is True
+
+    return (time.perf_counter() - start) / rounds
+
+
+class SlowSaveDAG(MapDAG):
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.saves = 0
+        self.fail = False
+
+    async def ipfsSave(self):
+        await asyncio.sleep(0.3)
+        self.saves += 1
+        return not self.fail
+
+
+class TestEvolvingDAG:
+    @pytest.mark.asyncio
+    async def test_flush_inflight(self, event_loop):
+        edag = SlowSaveDAG('/edag_slowsave.json', saveInterval=0.1)
+
+        edag.onChanged()
+        await asyncio.sleep(0.2)
+
+        # The scheduled save is in progress, flush() waits for it
+        assert edag.saveDirty is False
+        await edag.flush()
+        assert edag.saves == 1
+
+        # Failed save, the changes stay pending
+        edag.fail = True
+        edag.onChanged()
+        await edag.flush()
+        assert edag.saves == 2
+        assert edag.saveDirty is True
+
+        edag.fail = False
+        await edag.flush()
+        assert edag.saves == 3
+        assert edag.saveDirty is False
+
+    @pytest.mark.asyncio
+    async def test_shards(self, event_loop, ipfsdaemon, ipfsop):
+        async for pct, msg in ipfsdaemon.start():
+            pass
+
+        await ipfsdaemon.proto.eventStarted.wait()
+        IPFSOpRegistry.regDefault(ipfsop)
+
+        edag = ShardedMapDAG('/edag_sharded.json', sharding=True)
+        await saveLatency(edag, 500, rounds=1)
+
+        stored = await ipfsop.dagGet(edag.dagCid)
+        assert shardsMarker in stored['c']['items']
+
+        # Reload from the metadata, the map should be rebuilt
+        edag2 = ShardedMapDAG('/edag_sharded.json')
+        await edag2.load()
+        assert len(edag2.root['c']['items']) == 500
+        assert edag2.root['c']['items']['item0']['name'] == 'Renamed 0'
+
+        await ipfsop.client.close()
+        ipfsdaemon.stop()
+        await asyncio.wait([ipfsdaemon.exitFuture])
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.environ.get('GALACTEEK_BENCHMARK'),
+                        reason='Set GALACTEEK_BENCHMARK to run benchmarks')
+    async def test_benchmark(self, event_loop, ipfsdaemon, ipfsop):
+        async for pct, msg in ipfsdaemon.start():
+            pass
+
+        await ipfsdaemon.proto.eventStarted.wait()
+        IPFSOpRegistry.regDefault(ipfsop)
+
+        # Save latency after a small edit vs DAG size
+        for size in [256, 2048, 8192]:
+            plain = await saveLatency(
+                MapDAG(f'/edag_plain_{size}.json'), size)
+            sharded = await saveLatency(
+                ShardedMapDAG(f'/edag_sharded_{size}.json',
+                              sharding=True), size)
+
+        # Only the modified shard is rewritten on large maps
+        assert sharded < plain
+
+        await ipfsop.client.close()
+        ipfsdaemon.stop()
+        await asyncio.wait([ipfsdaemon.exitFuture])
+
+    @pytest.mark.asyncio
+    async def test_coalesce(self, event_loop, ipfsdaemon, ipfsop):
+        async for pct, msg in ipfsdaemon.start():
+            pass
+
+        await ipfsdaemon.proto.eventStarted.wait()
+        IPFSOpRegistry.regDefault(ipfsop)
+
+        saves = []
+
+        async def onUpdated(cid):
+            saves.append(cid)
+
+        edag = MapDAG('/edag_coalesce.json', saveInterval=0.5)
+        await edag.load()
+        edag.dagUpdated.connectTo(onUpdated)
+
+        for idx in range(10):
+            async with edag as dag:
+                dag.root['c']['items'][f'item{idx}'] = {}
+
+        assert edag.saveDirty is True
+        await asyncio.sleep(1)
+        assert len(saves) == 1
+
+        async with edag as dag:
+            dag.root['c']['items']['last'] = {}
+
+        # Explicit flush
+        cid = await edag.flush()
+        assert cid == saves[-1]
+        assert len(saves) == 2
+        assert edag.saveDirty is False
+
+        await ipfsop.client.close()
+        ipfsdaemon.stop()
+        await asyncio.wait([ipfsdaemon.exitFuture])
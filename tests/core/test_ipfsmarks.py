@@ -1,3 +1,4 @@
+import os
 import pytest
 
 
@@ -192,3 +193,76 @@ class TestHashPlones:
 
             if x > 13:
                 assert pyramid.marksCount == 16
+
+
+class TestMarksJournal:
+    @pytest.mark.parametrize('path1,path2,path3', [
+        (
+            '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV',
+            '/ipfs/Qma1TPVjdZ9CReqwyQ9Wvv3oRgRRi5FrEyWufenu92SuUV/www',
+            '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV/b/ogkush'
+        )])
+    def test_journal(self, tmpdir, path1, path2, path3):
+        path = str(tmpdir.join('marks.json'))
+
+        marks = IPFSMarks(path)
+        assert marks.add(path1, title='One', category='a/b')
+        assert marks.add(path2, title='Two')
+        marks.pyramidNew('p1', 'my/pyramids', path1, ipnskey='abcd')
+        marks.pyramidAdd('my/pyramids/p1', path3)
+        marks.delete(path2)
+        marks.qaMap('qa', path1)
+
+        # Wait for the journal writes
+        marks.ioRun(lambda: None).result()
+        assert marks._journalCount > 0
+
+        # Restore from the snapshot and the journal
+        marks2 = IPFSMarks(path, autosave=False)
+        assert marks2.find(path1).title == 'One'
+        assert marks2.find(path2) is None
+        assert marks2.pyramidGetLatestHashmark(
+            'my/pyramids/p1').path == path3
+        assert len(marks2.qaGetMappings()) == 1
+
+        marks.close()
+        assert os.path.getsize(marks.journalPath) == 0
+
+        marks3 = IPFSMarks(path, autosave=False)
+        assert marks3.find(path1).title == 'One'
+        assert marks3.root == marks.root
+
+    @pytest.mark.parametrize('path1,path3', [
+        (
+            '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV',
+            '/ipfs/QmT1TPVjdZ9CRnqwyQ9WygDoRgRRibFrEyWufenu92SuUV/b/ogkush'
+        )])
+    def test_unjournaled(self, tmpdir, path1, path3):
+        path = str(tmpdir.join('marks.json'))
+
+        marks = IPFSMarks(path)
+        pyramid = marks.pyramidNew('p1', 'my/pyramids', path1)
+        pyramid['maxhashmarks'] = 1
+
+        assert marks.pyramidAdd('my/pyramids/p1', path3)
+
+        # Already there: nothing is dropped or journaled
+        assert marks.pyramidAdd('my/pyramids/p1', path3,
+                                unique=True) is False
+        assert marks._journal == []
+        assert marks.pyramidGetLatestHashmark(
+            'my/pyramids/p1').path == path3
+
+        marks.ioRun(lambda: None).result()
+        assert marks._journalCount > 0
+
+        # pyramidPop() is not journaled, a snapshot is written
+        marks.pyramidPop('my/pyramids/p1')
+        marks.ioRun(lambda: None).result()
+        assert marks._journalCount == 0
+        assert os.path.getsize(marks.journalPath) == 0
+
+        marks2 = IPFSMarks(path, autosave=False)
+        assert marks2.root == marks.root
+
+        marks.close()
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+
+from galacteek.did.ipid.cache import DIDExpandedCache
+from galacteek.did.ipid.cache import DIDResolveCache
+
+
+class TestDIDResolveCache:
+    @pytest.mark.asyncio
+    async def test_resolve(self):
+        cache = DIDResolveCache(ttl=60, concurrency=2)
+        calls = []
+        running = []
+
+        async def resolver():
+            calls.append(1)
+            running.append(1)
+            assert len(running) <= 2
+            await asyncio.sleep(0.1)
+            running.pop()
+            return 'bafyreidoc'
+
+        # Concurrent resolves of the same DID share a single resolve
+        cids = await asyncio.gather(*[
+            cache.resolve('did:ipid:a', resolver) for x in range(8)])
+        assert cids == ['bafyreidoc'] * 8
+        assert len(calls) == 1
+        assert cache.stats.joined == 7
+
+        assert await cache.resolve('did:ipid:a', resolver) == 'bafyreidoc'
+        assert len(calls) == 1
+        assert cache.stats.hits == 1
+
+        # Bounded concurrency
+        await asyncio.gather(*[
+            cache.resolve(f'did:ipid:{x}', resolver) for x in range(6)])
+        assert len(calls) == 7
+
+        cache.invalidate('did:ipid:a')
+        await cache.resolve('did:ipid:a', resolver)
+        assert len(calls) == 8
+
+    @pytest.mark.asyncio
+    async def test_document(self):
+        cache = DIDResolveCache()
+
+        async def getter():
+            return {'id': 'did:ipid:a', 'service': []}
+
+        doc = await cache.document('bafyreidoc', getter)
+        doc['service'].append({'id': 'srv'})
+
+        # Modifying the returned document doesn't alter the cache
+        doc = await cache.document('bafyreidoc', getter)
+        assert doc['service'] == []
+        assert cache.stats.docHits == 1
+
+
+class TestDIDExpandedCache:
+    @pytest.mark.asyncio
+    async def test_persistent(self, tmpdir):
+        path = tmpdir.join('didldcache')
+        expanded = {
+            '@id': 'did:ipid:a',
+            'https://w3id.org/did#service': [{'@id': 'did:ipid:a/srv'}]
+        }
+
+        cache = DIDExpandedCache(path=path)
+        assert await cache.get('bafyreidoc') is None
+        assert await cache.put('bafyreidoc', expanded)
+        assert await cache.get('bafyreidoc') == expanded
+        assert cache.stats.hitsMem == 1
+
+        # Restart
+        cache = DIDExpandedCache(path=path)
+        assert await cache.warm(count=8) == 1
+        assert await cache.get('bafyreidoc') == expanded
+        assert cache.stats.hitsMem == 1
+
+        cache = DIDExpandedCache(path=path)
+        assert await cache.get('bafyreidoc') == expanded
+        assert cache.stats.hitsDisk == 1
+        assert cache.stats.hitRatio == 1.0
+
+    @pytest.mark.asyncio
+    async def test_contexts_changed(self, tmpdir):
+        path = tmpdir.join('didldcache')
+        expanded = {'@id': 'did:ipid:a'}
+
+        cache = DIDExpandedCache(path=path)
+        cache.contextsChanged('galacteek.ld:/ipfs/bafyctx1')
+        assert await cache.put('bafyreidoc', expanded)
+
+        # Same contexts after a restart
+        cache = DIDExpandedCache(path=path)
+        cache.contextsChanged('galacteek.ld:/ipfs/bafyctx1')
+        assert await cache.warm(count=8) == 1
+        assert await cache.get('bafyreidoc') == expanded
+
+        # The contexts changed, stale expansions are not used
+        cache.contextsChanged('galacteek.ld:/ipfs/bafyctx2')
+        assert cache.stats.invalidations == 2
+        assert len(cache) == 0
+        assert await cache.get('bafyreidoc') is None
+
+        cache = DIDExpandedCache(path=path)
+        cache.contextsChanged('galacteek.ld:/ipfs/bafyctx2')
+        assert await cache.warm(count=8) == 0
+        assert await cache.get('bafyreidoc') is None
+
+        # Expanded again with the new contexts, stored next to the
+        # stale entry
+        expanded2 = {'@id': 'did:ipid:a', 'v': 2}
+        assert await cache.put('bafyreidoc', expanded2)
+
+        cache = DIDExpandedCache(path=path)
+        cache.contextsChanged('galacteek.ld:/ipfs/bafyctx2')
+        assert await cache.get('bafyreidoc') == expanded2
@@ -0,0 +1,147 @@
+import json
+import os
+import time
+import pytest
+
+from galacteek.ld import asyncjsonld as jsonld
+from galacteek.ld.asyncjsonld import ActiveContextCache
+
+
+context = {
+    '@vocab': 'ips://galacteek.ld/',
+    'did': 'https://w3id.org/did#',
+    'sec': 'https://w3id.org/security#',
+    'service': {'@id': 'did:service', '@container': '@set'},
+    'publicKey': {'@id': 'sec:publicKey', '@container': '@set'},
+    'created': {
+        '@id': 'http://purl.org/dc/terms/created',
+        '@type': 'http://www.w3.org/2001/XMLSchema#dateTime'
+    }
+}
+
+for idx in range(64):
+    context[f'term{idx}'] = {
+        '@id': f'ips://galacteek.ld/term{idx}',
+        '@type': '@id'
+    }
+
+
+class JsonKeyedCache:
+    """
+    The previous ActiveContextCache implementation (reference)
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, active_ctx, local_ctx):
+        return self.cache.get(json.dumps(active_ctx), {}).get(
+            json.dumps(local_ctx))
+
+    def set(self, active_ctx, local_ctx, result):
+        self.cache.setdefault(json.dumps(active_ctx), {})[
+            json.dumps(local_ctx)] = json.loads(json.dumps(result))
+
+
+def activeContext():
+    return {
+        '@base': '',
+        'processingMode': None,
+        'mappings': {
+            f'term{idx}': {'@id': f'urn:term{idx}', 'reverse': False}
+            for idx in range(64)
+        },
+        'inverse': None
+    }
+
+
+class TestActiveContextCache:
+    def test_cache(self):
+        cache = ActiveContextCache(size=2)
+        result = activeContext()
+
+        assert cache.get(activeContext(), context) is None
+        cache.set(activeContext(), context, result)
+
+        # Same contents, different objects
+        assert cache.get(activeContext(), dict(context)) is result
+        assert cache.hits == 1
+
+        # The inverse context is not part of the key
+        result['inverse'] = {'urn:term0': {}}
+        cache.set(result, {'@vocab': 'urn:'}, activeContext())
+        assert cache.get(result, {'@vocab': 'urn:'}) is not None
+
+        cache.set(activeContext(), {'@vocab': 'urn:x:'}, activeContext())
+        assert len(cache) == 2
+
+        cache.resize(1)
+        assert len(cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_expand(self):
+        cache = ActiveContextCache(size=16)
+        jsonld._cache['activeCtx'] = cache
+
+        doc = {
+            '@context': context,
+            '@id': 'did:ipid:test',
+            'term0': 'urn:a',
+            'created': '2021-01-01T00:00:00Z'
+        }
+
+        try:
+            first = await jsonld.expand(doc)
+            second = await jsonld.expand(doc)
+        finally:
+            jsonld._cache['activeCtx'] = ActiveContextCache()
+
+        assert first == second
+        assert cache.hits > 0
+
+    def test_hits_misses(self):
+        rounds = 100
+        result = activeContext()
+        ref = JsonKeyedCache()
+        cache = ActiveContextCache(size=16)
+
+        for c in [cache, ref]:
+            c.set(activeContext(), context, result)
+            c.set(result, context, result)
+
+        for x in range(rounds):
+            # Equal contents (but new objects) hit the same entries
+            active = cache.get(activeContext(), context)
+            assert active == ref.get(activeContext(), context)
+            assert cache.get(active, dict(context)) is result
+
+        assert cache.hits == rounds * 2
+        assert cache.misses == 0
+
+        assert cache.get(activeContext(), {'@vocab': 'urn:y:'}) is None
+        assert ref.get(activeContext(), {'@vocab': 'urn:y:'}) is None
+        assert cache.misses == 1
+
+        cache.clear()
+        assert cache.hits == 0 and len(cache) == 0
+
+    @pytest.mark.skipif(not os.environ.get('GALACTEEK_BENCHMARK'),
+                        reason='Set GALACTEEK_BENCHMARK to run benchmarks')
+    def test_benchmark(self):
+        rounds = 2000
+        result = activeContext()
+
+        timings = []
+        for cache in [JsonKeyedCache(), ActiveContextCache(size=16)]:
+            cache.set(activeContext(), context, result)
+            cache.set(result, context, result)
+
+            start = time.perf_counter()
+            for x in range(rounds):
+                active = cache.get(activeContext(), context)
+                assert cache.get(active, context) == result
+            timings.append(time.perf_counter() - start)
+
+        refTime, hashedTime = timings
+
+        assert hashedTime < refTime
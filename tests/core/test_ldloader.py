@@ -0,0 +1,43 @@
+import orjson
+import pytest
+
+from galacteek.ipfs.cidhelpers import IPFSPath
+from galacteek.ld.ldloader import LDContextCache
+
+
+class CatClient:
+    def __init__(self, doc):
+        self.doc = doc
+        self.cats = 0
+
+    async def cat(self, path):
+        self.cats += 1
+        return orjson.dumps(self.doc)
+
+
+class TestLDContextCache:
+    @pytest.mark.asyncio
+    async def test_cache(self, tmpdir):
+        cid = 'bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi'
+        url = 'ips://galacteek.ld/did'
+        path = IPFSPath(cid).child('did')
+        client = CatClient({'@context': {'@vocab': 'ips://galacteek.ld/'}})
+
+        cache = LDContextCache()
+        cache.persist(tmpdir.join('ldctxcache'))
+
+        assert cache.get(url) is None
+        doc = await cache.fetch(client, url, path)
+        assert doc == client.doc
+
+        # Modifying the document doesn't alter the cache
+        doc['@context']['@vocab'] = None
+        assert cache.get(url) == client.doc
+        assert cache.stats.hitsMem == 1
+
+        # Contexts changed: served from the on-disk cache
+        cache.invalidate()
+        assert cache.get(url) is None
+        assert await cache.fetch(client, url, path) == client.doc
+        assert cache.stats.hitsDisk == 1
+        assert client.cats == 1
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+import pytest
+
+from galacteek.core.multihashmetadb import IPFSObjectMetadataDatabase
+from galacteek.core.multihashmetadb import metaKey
+
+
+cid = 'bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi'
+
+
+def objPath(idx):
+    return f'/ipfs/{cid}/dir{idx % 16}/file{idx}'
+
+
+class TestMetadataDatabase:
+    @pytest.mark.asyncio
+    async def test_store(self, tmpdir):
+        db = IPFSObjectMetadataDatabase(str(tmpdir), backend='sqlite')
+        path = objPath(0)
+
+        assert await db.get(path) is None
+        await db.store(path, mimetype='text/plain')
+        assert await db.get(path) == {'mimetype': 'text/plain'}
+
+        # Existing keys are not overwritten
+        await db.store(path, mimetype='text/html', stat={'Size': 12})
+        await db.flush()
+        assert await db.get(path) == {
+            'mimetype': 'text/plain',
+            'stat': {'Size': 12}
+        }
+
+        assert not await db.hasDirEntries(path)
+        await db.writeDirEntries(path, list(range(20)))
+        assert await db.hasDirEntries(path)
+
+        packs = [pack async for pack in db.getDirEntries(path)]
+        assert packs == [list(range(16)), list(range(16, 20))]
+
+        # A complete listing replaces a partial one, not the reverse
+        assert not await db.hasDirEntries(path, complete=True)
+        await db.flush()
+        await db.writeDirEntries(path, list(range(30)), complete=True)
+        await db.flush()
+        await db.writeDirEntries(path, list(range(5)))
+        assert await db.hasDirEntries(path, complete=True)
+
+        packs = [pack async for pack in db.getDirEntries(path)]
+        assert sum(packs, []) == list(range(30))
+
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_migrate(self, tmpdir):
+        fdb = IPFSObjectMetadataDatabase(str(tmpdir), backend='files')
+
+        for idx in range(32):
+            await fdb.store(objPath(idx), mimetype='text/plain')
+
+        await fdb.writeDirEntries(objPath(0), [{'Name': 'a'}])
+        await fdb.writeDirEntries(objPath(1), [{'Name': 'b'}],
+                                  complete=True)
+
+        db = IPFSObjectMetadataDatabase(str(tmpdir), backend='sqlite')
+        assert await db.migrate() == 34
+        assert await db.migrate() == 0
+
+        assert await db.get(objPath(31)) == {'mimetype': 'text/plain'}
+        assert await db.hasDirEntries(objPath(0))
+        assert not await db.hasDirEntries(objPath(0), complete=True)
+        assert await db.hasDirEntries(objPath(1), complete=True)
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_batch(self, tmpdir):
+        db = IPFSObjectMetadataDatabase(str(tmpdir), backend='sqlite',
+                                        batchSize=4, flushDelay=3600)
+        store = db.backend
+
+        for idx in range(3):
+            await db.store(objPath(idx), mimetype='text/plain')
+
+        # Below the batch size, waiting for the delay
+        assert len(store._pending) == 3
+        assert store._flushHandle is not None
+
+        await db.store(objPath(3), mimetype='text/plain')
+        assert store._pending == {}
+        assert store._flushHandle is None
+
+        # Queued after the batch commit
+        assert await store.run(
+            store._read, metaKey(objPath(3)), 'metadata') is not None
+        await db.close()
+
+    @pytest.mark.asyncio
+    async def test_flush_error(self, tmpdir):
+        db = IPFSObjectMetadataDatabase(str(tmpdir), backend='sqlite',
+                                        flushDelay=0)
+        store = db.backend
+        errors = []
+
+        def failWrite(batch):
+            raise OSError('disk full')
+
+        store._write = failWrite
+        store._flushDone = lambda future: errors.append(future.exception())
+
+        await db.store(objPath(0), mimetype='text/plain')
+        await asyncio.sleep(0.1)
+
+        assert len(errors) == 1
+        assert isinstance(errors[0], OSError)
+        await db.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not os.environ.get('GALACTEEK_BENCHMARK'),
+                        reason='Set GALACTEEK_BENCHMARK to run benchmarks')
+    async def test_benchmark(self, tmpdir):
+        count = 1000
+        timings = {}
+
+        for backend in IPFSObjectMetadataDatabase.backends:
+            db = IPFSObjectMetadataDatabase(
+                str(tmpdir.mkdir(backend)), backend=backend)
+
+            start = time.perf_counter()
+            for idx in range(count):
+                await db.store(objPath(idx), mimetype='image/png',
+                               stat={'Size': idx})
+            await db.flush()
+            storeTime = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for idx in range(count):
+                assert (await db.get(objPath(idx)))['stat']['Size'] == idx
+            getTime = time.perf_counter() - start
+
+            timings[backend] = (storeTime, getTime)
+            await db.close()
+
+        assert sum(timings['sqlite']) < sum(timings['files'])
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+
+from galacteek.ipfs.ipfsops.objcache import IPFSObjectCache
+
+
+@pytest.fixture
+def ocache(tmpdir):
+    return IPFSObjectCache(
+        tmpdir.join('objcache'),
+        memMaxSize=16,
+        diskMaxSize=64,
+        objMaxSize=32
+    )
+
+
+class TestObjectCache:
+    @pytest.mark.parametrize(
+        'path',
+        ['/ipfs/bafybeihtwyjagwduskwuuqyvqexlbhfakgjpn3fs3rf6u3ef7mc2utjcgm'
+         '/index.html'])
+    @pytest.mark.asyncio
+    async def test_getput(self, ocache, path):
+        key = ocache.cacheKey(path)
+        assert key is not None
+        assert ocache.cacheKey('/ipns/ipfs.io') is None
+
+        assert await ocache.get(key) is None
+        assert ocache.stats.misses == 1
+
+        assert await ocache.put(key, b'0123456789')
+        assert await ocache.get(key) == b'0123456789'
+        assert ocache.stats.hitsMem == 1
+
+        # Too large
+        assert await ocache.put(key + '/big', b'x' * 64) is False
+
+        # Drop the memory level, the object should come from disk
+        ocache._mem.clear()
+        assert await ocache.get(key) == b'0123456789'
+        assert ocache.stats.hitsDisk == 1
+
+        for idx in range(8):
+            await ocache.put(f'{key}/{idx}', b'y' * 30)
+
+        assert ocache.diskSize <= 64
+        assert ocache.stats.evictions > 0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_put(self, ocache):
+        key = ocache.cacheKey(
+            '/ipfs/bafybeihtwyjagwduskwuuqyvqexlbhfakgjpn3fs3rf6u3ef7mc2utjcgm'
+            '/a.txt')
+
+        results = await asyncio.gather(
+            *[ocache.put(key, b'0123456789') for x in range(4)])
+
+        assert all(results)
+        assert ocache.diskSize == 10
+        assert ocache.stats.bytesStored == 10
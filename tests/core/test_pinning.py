@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+
+from galacteek.ipfs.pinning import PinOrder
+from galacteek.ipfs.pinning import PinOrdersQueue
+from galacteek.ipfs.pinning import PinProgressTracker
+
+
+settings = {
+    'browser': (8, 0),
+    'hashmarks': (1, 1)
+}
+
+
+class TestPinOrdersQueue:
+    @pytest.mark.asyncio
+    async def test_queue(self):
+        queue = PinOrdersQueue(
+            maxsize=4,
+            qsettings=lambda qname: settings.get(qname, (5, 0))
+        )
+
+        for idx in range(2):
+            assert await queue.put(
+                PinOrder('hashmarks', f'/ipfs/h{idx}', False, None))
+
+        assert await queue.put(PinOrder('default', '/ipfs/d', False, None))
+        assert await queue.put(PinOrder('browser', '/ipfs/b', False, None))
+        assert not await queue.put(
+            PinOrder('browser', '/ipfs/b', False, None))
+        assert queue.full()
+
+        # Highest priority first
+        order = await queue.get()
+        assert order.path == '/ipfs/b'
+        assert (await queue.get()).path == '/ipfs/d'
+
+        hmOrder = await queue.get()
+        assert hmOrder.path == '/ipfs/h0'
+
+        # Max one active order for the hashmarks queue
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.get(), 0.1)
+
+        queue.release(hmOrder)
+        assert (await queue.get()).path == '/ipfs/h1'
+        assert queue.qsize() == 0
+        assert queue.activeCount() == 3
+
+        queue.release(order, requeue=True)
+        assert queue.queued('/ipfs/b')
+
+    @pytest.mark.asyncio
+    async def test_merge(self):
+        queue = PinOrdersQueue(
+            qsettings=lambda qname: settings.get(qname, (5, 0))
+        )
+        called = []
+
+        assert await queue.put(PinOrder('hashmarks', '/ipfs/a', False,
+                                        lambda f: called.append('hm')))
+        assert await queue.put(PinOrder('default', '/ipfs/d', False, None))
+
+        # Duplicate order: the callback is kept and the waiting order
+        # moves to the higher-priority queue
+        assert not await queue.put(PinOrder(
+            'browser', '/ipfs/a', True, lambda f: called.append('br')))
+        assert queue.qsize() == 2
+
+        order = await queue.get()
+        assert order.path == '/ipfs/a'
+        assert order.qname == 'browser'
+        assert order.recursive is True
+
+        for callback in order.callbacks:
+            callback(None)
+        assert called == ['hm', 'br']
+
+        # Lower priority: stays in its queue
+        assert not await queue.put(PinOrder('hashmarks', '/ipfs/d',
+                                            False, None))
+        assert (await queue.get()).qname == 'default'
+
+
+async def pinStream(messages, delay=0):
+    for msg in messages:
+        await asyncio.sleep(delay)
+        yield msg
+
+
+class TestPinProgressTracker:
+    @pytest.mark.asyncio
+    async def test_progress(self):
+        tracker = PinProgressTracker(stallTimeout=1, emitInterval=10)
+        stream = pinStream([{'Progress': x} for x in range(100)] + [
+            {'Pins': ['bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy']}
+        ])
+
+        emitted = 0
+        while True:
+            try:
+                msg = await tracker.next(stream)
+            except StopAsyncIteration:
+                break
+
+            if tracker.update(msg):
+                emitted += 1
+
+        # Status notifications are throttled
+        assert tracker.messages == 101
+        assert emitted == 1
+        assert tracker.flush() is True
+        assert 'Pins' in tracker.status
+
+    @pytest.mark.asyncio
+    async def test_stalled(self):
+        tracker = PinProgressTracker(stallTimeout=0.2)
+        stream = pinStream([{'Progress': 1}] * 10, delay=0.05)
+
+        with pytest.raises(asyncio.TimeoutError):
+            while True:
+                tracker.update(await tracker.next(stream))
+
+        assert tracker.stalled
+        assert tracker.messages < 10
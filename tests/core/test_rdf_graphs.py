@@ -0,0 +1,42 @@
+import pytest
+
+from rdflib import ConjunctiveGraph
+from rdflib import Graph
+from rdflib import Literal
+from rdflib import URIRef
+
+from galacteek.ld.rdf import BaseGraph
+from galacteek.ld.rdf import graphTransfer
+
+
+def srcGraph(count: int):
+    graph = Graph()
+    for idx in range(count):
+        graph.add((
+            URIRef(f'urn:test:{idx}'),
+            URIRef('ips://galacteek.ld/objectNumber'),
+            Literal(idx)
+        ))
+    return graph
+
+
+class TestGraphTransfer:
+    @pytest.mark.asyncio
+    async def test_transfer(self):
+        src = srcGraph(5000)
+        dst = BaseGraph()
+
+        version = dst.gVersion
+        assert await graphTransfer(src, dst, batchSize=1000) == 5000
+        assert len(dst) == 5000
+        assert dst.gVersion > version
+
+        assert await dst.pullGraph(srcGraph(10)) == 10
+        assert len(dst) == 5000
+
+    @pytest.mark.asyncio
+    async def test_transfer_conjunctive(self):
+        dst = ConjunctiveGraph(identifier=URIRef('urn:ipg:test'))
+
+        assert await graphTransfer(srcGraph(10), dst) == 10
+        assert len(dst.get_context(URIRef('urn:ipg:test'))) == 10
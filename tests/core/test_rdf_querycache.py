@@ -0,0 +1,40 @@
+from galacteek.ld.rdf.querycache import GraphQueryCache
+from galacteek.ld.rdf.querycache import queryNormalize
+
+
+class TestGraphQueryCache:
+    def test_normalize(self):
+        assert queryNormalize('''
+            SELECT ?s
+            WHERE {  ?s ?p  "a  b" . }
+        ''') == 'SELECT ?s WHERE { ?s ?p "a  b" . }'
+
+    def test_getput(self):
+        qc = GraphQueryCache(maxEntries=2, maxMemory=1024)
+        key = qc.cacheKey('SELECT ?s WHERE { ?s ?p ?o . }',
+                          {'s': 'urn:a'})
+        assert key == qc.cacheKey('SELECT ?s\nWHERE { ?s ?p ?o . }',
+                                  {'s': 'urn:a'})
+
+        assert qc.get(key, 1) is None
+        assert qc.put(key, 'result', 1, size=16)
+        assert qc.get(key, 1) == 'result'
+        assert qc.stats.hits == 1
+
+        # Stale result
+        assert qc.put(key, 'result', 0, size=16) is False
+
+        # The graph has changed
+        assert qc.get(key, 2) is None
+        assert qc.stats.invalidations == 1
+        assert len(qc) == 0
+
+        for idx in range(3):
+            qc.put(qc.cacheKey(f'ASK {{ <urn:{idx}> ?p ?o }}'),
+                   'result', 2, size=16)
+
+        assert len(qc) == 2
+        assert qc.stats.evictions == 1
+
+        # Too large
+        assert qc.put(key, 'result', 2, size=2048) is False
@@ -0,0 +1,44 @@
+import pytest
+
+from Cryptodome.PublicKey import RSA
+
+from galacteek.crypto.rsa import RSAExecutor
+
+
+@pytest.fixture(scope='module')
+def rsaKeys():
+    return [RSA.generate(2048) for idx in range(3)]
+
+
+class TestRSAEnvelope:
+    @pytest.mark.asyncio
+    async def test_envelope(self, event_loop, rsaKeys):
+        rsaExec = RSAExecutor(loop=event_loop)
+        alice, bob, eve = rsaKeys
+        data = b'{"msgtype": "test"}' * 64
+
+        envelope = await rsaExec.encryptEnvelope(data, [
+            alice.publickey().export_key(),
+            bob.publickey().export_key()
+        ])
+
+        # Anonymous key slots
+        assert 'keys' not in envelope
+        assert len(envelope['slots']) == 2
+
+        assert await rsaExec.decryptEnvelope(envelope, alice) == data
+        assert await rsaExec.decryptEnvelope(envelope, bob) == data
+
+        # Not a recipient
+        assert await rsaExec.decryptEnvelope(envelope, eve) is None
+
+        # Invalid keys are skipped
+        envelope = await rsaExec.encryptEnvelope(data, [
+            b'invalid',
+            bob.publickey().export_key()
+        ])
+        assert len(envelope['slots']) == 1
+        assert await rsaExec.decryptEnvelope(envelope, bob) == data
+
+        assert await rsaExec.encryptEnvelope(data, [b'invalid']) is None
+        assert await rsaExec.decryptEnvelope({'iv': ''}, bob) is None
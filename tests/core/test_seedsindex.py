@@ -0,0 +1,81 @@
+import re
+from datetime import datetime
+from datetime import timezone
+
+import pytest
+
+from galacteek.core.db import SqliteDatabase
+
+
+def seed(cid, name, description='', tags=[], date=None):
+    return {
+        'cid': cid,
+        'section': 'all',
+        'name': name,
+        'description': description,
+        'tags': tags,
+        'date': date.timestamp() if date else None
+    }
+
+
+class TestSeedsIndex:
+    @pytest.mark.asyncio
+    async def test_index(self, dbpath):
+        sdb = SqliteDatabase(str(dbpath))
+        await sdb.setup()
+        index = sdb.seeds
+
+        await index.update('udbh1', 'dagcid1', [
+            seed('cid1', 'Debian ISO', 'Linux distribution', ['os'],
+                 datetime(2021, 1, 10)),
+            seed('cid2', 'Music album', 'Free music', ['audio'],
+                 datetime(2021, 6, 1)),
+            seed('cid0', 'Undated notes', 'No date')
+        ])
+
+        assert await index.dagIndexed('udbh1', 'dagcid1')
+        assert not await index.dagIndexed('udbh1', 'dagcid2')
+        assert await index.seedsCids('udbh1') == {'cid0', 'cid1', 'cid2'}
+
+        # Seeds without a date are kept when there's no date range
+        results = await index.search(regexp=re.compile('.*'))
+        assert [r[3] for r in results] == ['cid2', 'cid1', 'cid0']
+        assert results[2][2] is None
+
+        # Dates are returned in UTC
+        date = datetime.fromisoformat(results[0][2])
+        assert date.utcoffset().total_seconds() == 0
+        assert date == datetime(2021, 6, 1).astimezone(timezone.utc)
+
+        results = await index.search(regexp=re.compile('debian', re.I))
+        assert len(results) == 1 and results[0][1] == 'Debian ISO'
+
+        results = await index.search(
+            dateFrom=datetime(2021, 5, 1),
+            dateTo=datetime(2021, 12, 1)
+        )
+        assert [r[3] for r in results] == ['cid2']
+
+        results = await index.search(dateFrom=datetime(2021, 1, 1))
+        assert [r[3] for r in results] == ['cid2', 'cid1']
+
+        if index.ftsAvailable:
+            results = await index.search(query='linux')
+            assert [r[3] for r in results] == ['cid1']
+
+            # Invalid FTS query, falls back to the regexp
+            results = await index.search(
+                regexp=re.compile('music', re.I), query='music"')
+            assert [r[3] for r in results] == ['cid2']
+
+        # New DAG version: cid1 was removed
+        await index.update('udbh1', 'dagcid2', [
+            seed('cid3', 'Book', 'A novel', ['text'])
+        ], keep={'cid2', 'cid3'})
+
+        assert await index.seedsCids('udbh1') == {'cid2', 'cid3'}
+
+        if index.ftsAvailable:
+            assert await index.search(query='linux') == []
+
+        await sdb.close()
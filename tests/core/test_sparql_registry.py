@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+
+from rdflib import Graph
+from rdflib import Literal
+from rdflib import URIRef
+from rdflib import RDF
+
+from galacteek.ld.sparql import registry
+from galacteek.ld.sparql.registry import PreparedQueryRegistry
+
+
+gs = 'ips://galacteek.ld/'
+
+qLastRecord = '''
+SELECT ?uri ?date ?objNum
+WHERE {
+    ?uri a gs:OntoloChainRecord ;
+      gs:dateCreated ?date ;
+      gs:objectNumber ?objNum ;
+      gs:ontoloChain ?chainUri .
+}
+ORDER BY DESC(?date)
+LIMIT 1
+'''
+
+
+@pytest.fixture(scope='module')
+def chainsGraph():
+    # 20 chains, 500 records each (~40k triples)
+    graph = Graph()
+
+    for cn in range(20):
+        chainUri = URIRef(f'urn:ontolochain:{cn}')
+
+        for rn in range(500):
+            rec = URIRef(f'urn:ontolorecord:{cn}:{rn}')
+            graph.add((rec, RDF.type, URIRef(gs + 'OntoloChainRecord')))
+            graph.add((rec, URIRef(gs + 'dateCreated'),
+                       Literal(f'2021-01-01T00:00:{rn:05}')))
+            graph.add((rec, URIRef(gs + 'objectNumber'), Literal(rn)))
+            graph.add((rec, URIRef(gs + 'ontoloChain'), chainUri))
+
+    return graph
+
+
+class TestPreparedQueries:
+    def test_registry(self, chainsGraph):
+        reg = PreparedQueryRegistry()
+        prepared = reg.register('lastRecord', qLastRecord)
+
+        assert 'lastRecord' in reg
+        assert reg.register('lastRecord', qLastRecord) is prepared
+        assert reg.prepare(qLastRecord) is reg.prepare(qLastRecord)
+
+        rows = list(reg.runSync(
+            chainsGraph, 'lastRecord',
+            bindings={'chainUri': URIRef('urn:ontolochain:3')}
+        ))
+        assert len(rows) == 1
+        assert int(rows[0]['objNum']) == 499
+
+        with pytest.raises(ValueError):
+            reg.runSync(chainsGraph, 'unknown')
+
+        with pytest.raises(Exception):
+            reg.prepare('SELECT ?uri WHERE {')
+
+    def test_prepared_once(self, chainsGraph, monkeypatch):
+        """
+        Queries are parsed once, and executed with the prepared query
+        """
+
+        prepareCount = 0
+        prepareQuery = registry.prepareQuery
+
+        def countingPrepare(*args, **kw):
+            nonlocal prepareCount
+            prepareCount += 1
+            return prepareQuery(*args, **kw)
+
+        monkeypatch.setattr(registry, 'prepareQuery', countingPrepare)
+
+        reg = PreparedQueryRegistry()
+        prepared = reg.register('lastRecord', qLastRecord)
+        reg.register('lastRecord', qLastRecord)
+        assert prepareCount == 1
+
+        for idx in range(20):
+            rows = list(reg.runSync(chainsGraph, 'lastRecord', bindings={
+                'chainUri': URIRef(f'urn:ontolochain:{idx}')
+            }))
+            assert len(rows) == 1
+            assert int(rows[0]['objNum']) == 499
+
+        assert prepareCount == 1
+        assert reg.get('lastRecord') is prepared
+
+        # Ad-hoc queries
+        query = f'PREFIX gs: <{gs}>\n' + qLastRecord
+
+        for idx in range(5):
+            assert reg.prepare(query) is reg.prepare(query)
+
+        assert prepareCount == 2
+
+    @pytest.mark.skipif(not os.environ.get('GALACTEEK_BENCHMARK'),
+                        reason='Set GALACTEEK_BENCHMARK to run benchmarks')
+    def test_benchmark(self, chainsGraph):
+        """
+        Per-call parsing vs prepared query execution
+        """
+
+        reg = PreparedQueryRegistry()
+        reg.register('lastRecord', qLastRecord)
+        rounds = 50
+        query = f'PREFIX gs: <{gs}>\n' + qLastRecord
+
+        start = time.perf_counter()
+        for idx in range(rounds):
+            list(chainsGraph.query(query, initBindings={
+                'chainUri': URIRef(f'urn:ontolochain:{idx % 20}')
+            }))
+        parsedTime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for idx in range(rounds):
+            list(reg.runSync(chainsGraph, 'lastRecord', bindings={
+                'chainUri': URIRef(f'urn:ontolochain:{idx % 20}')
+            }))
+        preparedTime = time.perf_counter() - start
+
+        assert preparedTime < parsedTime
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+
+from galacteek.browser.schemes.streaming import IPFSObjectStreamDevice
+from galacteek.ipfs.cidhelpers import IPFSPath
+
+
+class CatOperator:
+    def __init__(self, data):
+        self.data = data
+        self.offsets = []
+
+    async def catObject(self, path, offset=0, length=None, timeout=None):
+        self.offsets.append(offset)
+        await asyncio.sleep(0)
+        return self.data[offset:offset + length]
+
+
+class TestStreamDevice:
+    @pytest.mark.asyncio
+    async def test_device(self):
+        data = bytes(range(256)) * 64
+        op = CatOperator(data)
+        path = IPFSPath(
+            '/ipfs/'
+            'bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi')
+
+        device = IPFSObjectStreamDevice(
+            op, path, len(data),
+            head=data[0:1024],
+            chunkSize=1024,
+            maxBuffered=4096
+        )
+        device.start()
+        await asyncio.sleep(0.1)
+
+        # The feeder stops once maxBuffered bytes are waiting
+        assert device.bufEnd == 4096
+        assert op.offsets[0] == 1024
+        assert not device._task.done()
+
+        assert device.read(2048) == data[0:2048]
+        await asyncio.sleep(0.1)
+        assert device.bufEnd == 2048 + 4096
+
+        # Seeking outside of the window restarts the feeder there
+        assert device.seek(12000)
+        await asyncio.sleep(0.1)
+        assert 12000 in op.offsets
+        assert device.read(100) == data[12000:12100]
+
+        # Cancelling a paused feeder
+        task = device._task
+        device.feedCancel()
+        await asyncio.sleep(0)
+        assert task.cancelled()
+        assert device._task is None
+
+        device.close()
@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+from pathlib import Path
+
+from galacteek.core.asynclib import aclosing
+from galacteek.core.multihashmetadb import IPFSObjectMetadataDatabase
+from galacteek.ipfs.cidhelpers import joinIpfs
+from galacteek.ipfs.ipfsops import IPFSOperator
+from galacteek.ipfs.ipfsops.nscache import IPNSCache
+
+
+rootCid = 'bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi'
+rootPath = joinIpfs(rootCid)
+
+dirCids = [
+    'QmQwsGL2ytdkFbdALch8q98AzhiuG5RcmNmAJkZwuZPoY6',
+    'QmeQCfXHSum8wCEAaMz1un5tuo8HyzEcZyVw2o99eZPTrD',
+    'QmPkfEeb5JKPoBdo72HC5CbyYEsX4ixoNtXXD7vkPoDL6Z',
+    'QmTskwp3W9tndUkrMYzhg3EkuXkzKGK8NATKtRAbqGXMbk'
+]
+
+
+def fileLink(name):
+    return {'Name': name, 'Hash': dirCids[0], 'Type': 2, 'Size': 1}
+
+
+def dirLink(name, cid):
+    return {'Name': name, 'Hash': cid, 'Type': 1, 'Size': 0}
+
+
+# root: a.txt, d0/ (d0/x.txt, d0/sub/y.txt), d1/ (d1/z.txt), d2/ (empty)
+tree = {
+    rootPath: [fileLink('a.txt'),
+               dirLink('d0', dirCids[0]),
+               dirLink('d1', dirCids[1]),
+               dirLink('d2', dirCids[2])],
+    dirCids[0]: [fileLink('x.txt'), dirLink('sub', dirCids[3])],
+    dirCids[1]: [fileLink('z.txt')],
+    dirCids[2]: [],
+    dirCids[3]: [fileLink('y.txt')]
+}
+
+
+class FakeApp:
+    multihashDb = None
+
+
+class FakeCtx:
+    def __init__(self):
+        self.app = FakeApp()
+
+
+class WalkOperator(IPFSOperator):
+    """
+    Operator listing the fake tree, slowly
+    """
+
+    def __init__(self, tmpdir):
+        super().__init__(
+            None, ctx=FakeCtx(),
+            nsCache=IPNSCache(Path(str(tmpdir.join('ncache.json'))))
+        )
+
+        self.listed = []
+        self.inflight = 0
+        self.maxInflight = 0
+
+    async def listObject(self, path, timeout=None):
+        self.listed.append(path)
+        self.inflight += 1
+        self.maxInflight = max(self.maxInflight, self.inflight)
+
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.inflight -= 1
+
+        return {'Objects': [{'Links': list(tree[path])}]}
+
+
+@pytest.fixture
+def wop(tmpdir):
+    return WalkOperator(tmpdir)
+
+
+async def walkAll(op, path, **kw):
+    return [item async for item in op.walk(path, **kw)]
+
+
+class TestWalk:
+    @pytest.mark.asyncio
+    async def test_walk(self, wop):
+        files = await walkAll(wop, rootPath, concurrency=2, maxDepth=-1,
+                              maxFiles=0)
+
+        assert sorted(files) == sorted([
+            (f'{rootPath}/a.txt', rootPath),
+            (f'{rootPath}/d0/x.txt', f'{rootPath}/d0'),
+            (f'{rootPath}/d1/z.txt', f'{rootPath}/d1'),
+            (f'{rootPath}/d0/sub/y.txt', f'{rootPath}/d0/sub')
+        ])
+
+        # Breadth-first: the deepest file comes last
+        assert files[-1][0] == f'{rootPath}/d0/sub/y.txt'
+
+        # Subdirectories are listed by CID
+        assert sorted(wop.listed) == sorted([rootPath] + dirCids)
+        assert wop.maxInflight == 2
+        assert wop.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_limits(self, wop):
+        files = await walkAll(wop, rootPath, concurrency=4, maxDepth=0,
+                              maxFiles=0)
+        assert files == [(f'{rootPath}/a.txt', rootPath)]
+        assert wop.listed == [rootPath]
+
+        files = await walkAll(wop, rootPath, concurrency=4, maxDepth=1,
+                              maxFiles=0)
+        assert len(files) == 3
+        assert dirCids[3] not in wop.listed
+
+        files = await walkAll(wop, rootPath, concurrency=4, maxDepth=-1,
+                              maxFiles=2)
+        assert len(files) == 2
+
+        # The listing tasks were cancelled
+        await asyncio.sleep(0.2)
+        assert wop.inflight == 0
+
+    @pytest.mark.asyncio
+    async def test_early_stop(self, wop):
+        walker = wop.walk(rootPath, concurrency=1, maxDepth=-1, maxFiles=0)
+
+        async with aclosing(walker):
+            async for objPath, parent in walker:
+                break
+
+        count = len(wop.listed)
+        await asyncio.sleep(0.2)
+
+        assert wop.inflight == 0
+        assert len(wop.listed) == count
+
+    @pytest.mark.asyncio
+    async def test_backpressure(self, wop):
+        walker = wop.walk(rootPath, concurrency=1, maxDepth=-1, maxFiles=0,
+                          bufferSize=1)
+
+        async with aclosing(walker):
+            assert (await walker.__anext__())[0] == f'{rootPath}/a.txt'
+
+            # Listing pauses while the caller doesn't consume
+            await asyncio.sleep(0.5)
+            assert len(wop.listed) < len(tree)
+
+            files = [item async for item in walker]
+            assert len(files) == 3
+            assert sorted(wop.listed) == sorted([rootPath] + dirCids)
+
+    @pytest.mark.asyncio
+    async def test_cached(self, wop, tmpdir):
+        db = IPFSObjectMetadataDatabase(str(tmpdir.mkdir('metadb')))
+        wop.ctx.app.multihashDb = db
+
+        # Complete listing of d1 (by CID), partial listing of sub
+        await db.writeDirEntries(
+            joinIpfs(dirCids[1]),
+            [fileLink('z.txt'), fileLink('cached.txt')],
+            complete=True
+        )
+        await db.writeDirEntries(joinIpfs(dirCids[3]),
+                                 [fileLink('partial.txt')])
+
+        files = await walkAll(wop, rootPath, concurrency=2, maxDepth=-1,
+                              maxFiles=0)
+
+        assert (f'{rootPath}/d1/cached.txt', f'{rootPath}/d1') in files
+        assert (f'{rootPath}/d0/sub/y.txt', f'{rootPath}/d0/sub') in files
+        assert not any(p.endswith('partial.txt') for p, _ in files)
+        assert dirCids[1] not in wop.listed
+        assert dirCids[3] in wop.listed
+
+        await db.close()
@@ -1,4 +1,7 @@
+import pytest
+
 from galacteek.ipfs.mimetype import MIMEType
+from galacteek.ipfs.mimetype import MIMETypeDetector
 
 
 def test_mime_valid():
@@ -11,3 +14,54 @@ def test_mime_valid():
 
     mType = MIMEType('image')
     assert mType.valid is False
+
+
+class CatOperator:
+    def __init__(self, data):
+        self.data = data
+        self.cats = 0
+
+    async def catObject(self, path, length=None, timeout=None):
+        self.cats += 1
+        return self.data
+
+
+class TestMIMETypeDetector:
+    @pytest.mark.asyncio
+    async def test_fastpath(self):
+        detector = MIMETypeDetector()
+
+        mType = await detector.fromBuffer(b'\x89PNG\r\n\x1a\n' + bytes(64))
+        assert mType == 'image/png'
+        assert (await detector.fromBuffer(b'\x00asm\x01\x00\x00\x00')).isWasm
+
+        mType = await detector.fromBuffer(b'body { margin: 0; }',
+                                          name='style.css')
+        assert mType == 'text/css'
+        assert detector.stats.signatures == 2
+        assert detector.stats.extensions == 1
+        assert detector.stats.magicRuns == 0
+
+    @pytest.mark.asyncio
+    async def test_cache(self, tmpdir):
+        path = '/ipfs/bafybeigdyrzt5sfp7udm7hu76uh7y26nf3efuylqabf3oclgtqy55fbzdi/a.gif'  # noqa
+        cachePath = tmpdir.join('mimecache.json')
+        op = CatOperator(b'GIF89a' + bytes(64))
+
+        detector = MIMETypeDetector()
+        detector.persist(cachePath)
+
+        assert await detector.fromPath(op, path) == 'image/gif'
+        assert await detector.fromPath(op, path + '/') == 'image/gif'
+        assert op.cats == 1
+        assert detector.stats.hits == 1
+
+        # Mutable paths are not cached
+        assert detector.cacheKey('/ipns/galacteek.eth/a.gif') is None
+
+        detector.close()
+
+        detector = MIMETypeDetector()
+        detector.persist(cachePath)
+        assert await detector.fromPath(op, path) == 'image/gif'
+        assert op.cats == 1